@@ -0,0 +1,137 @@
+"""Static browser build: the pure SuperSOAP functions on Pyodide, no server round-trips.
+
+    python build_web.py                         # download the pinned Pyodide core release
+    python build_web.py --pyodide core.tar.bz2  # or use a copy you already have (tarball or directory)
+    python build_web.py --check                 # no bundle: CPython smoke test + module-side timings
+
+Writes dist_web/ (serve it as static files, e.g. `python -m http.server -d dist_web`) and
+dist_web/size_report.json. Exits non-zero when the bundle goes over budget.
+"""
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tarfile
+import urllib.request
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+PYODIDE_VERSION = "0.26.4"
+PYODIDE_URL = f"https://github.com/pyodide/pyodide/releases/download/{PYODIDE_VERSION}/pyodide-core-{PYODIDE_VERSION}.tar.bz2"
+# only what loadPyodide() fetches when no extra packages are loaded; supersoap_core is stdlib-only
+PYODIDE_FILES = ["pyodide.js", "pyodide.asm.js", "pyodide.asm.wasm", "python_stdlib.zip", "pyodide-lock.json"]
+APP_FILES = {"index.html": "web/index.html", "py/supersoap_core.py": "supersoap_core.py", "py/supersoap_web.py": "web/supersoap_web.py"}
+
+# Bytes over the wire with gzip on; the runtime dominates, the app must stay small.
+BUDGET_GZIP = {
+    "runtime": int(os.environ.get("SUPERSOAP_WEB_BUDGET_RUNTIME_KB", "8192")) * 1024,
+    "app": int(os.environ.get("SUPERSOAP_WEB_BUDGET_APP_KB", "64")) * 1024,
+}
+
+CHECK = r"""
+import json, sys, time
+t0 = time.perf_counter()
+sys.path[:0] = [sys.argv[1], sys.argv[1] + "/web"]
+import supersoap_web as web
+t1 = time.perf_counter()
+raw = "Assalamualaikum dokter.\nTn. A / L / 25 tahun / BPJS / Kamar 3 / RM 123.456\nS: Nyeri gigi belakang\nO:\nStatus Generalis:\nTD : 120/70 mmHg\nA: Impaksi gigi 38, 48\nP:\nPro Odontektomi gigi 38, 48 dalam general anestesi\nResiden: drg. A\nDPJP: drg. B"
+minlap = "Pemeriksaan penunjang:\nHb 13\nA: -\nPukul : 09.30"
+p = json.loads(web.parse_preop(raw, minlap))
+out = {"preop": web.preop(json.dumps({**p, "tindakan": p["tindakan_hint"]})), "pod": web.pod(json.dumps({"pod": 1, "plan": "Kompres"})),
+       "pod_series": web.pod_series(json.dumps({"pod": 1, "tanggal": "2026-01-01", "days": [{}, {"temp": "37.8", "plan": "Kontrol"}]})),
+       "awal": web.awal(json.dumps({"nama": "Tn. A", "keluhan": "nyeri"})), "eoio": web.eoio("Impaksi", "38,48 PE hip- pal+")}
+t2 = time.perf_counter()
+assert p["rm"] == "123.456" and p["jam"] == "09.30" and p["penunjang"] == "Hb 13", p
+assert all(out.values()) and "Pro Odontektomi gigi 38, 48" in out["preop"], out
+assert out["pod_series"].count("== POD ") == 2 and "== POD 3 ==" in out["pod_series"] and "03/01/2026" in out["pod_series"], out["pod_series"]
+print(json.dumps({"import_ms": round((t1 - t0) * 1000, 1), "first_calls_ms": round((t2 - t1) * 1000, 1)}))
+"""
+
+def gz_size(data: bytes) -> int:
+    return len(gzip.compress(data, 9))
+
+def pyodide_files(src: str) -> dict:
+    """name -> bytes for PYODIDE_FILES, from a release directory, a core tarball, or the download."""
+    if src and not os.path.exists(src):
+        sys.exit(f"no such Pyodide release: {src}")
+    if src and os.path.isdir(src):
+        return {n: open(os.path.join(src, n), "rb").read() for n in PYODIDE_FILES}
+    if src:
+        blob = open(src, "rb").read()
+    else:
+        print(f"downloading {PYODIDE_URL}")
+        with urllib.request.urlopen(PYODIDE_URL, timeout=120) as r:
+            blob = r.read()
+    found = {}
+    with tarfile.open(fileobj=io.BytesIO(blob), mode="r:*") as tar:
+        for m in tar.getmembers():
+            name = os.path.basename(m.name)
+            if m.isfile() and name in PYODIDE_FILES:
+                found[name] = tar.extractfile(m).read()
+    missing = sorted(set(PYODIDE_FILES) - set(found))
+    if missing:
+        sys.exit(f"not in the Pyodide archive: {', '.join(missing)}")
+    return found
+
+def check() -> dict:
+    """Run the browser entry point under CPython in a fresh interpreter: it must import
+    without Streamlit and produce the reports. Timings are the module-side share of the
+    cold load (no WebAssembly runtime start-up)."""
+    res = subprocess.run([sys.executable, "-c", CHECK, ROOT], capture_output=True, text=True)
+    if res.returncode:
+        sys.exit(res.stderr)
+    return json.loads(res.stdout)
+
+def build(out: str, src: str) -> dict:
+    files = {f"pyodide/{n}": b for n, b in pyodide_files(src).items()}
+    files.update({dst: open(os.path.join(ROOT, s), "rb").read() for dst, s in APP_FILES.items()})
+    version = hashlib.sha256(b"".join(files[k] for k in sorted(files))).hexdigest()[:12]
+    sw = open(os.path.join(ROOT, "web", "sw.js"), encoding="utf-8").read()
+    files["sw.js"] = sw.replace("__VERSION__", f"supersoap-{version}").replace("__FILES__", json.dumps(["./"] + sorted(files))).encode("utf-8")
+
+    shutil.rmtree(out, ignore_errors=True)
+    for name, data in files.items():
+        path = os.path.join(out, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+
+    rows = {name: {"bytes": len(data), "gzip": gz_size(data), "group": "runtime" if name.startswith("pyodide/") else "app"}
+            for name, data in sorted(files.items())}
+    totals = {g: {"bytes": sum(r["bytes"] for r in rows.values() if r["group"] == g),
+                  "gzip": sum(r["gzip"] for r in rows.values() if r["group"] == g), "budget_gzip": BUDGET_GZIP[g]}
+              for g in BUDGET_GZIP}
+    report = {"version": version, "pyodide": PYODIDE_VERSION, "files": rows, "totals": totals}
+    with open(os.path.join(out, "size_report.json"), "w") as f:
+        json.dump(report, f, indent=1)
+    return report
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--pyodide", default="", help="Pyodide core release: directory or .tar.bz2 (default: download)")
+    ap.add_argument("--out", default=os.path.join(ROOT, "dist_web"))
+    ap.add_argument("--check", action="store_true", help="only run the CPython smoke test")
+    args = ap.parse_args()
+
+    timing = check()
+    print(f"supersoap_web on CPython: import {timing['import_ms']} ms, first calls {timing['first_calls_ms']} ms")
+    if args.check:
+        return
+    report = build(args.out, args.pyodide)
+    for name, r in report["files"].items():
+        print(f"{name:32} {r['bytes'] / 1024:9.1f} KB  gzip {r['gzip'] / 1024:8.1f} KB")
+    over = False
+    for group, t in report["totals"].items():
+        ok = t["gzip"] <= t["budget_gzip"]
+        over |= not ok
+        print(f"{group:32} {t['bytes'] / 1024:9.1f} KB  gzip {t['gzip'] / 1024:8.1f} KB  budget {t['budget_gzip'] / 1024:.0f} KB  {'ok' if ok else 'OVER'}")
+    print(f"wrote {args.out}; cold-load timings are shown on the page and kept in localStorage['supersoap_coldload']")
+    if over:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,40 @@
+import base64
+import binascii
+import difflib
+import json
+import os
 import re
-from dataclasses import dataclass
+import sqlite3
+import threading
+import time
+import weakref
+import zlib
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from datetime import datetime, timedelta, date
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
+import numpy as np
 import streamlit as st
+from streamlit.runtime import Runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from supersoap_core import (
+    CASES, FRAKTUR_TEMUAN, Odontogram, PARSE_BUDGET_SECONDS, PARSE_MAX_CHARS, POD_LUKA, POD_NYERI_SKALA,
+    ParseTimeout, ParsedSoap, PodDay, Sections, TEETH, bound_paste, build_awal_sections, build_preop_sections,
+    clean, compact_teeth, fmt_ddmmyyyy, fraktur_default, fraktur_from_shorthand, fraktur_lines,
+    fraktur_to_shorthand, impaksi_default, impaksi_from_shorthand, impaksi_lines, impaksi_to_shorthand,
+    join_bullets, join_sections, maintenance_ml_per_hr_421, parse_budget, parse_minlap_jam,
+    parse_minlap_penunjang_block, parse_raw_soap_preop_only, pick1, pod_sections, pod_series,
+    preop_default_times, preop_plan_lines, split_people_list, tpm_from_ml_per_hr,
+)
+
+_RUN_T0 = time.perf_counter()  # start of this script run, for time-to-first-interactive
 
 # =========================
 # Auto-unique widget keys (prevents StreamlitDuplicateElementId/Key)
 # =========================
 _WIDGET_KEY_COUNTER = {}  # resets each rerun
+_WIDGET_KEY_SCOPE: List[str] = []  # stage key prefix for auto keys, see widget_scope()
 
 def _slug_key(s: str) -> str:
     s = re.sub(r"[^0-9a-zA-Z]+", "_", (s or "").strip())
@@ -16,20 +43,37 @@ def _slug_key(s: str) -> str:
 
 def _auto_key(widget: str, label: str) -> str:
     base = f"{widget}_{_slug_key(label)}"
+    if _WIDGET_KEY_SCOPE:
+        base = f"{_WIDGET_KEY_SCOPE[-1]}_{base}"
     i = _WIDGET_KEY_COUNTER.get(base, 0)
     _WIDGET_KEY_COUNTER[base] = i + 1
     return f"{base}_{i}"
 
-# Keep originals
-_st_selectbox = st.selectbox
-_st_multiselect = st.multiselect
-_st_checkbox = st.checkbox
-_st_toggle = getattr(st, 'toggle', None)
-_st_text_input = st.text_input
-_st_text_area = st.text_area
-_st_number_input = st.number_input
-_st_radio = st.radio
-_st_select_slider = st.select_slider
+@contextmanager
+def widget_scope(prefix: str):
+    """Auto keys made inside get the stage prefix ("awal_radio_alergi_0"), so unkeyed widgets
+    (riwayat, EO/IO checklists) belong to that stage's draft group like the keyed ones."""
+    _WIDGET_KEY_SCOPE.append(prefix)
+    try:
+        yield
+    finally:
+        _WIDGET_KEY_SCOPE.pop()
+
+# Keep originals. The st module outlives reruns, so grab them only once -- otherwise
+# every rerun wraps the previous rerun's wrapper and the call depth keeps growing.
+_ST_ORIGINALS = st.__dict__.setdefault("_supersoap_originals", {
+    name: getattr(st, name, None)
+    for name in ("selectbox", "multiselect", "checkbox", "toggle", "text_input", "text_area", "number_input", "radio", "select_slider")
+})
+_st_selectbox = _ST_ORIGINALS["selectbox"]
+_st_multiselect = _ST_ORIGINALS["multiselect"]
+_st_checkbox = _ST_ORIGINALS["checkbox"]
+_st_toggle = _ST_ORIGINALS["toggle"]
+_st_text_input = _ST_ORIGINALS["text_input"]
+_st_text_area = _ST_ORIGINALS["text_area"]
+_st_number_input = _ST_ORIGINALS["number_input"]
+_st_radio = _ST_ORIGINALS["radio"]
+_st_select_slider = _ST_ORIGINALS["select_slider"]
 
 def selectbox(label, options, index=0, key=None, **kwargs):
     if key is None:
@@ -97,184 +141,141 @@ from dateutil import tz
 # =========================
 TZ = tz.gettz("Asia/Jakarta")
 
-DAY_ID = {
-    "Monday": "Senin",
-    "Tuesday": "Selasa",
-    "Wednesday": "Rabu",
-    "Thursday": "Kamis",
-    "Friday": "Jumat",
-    "Saturday": "Sabtu",
-    "Sunday": "Minggu",
-}
-
-CASES = [
-    "Impaksi",
-    "Abses",
-    "Selulitis",
-    "Tumor",
-    "Odontogenic cyst",
-    "Fistula orocutaneous",
-    "TMD",
-    "Fraktur",
-]
+# Local storage for everything the app keeps between sessions (archive, indexes, ...)
+DATA_DIR = os.environ.get("SUPERSOAP_DATA_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "supersoap_data")
 
-TEETH = ["18","17","16","15","14","13","12","11","21","22","23","24","25","26","27","28",
-         "38","37","36","35","34","33","32","31","41","42","43","44","45","46","47","48"]
+def odontogram_editor(key: str, temuan: List[str]) -> Odontogram:
+    """Single grid (gigi x temuan) instead of one multiselect per temuan; the grid itself is the
+    widget state, the returned Odontogram is rebuilt from it on every run."""
+    base = [{"Gigi": t, **{f: False for f in temuan}} for t in TEETH]
+    rows = st.data_editor(base, key=key, hide_index=True, disabled=["Gigi"], use_container_width=True)
+    og = Odontogram()
+    for f in temuan:
+        og.set(f, [r["Gigi"] for r in rows if r.get(f)])
+    return og
 
 # =========================
-# Utils
+# Lab values out of the penunjang block (the block itself stays verbatim in the report)
 # =========================
-def day_name_id(d: date) -> str:
-    return DAY_ID.get(d.strftime("%A"), d.strftime("%A"))
-
-def fmt_ddmmyyyy(d: date) -> str:
-    return d.strftime("%d/%m/%Y")
-
-def clean(s: str) -> str:
-    return (s or "").strip()
-
-def normalize_bullets(s: str) -> str:
-    if not s:
-        return ""
-    s = s.replace("•⁠", "•").replace("• ⁠", "• ").replace("•⁠  ⁠", "• ")
-    s = re.sub(r"[ \t]+\n", "\n", s)
-    return s.strip()
-
-def parse_hhmm(s: str) -> Optional[Tuple[int,int]]:
-    s = clean(s).replace(".", ":")
-    m = re.match(r"^(\d{1,2}):(\d{1,2})$", s)
-    if not m:
-        return None
-    h, mi = int(m.group(1)), int(m.group(2))
-    if 0 <= h <= 23 and 0 <= mi <= 59:
-        return (h, mi)
-    return None
-
-def fmt_time(h: int, mi: int) -> str:
-    return f"{h:02d}.{mi:02d}"
-
-def minus_minutes(h: int, mi: int, minutes: int) -> Tuple[int,int]:
-    total = (h * 60 + mi - minutes) % (24*60)
-    return (total//60, total%60)
-
-def maintenance_ml_per_hr_421(weight_kg: float) -> float:
-    w = max(0.0, float(weight_kg))
-    if w <= 10:
-        return 4.0 * w
-    if w <= 20:
-        return 40.0 + 2.0 * (w - 10.0)
-    return 60.0 + 1.0 * (w - 20.0)
-
-def tpm_from_ml_per_hr(ml_per_hr: float, drip_factor_gtt_per_ml: int = 20) -> int:
-    return int(round((float(ml_per_hr) * int(drip_factor_gtt_per_ml)) / 60.0))
-
-def join_bullets(lines: List[str], bullet: str="•⁠  ⁠") -> str:
-    lines = [clean(x) for x in lines if clean(x)]
-    return "\n".join([f"{bullet}{x}" for x in lines])
-
-def split_people_list(s: str) -> str:
-    if not s:
-        return ""
-    s = s.replace("\n", ",")
-    parts = [p.strip() for p in s.split(",") if p.strip()]
-    return ", ".join(parts)
+# name -> (aliases, unit, low, high); counts above `high * 100` are taken as /uL and scaled to 10^3/uL
+LAB_TESTS = {
+    "Hb": (["hb", "hgb", "hemoglobin"], "g/dL", 12.0, 17.5),
+    "Leukosit": (["leukosit", "leu", "wbc"], "10^3/uL", 4.0, 11.0),
+    "Trombosit": (["trombosit", "plt", "platelet"], "10^3/uL", 150.0, 450.0),
+    "Hematokrit": (["hematokrit", "hct"], "%", 36.0, 52.0),
+    "Eritrosit": (["eritrosit", "rbc"], "10^6/uL", 4.0, 6.0),
+    "GDS": (["gds", "gula darah sewaktu"], "mg/dL", 70.0, 200.0),
+    "GDP": (["gdp", "gula darah puasa"], "mg/dL", 70.0, 126.0),
+    "PT": (["pt"], "detik", 10.0, 14.0),
+    "APTT": (["aptt"], "detik", 25.0, 40.0),
+    "INR": (["inr"], "", 0.8, 1.3),
+    "CT": (["ct", "clotting time"], "menit", 2.0, 8.0),
+    "BT": (["bt", "bleeding time"], "menit", 1.0, 3.0),
+    "Ureum": (["ureum", "bun"], "mg/dL", 10.0, 50.0),
+    "Kreatinin": (["kreatinin", "creatinine", "cr"], "mg/dL", 0.5, 1.3),
+    "SGOT": (["sgot", "ast"], "U/L", 0.0, 40.0),
+    "SGPT": (["sgpt", "alt"], "U/L", 0.0, 41.0),
+    "Natrium": (["natrium", "na"], "mmol/L", 135.0, 145.0),
+    "Kalium": (["kalium", "k"], "mmol/L", 3.5, 5.0),
+    "Klorida": (["klorida", "cl"], "mmol/L", 95.0, 108.0),
+    "Albumin": (["albumin", "alb"], "g/dL", 3.5, 5.0),
+}
+_LAB_ALIAS = {a: name for name, (aliases, *_rest) in LAB_TESTS.items() for a in aliases}
+_LAB_NAME = "|".join(sorted(map(re.escape, _LAB_ALIAS), key=len, reverse=True))
+# "Hb: 13,2 g/dL", "PLT 250.000" (slash-joined tests get their own split below)
+_LAB_RE = re.compile(
+    r"(?<![A-Za-z])(" + _LAB_NAME + r")(?![A-Za-z])"
+    r"[ \t]*(?:[:=][ \t]*)?(\d{1,3}(?:\.\d{3})+(?!\d)|\d+(?:[.,]\d+)?)[ \t]*(%|[A-Za-zµ^0-9.]{0,8}/[A-Za-zµ]{1,4}|detik|menit)?",
+    re.IGNORECASE,
+)
+# "CT/BT 7'/2'", "Ureum/Kreatinin 20/0,8", "Na/K/Cl 140/4,1/102": names and values pair up in order
+_LAB_NUM = r"\d+(?:[.,]\d+)?"
+_LAB_CHAIN_RE = re.compile(
+    r"(?<![A-Za-z])((?:" + _LAB_NAME + r")(?:[ \t]*/[ \t]*(?:" + _LAB_NAME + r"))+)(?![A-Za-z])"
+    r"(?:[ \t]*(?:[:=][ \t]*)?(" + _LAB_NUM + r"(?:[^\d\n]{0,4}?[ \t]*/[ \t]*" + _LAB_NUM + r")+))?",
+    re.IGNORECASE,
+)
+
+# Aliases that are also ordinary text ("impaksi 38 K 2", "PT 12 (K: 11)" where K is the kontrol):
+# outside a Na/K/Cl chain they count only at the start of a line or lab header, or right after
+# another lab value, and never inside an open bracket.
+_LAB_SHORT = {"k", "na", "cl", "cr", "ct", "bt", "pt", "alt", "ast"}
+_LAB_LINE_START_RE = re.compile(
+    r"[\W_]*(?:(?:lab(?:oratorium)?|darah lengkap|dl|elektrolit|hemostasis|faal \w+|kimia darah)[ \t]*[:\-]?[ \t]*)?", re.IGNORECASE)
+
+def _lab_anchored(block: str, start: int, prev_end: int) -> bool:
+    line_start = block.rfind("\n", 0, start) + 1
+    before = block[line_start:start]
+    if before.rfind("(") > before.rfind(")"):
+        return False
+    if prev_end >= line_start and re.fullmatch(r"[ \t,;]*(?:\([^()\n]{0,8}\)[ \t,;]*)?", block[prev_end:start]):
+        return True
+    return bool(_LAB_LINE_START_RE.fullmatch(before))
+
+def _lab_number(tok: str) -> float:
+    if re.fullmatch(r"\d{1,3}(?:\.\d{3})+", tok):
+        return float(tok.replace(".", ""))
+    return float(tok.replace(",", "."))
+
+def lab_flag_labels(tests, values, flags) -> List[str]:
+    return [f"{t} {v:g} {'↑' if x == 'H' else '↓'}" for t, v, x in zip(tests, values, flags)]
 
-# =========================
-# Parsing (Pre-Op only): SOAP mentah + MINLAP
-# =========================
 @dataclass
-class ParsedSoap:
-    sapaan: str = "Assalamualaikum dokter."
-    pembuka: str = "Maaf mengganggu, izin melaporkan"
-    rs: str = "RSGMP UNHAS"
-    nama: str = ""
-    jk: str = ""
-    umur: str = ""
-    jenis_perawatan: str = ""
-    pembiayaan: str = ""
-    kamar: str = ""
-    rm: str = ""
-
-    S: str = ""
-    O_generalis: str = ""
-    EO: str = ""
-    IO: str = ""
-    A: str = ""
-    tindakan_hint: str = ""
-
-    residen: str = ""
-    dpjp: str = ""
-
-def pick1(text: str, pattern: str, flags=0) -> str:
-    m = re.search(pattern, text or "", flags)
-    return clean(m.group(1)) if m else ""
-
-def pick_block(text: str, start_pat: str, end_pat: str) -> str:
-    flags = re.IGNORECASE | re.DOTALL
-    m1 = re.search(start_pat, text or "", flags)
-    if not m1:
-        return ""
-    start = m1.end()
-    m2 = re.search(end_pat, (text or "")[start:], flags)
-    end = start + (m2.start() if m2 else len((text or "")[start:]))
-    return clean((text or "")[start:end])
-
-def parse_raw_soap_preop_only(raw: str) -> ParsedSoap:
-    raw = raw.strip()
-    p = ParsedSoap()
-
-    first_line = raw.splitlines()[0].strip() if raw.splitlines() else ""
-    if first_line.lower().startswith("assalamualaikum"):
-        p.sapaan = first_line
-
-    p.rs = "RSGMP UNHAS" if re.search(r"RSGMP\s*UNHAS", raw, re.IGNORECASE) else (pick1(raw, r"(RSGMP[^\n/]+)", re.IGNORECASE) or "RSGMP UNHAS")
-
-    ident = pick1(raw, r"^\s*(Tn\.|Ny\.|Nn\.|An\.)[^\n]+$", re.IGNORECASE | re.MULTILINE)
-    if ident:
-        parts = [x.strip() for x in ident.split("/") if x.strip()]
-        if parts: p.nama = parts[0]
-        if len(parts) > 1: p.jk = parts[1]
-        if len(parts) > 2: p.umur = parts[2]
-        for tok in parts:
-            if re.search(r"\bBPJS\b|\bUMUM\b|\bBAKSOS\b|\bJasa\b", tok, re.IGNORECASE):
-                p.pembiayaan = tok
-            if re.search(r"rawat", tok, re.IGNORECASE):
-                p.jenis_perawatan = tok
-            if tok.lower().startswith("kamar"):
-                p.kamar = tok
-        p.rm = pick1(raw, r"\bRM\.?\s*([0-9.]+)", re.IGNORECASE)
-
-    p.S = pick_block(raw, r"\bS\s*:\s*", r"\n\s*O\s*:\s*")
-    o_block = pick_block(raw, r"\bO\s*:\s*", r"\n\s*A\s*:\s*")
-    p.A = pick_block(raw, r"\bA\s*:\s*", r"\n\s*P\s*:\s*")
-
-    p.O_generalis = normalize_bullets(pick_block(o_block, r"Status\s+Generalis\s*:\s*", r"Status\s+Lokalis\s*:")) \
-        or normalize_bullets(pick_block(o_block, r"Status\s+Generalis\s*:\s*", r"\n\s*(Status\s+Lokalis|EO|E\.?O)\s*:"))
-    p.EO = normalize_bullets(pick_block(o_block, r"\bEO\s*:\s*", r"\n\s*IO\s*:\s*")) or \
-           normalize_bullets(pick_block(o_block, r"\bE\.?O\s*:\s*", r"\n\s*I\.?O\s*:\s*"))
-    p.IO = normalize_bullets(pick_block(o_block, r"\bIO\s*:\s*", r"\n\s*(Pemeriksaan|A\s*:|$)")) or \
-           normalize_bullets(pick_block(o_block, r"\bI\.?O\s*:\s*", r"\n\s*(Pemeriksaan|A\s*:|$)"))
-
-    p_block = pick_block(raw, r"\bP\s*:\s*", r"\n\s*(Izin|Mohon|Residen|DPJP)\s*:|\Z")
-    pro_lines = re.findall(r"Pro\s+([^\n]+)", p_block, re.IGNORECASE)
-    if pro_lines:
-        cand = pro_lines[-1]
-        cand = re.sub(r"\(.*?\)", "", cand)
-        cand = re.sub(r"dalam\s+.*", "", cand, flags=re.IGNORECASE).strip()
-        p.tindakan_hint = clean(cand)
-
-    p.residen = split_people_list(pick1(raw, r"Residen\s*:?\s*(.+)", re.IGNORECASE))
-    p.dpjp = clean(pick1(raw, r"DPJP\s*:?\s*(.+)", re.IGNORECASE))
-    return p
-
-def parse_minlap_penunjang_block(minlap: str) -> str:
-    minlap = minlap or ""
-    blk = pick_block(minlap, r"Pemeriksaan\s+penunjang\s*:\s*", r"\n\s*A\s*:|\n\s*P\s*:|\Z")
-    return blk.strip()
-
-def parse_minlap_jam(minlap: str) -> str:
-    jam = pick1(minlap or "", r"Pukul\s*:\s*\*?([0-9]{1,2}\.[0-9]{2})", re.IGNORECASE)
-    return jam
+class LabTable:
+    """Columnar lab results: one entry per value found, flags computed over whole columns."""
+    test: np.ndarray
+    value: np.ndarray
+    unit: np.ndarray
+    low: np.ndarray
+    high: np.ndarray
+
+    @property
+    def flag(self) -> np.ndarray:
+        return np.where(self.value < self.low, "L", np.where(self.value > self.high, "H", ""))
+
+    def rows(self) -> List[dict]:
+        return [{"Pemeriksaan": t, "Nilai": float(v), "Satuan": u, "Rujukan": f"{lo:g}–{hi:g}", "Flag": str(f)}
+                for t, v, u, lo, hi, f in zip(self.test, self.value, self.unit, self.low, self.high, self.flag)]
+
+    @classmethod
+    def concat(cls, tables: List["LabTable"]) -> "LabTable":
+        return cls(*(np.concatenate([getattr(t, c) for t in tables]) if tables else np.empty(0)
+                     for c in ("test", "value", "unit", "low", "high")))
+
+    def abnormal(self) -> List[str]:
+        f = self.flag
+        return lab_flag_labels(self.test[f != ""], self.value[f != ""], f[f != ""])
+
+@st.cache_data(max_entries=512, show_spinner=False)
+def parse_lab_values(block: str) -> LabTable:
+    """Structured pass over the penunjang block; cached on the block text."""
+    found: Dict[str, Tuple[float, str]] = {}
+    chains = []
+    for m in _LAB_CHAIN_RE.finditer(block or ""):
+        chains.append(m.span())
+        names = [_LAB_ALIAS[x.strip().lower()] for x in m.group(1).split("/")]
+        values = re.findall(_LAB_NUM, m.group(2) or "")
+        if len(values) == len(names):  # otherwise ambiguous: better no value than one under the wrong test
+            for name, v in zip(names, values):
+                found.setdefault(name, (_lab_number(v), ""))
+    prev_end = -1
+    for m in _LAB_RE.finditer(block or ""):
+        if any(a <= m.start() < b for a, b in chains):
+            continue
+        prev_end = max([prev_end] + [b for a, b in chains if b <= m.start()])
+        if m.group(1).lower() in _LAB_SHORT and not _lab_anchored(block, m.start(), prev_end):
+            continue
+        prev_end = m.end()
+        name = _LAB_ALIAS[m.group(1).lower()]
+        found.setdefault(name, (_lab_number(m.group(2)), m.group(3) or ""))
+    names = list(found)
+    value = np.array([found[n][0] for n in names], dtype=float)
+    high = np.array([LAB_TESTS[n][3] for n in names], dtype=float)
+    scale = value > high * 100  # e.g. PLT 250000 /uL -> 250 10^3/uL
+    value = np.where(scale, value / 1000, value)
+    unit = np.array([LAB_TESTS[n][1] if sc or not found[n][1] else found[n][1] for n, sc in zip(names, scale)], dtype=object)
+    return LabTable(np.array(names, dtype=object), value, unit,
+                    np.array([LAB_TESTS[n][2] for n in names], dtype=float), high)
 
 # =========================
 # Dynamic list widgets
@@ -341,35 +342,572 @@ def history_blocks():
         "batuk": batuk, "flu": flu, "demam": demam, "diare": diare,
     }
 
-def build_history_sentence(h: dict) -> str:
-    parts=[]
-    if h["alergi_any"].startswith("Tidak"):
-        parts.append("Tidak ada riwayat alergi obat dan makanan.")
-    else:
-        parts.append("Ada riwayat alergi" + (": " + ", ".join(h["alergi_items"]) + "." if h["alergi_items"] else "."))
-    if h["sistemik_any"] == "Disangkal":
-        parts.append("Riwayat penyakit sistemik disangkal.")
-    else:
-        parts.append("Riwayat penyakit sistemik: " + (", ".join(h["sistemik_items"]) if h["sistemik_items"] else "ada") + ".")
-        if h["obat_items"]:
-            parts.append("Obat rutin: " + ", ".join(h["obat_items"]) + ".")
-    # current condition
-    if not any([h["batuk"], h["flu"], h["demam"], h["diare"]]):
-        parts.append("Saat ini pasien tidak dalam kondisi batuk, demam, flu, dan diare.")
-    else:
-        pos=[]
-        if h["batuk"]: pos.append("batuk")
-        if h["flu"]: pos.append("flu")
-        if h["demam"]: pos.append("demam")
-        if h["diare"]: pos.append("diare")
-        parts.append("Saat ini pasien dalam kondisi: " + ", ".join(pos) + ".")
-    return " ".join(parts)
+# =========================
+# Lite mode (HP / sinyal lemah): fewer widgets, batched reruns
+# =========================
+def is_lite() -> bool:
+    return bool(st.session_state.get("lite_mode", False))
+
+@contextmanager
+def batched(key: str, submit_label: str = "Terapkan"):
+    """Lite mode: widgets inside only reach the server when the form is submitted."""
+    if not is_lite():
+        yield
+        return
+    with st.form(key, border=False):
+        yield
+        st.form_submit_button(submit_label, use_container_width=True)
+
+def extra_io_lines(label: str, **kwargs) -> List[str]:
+    # rarely used: in lite mode the text area only exists once asked for
+    if is_lite() and not st.toggle(f"➕ {label}", value=False):
+        return []
+    extra = st.text_area(label, height=90, **kwargs)
+    return [clean(x) for x in extra.splitlines() if clean(x)]
+
+TTV_LINE_FIELDS = ["td", "nadi", "rr", "temp", "spo2", "bb", "tb"]
+
+def parse_ttv_line(s: str, defaults: dict) -> dict:
+    """'120/70 80 19 36.7 99 55 160' -> TD N P S SpO2 BB TB (missing/invalid -> default)."""
+    out = dict(defaults)
+    for k, tok in zip(TTV_LINE_FIELDS, clean(s).split()):
+        if k not in out:
+            continue
+        if k == "td":
+            out[k] = tok if "mmhg" in tok.lower() else f"{tok} mmHg"
+            continue
+        try:
+            out[k] = type(defaults[k])(float(tok.replace(",", ".")))
+        except ValueError:
+            pass
+    return out
+
+def ttv_line_input(label: str, defaults: dict, key: str) -> dict:
+    fields = [k for k in TTV_LINE_FIELDS if k in defaults]
+    value = " ".join(str(defaults[k]).replace(" mmHg", "") for k in fields)
+    ttv = parse_ttv_line(st.text_input(label, value=value, key=key), defaults)
+    st.caption(" · ".join(f"{k.upper()} {ttv[k]}" for k in fields))
+    return ttv
+
+# read-only widget state, plus generated outputs that must be re-rendered from fresh values
+_UNSETTABLE_KEY = re.compile(r"^FormSubmitter:|(^|_)text_area_(output|laporan_operasi)_\d+$|^arsip_isi_|(_gen|_btn|_add|_del_\d+|_replace|_odontogram|_editor)$")
+
+def keep_widget_state() -> None:
+    """Streamlit drops the state of widgets that were not rendered in a run. Lite mode renders
+    one tab, so the keys of the other tabs are re-assigned before any widget exists; the shown
+    tab's widgets keep their own state (re-assigning those would override their defaults)."""
+    tabs = {**WARD_DRAFT_GROUPS, "Laporan Operasi": ["lapop"], "Bangsal": ["bangsal"], "Arsip": ["arsip"]}
+    shown = tabs.get(st.session_state.get("lite_stage", WARD_STAGES[0]), [])
+    hidden = {g for groups in tabs.values() for g in groups} - set(shown)
+    for k in list(st.session_state.keys()):
+        if isinstance(k, str) and _draft_group(k) in hidden and not _UNSETTABLE_KEY.search(k):
+            st.session_state[k] = st.session_state[k]
+
+def stage_tabs(names: List[str]) -> list:
+    """st.tabs renders every tab on every rerun; lite mode renders only the picked one (others -> None)."""
+    if not is_lite():
+        return st.tabs(names)
+    pilih = st.radio("Stage", names, horizontal=True, key="lite_stage")
+    return [st.container() if n == pilih else None for n in names]
+
+# =========================
+# Draft history (undo/redo) with structurally shared snapshots
+# =========================
+DRAFT_HISTORY_MAX_SNAPSHOTS = int(os.environ.get("SUPERSOAP_HISTORY_SNAPSHOTS", "100"))
+DRAFT_HISTORY_MAX_BYTES = int(float(os.environ.get("SUPERSOAP_HISTORY_MB", "2")) * 1024 * 1024)
+_DRAFT_SKIP = {"lite_mode", "lite_stage", "rerun_meter"}
+# board, archive search and handoff fields are navigation, not report content: undo leaves them alone
+_DRAFT_UI_GROUPS = {"arsip", "bangsal", "handoff"}
+_DRAFT_TYPES = (str, int, float, bool, date, type(None), list, tuple)
+
+def _draft_group(key: str) -> str:
+    return key.split("_", 1)[0]
+
+def _draft_cost(group: dict) -> int:
+    return sum(64 + len(k) + (len(str(v)) if not isinstance(v, (list, tuple)) else sum(len(str(x)) for x in v)) for k, v in group.items())
+
+class DraftHistory:
+    """Snapshots of the form state. A snapshot maps key prefix (awal, pre, POD 0, ...) to a
+    frozen group of values; groups that did not change are shared with the previous
+    snapshot, so a rerun that only touched Pre-Op copies only the Pre-Op group."""
+
+    def __init__(self, max_snapshots: int = DRAFT_HISTORY_MAX_SNAPSHOTS, max_bytes: int = DRAFT_HISTORY_MAX_BYTES):
+        self.max_snapshots = max_snapshots
+        self.max_bytes = max_bytes
+        self.snaps: List[Dict[str, dict]] = []
+        self.costs: List[int] = []  # bytes each snapshot added on top of the ones it shares
+        self.pos = -1
+
+    def record(self, values: dict) -> List[str]:
+        """Push a snapshot if anything changed; returns the groups where a value that was
+        already there got edited (widgets appearing for the first time don't count)."""
+        head = self.snaps[self.pos] if self.snaps else {}
+        groups: Dict[str, dict] = {}
+        for k, v in values.items():
+            groups.setdefault(_draft_group(k), {})[k] = tuple(v) if isinstance(v, list) else v
+        snap, cost = {}, 0
+        for g, items in groups.items():
+            if head.get(g) == items:
+                snap[g] = head[g]
+            else:
+                snap[g] = items
+                cost += _draft_cost(items)
+        if snap.keys() == head.keys() and all(snap[g] is head[g] for g in snap):
+            return []
+        edited = [g for g in snap if g in head and snap[g] is not head[g]
+                  and any(k in head[g] and head[g][k] != v for k, v in snap[g].items())]
+        del self.snaps[self.pos + 1:], self.costs[self.pos + 1:]
+        self.snaps.append(snap)
+        self.costs.append(cost)
+        while len(self.snaps) > 1 and (len(self.snaps) > self.max_snapshots or sum(self.costs) > self.max_bytes):
+            self.snaps.pop(0)
+            self.costs.pop(0)
+        self.pos = len(self.snaps) - 1
+        return edited
+
+    def can_undo(self) -> bool:
+        return self.pos > 0
+
+    def can_redo(self) -> bool:
+        return self.pos < len(self.snaps) - 1
+
+    def undo(self) -> Optional[dict]:
+        if not self.can_undo():
+            return None
+        self.pos -= 1
+        return self.current()
+
+    def redo(self) -> Optional[dict]:
+        if not self.can_redo():
+            return None
+        self.pos += 1
+        return self.current()
+
+    def current(self) -> dict:
+        out = {}
+        for items in self.snaps[self.pos].values():
+            out.update(items)
+        return out
+
+    def nbytes(self) -> int:
+        return sum(self.costs)
+
+    def drop_oldest(self) -> int:
+        """Forget the oldest snapshot (never the current one); returns the bytes freed."""
+        if self.pos < 1:
+            return 0
+        self.snaps.pop(0)
+        self.pos -= 1
+        return self.costs.pop(0)
+
+def _is_draft_value(k, v) -> bool:
+    return (isinstance(k, str) and k not in _DRAFT_SKIP and not k.startswith("_")
+            and _draft_group(k) not in _DRAFT_UI_GROUPS and not _UNSETTABLE_KEY.search(k)
+            and isinstance(v, _DRAFT_TYPES))
+
+def _draft_keys() -> List[str]:
+    return [k for k in st.session_state.keys() if _is_draft_value(k, st.session_state[k])]
+
+def draft_history() -> DraftHistory:
+    if "_draft_history" not in st.session_state:
+        st.session_state["_draft_history"] = DraftHistory()
+    return st.session_state["_draft_history"]
+
+def record_draft() -> List[str]:
+    return draft_history().record({k: st.session_state[k] for k in _draft_keys()})
+
+def _restore_draft(values: Optional[dict]) -> None:
+    if values is None:
+        return
+    for k in _draft_keys():
+        if k not in values:
+            del st.session_state[k]
+    for k, v in values.items():
+        v = list(v) if isinstance(v, tuple) else v
+        # only what the step changes: every write to a rendered widget's key overrides its default
+        if k not in st.session_state or st.session_state[k] != v:
+            st.session_state[k] = v
+
+def undo_draft() -> None:
+    _restore_draft(draft_history().undo())
+
+def redo_draft() -> None:
+    _restore_draft(draft_history().redo())
+
+# =========================
+# Session memory budget: per-session accounting, TTL spill of idle drafts
+# =========================
+SESSION_MAX_BYTES = int(float(os.environ.get("SUPERSOAP_SESSION_MB", "8")) * 1024 * 1024)
+DRAFT_TTL_SECONDS = int(float(os.environ.get("SUPERSOAP_DRAFT_TTL_MIN", "120")) * 60)
+SPILL_KEEP_SECONDS = 24 * 3600
+SWEEP_EVERY_SECONDS = 60
+
+def approx_bytes(v) -> int:
+    if isinstance(v, DraftHistory):
+        return v.nbytes()
+    if isinstance(v, str):
+        return 49 + len(v)
+    if isinstance(v, (list, tuple, set)):
+        return 56 + sum(approx_bytes(x) for x in v)
+    if isinstance(v, dict):
+        return 64 + sum(approx_bytes(k) + approx_bytes(x) for k, x in v.items())
+    return 32
+
+def process_rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+def _spill_default(o):
+    if isinstance(o, date):
+        return {"__date__": o.isoformat()}
+    raise TypeError(type(o).__name__)
+
+def _spill_hook(d: dict):
+    return date.fromisoformat(d["__date__"]) if set(d) == {"__date__"} else d
+
+def session_manager():
+    """The server's session manager; None without a real Runtime (AppTest mocks it, bare mode has none)."""
+    return getattr(Runtime.instance(), "_session_mgr", None) if Runtime.exists() else None
+
+def session_state_by_id(sid: str):
+    """The SessionState owned by the tab's AppSession, or None once the tab is gone.
+    (ctx.session_state is a wrapper made fresh for every script run, so it can't be kept.)"""
+    info = session_manager().get_session_info(sid)
+    return info.session.session_state if info is not None else None
+
+class SessionRegistry:
+    """Process-wide view of live sessions, keyed by session id. Under the server the
+    session's state is looked up through the Runtime on every sweep, so nothing here keeps
+    a closed tab alive; idle sessions get their draft written to disk and dropped from memory."""
+
+    def __init__(self, spill_dir: str):
+        self.spill_dir = spill_dir
+        os.makedirs(spill_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self.sessions: Dict[str, dict] = {}
+        self._last_sweep = 0.0
+
+    def spill_path(self, sid: str) -> str:
+        return os.path.join(self.spill_dir, re.sub(r"[^0-9a-zA-Z-]", "", sid) + ".json.z")
+
+    def touch(self, sid: str, nbytes: int, state=None) -> None:
+        """state: only without a session manager (AppTest, bare mode), where sessions can't be looked up."""
+        with self._lock:
+            e = self.sessions.setdefault(sid, {})
+            e.update(state=state, last_seen=time.time(), bytes=nbytes)
+
+    def state_of(self, sid: str, e: dict):
+        if e["state"] is not None:
+            return e["state"]
+        return session_state_by_id(sid) if session_manager() is not None else None
+
+    def maybe_sweep(self, ttl: int = DRAFT_TTL_SECONDS) -> None:
+        now = time.time()
+        with self._lock:
+            if now - self._last_sweep < SWEEP_EVERY_SECONDS:
+                return
+            self._last_sweep = now
+            idle = [(sid, e) for sid, e in self.sessions.items() if now - e["last_seen"] > ttl]
+        for sid, e in idle:
+            state = self.state_of(sid, e)
+            if state is None:
+                with self._lock:
+                    self.sessions.pop(sid, None)
+            elif e["bytes"]:
+                # runs inside someone else's rerun: a session that can't be spilled stays in memory
+                try:
+                    self.spill(sid, state)
+                    e["bytes"] = 0
+                except Exception:
+                    get_metrics().inc("supersoap_spill_errors_total")
+        for f in os.listdir(self.spill_dir):
+            path = os.path.join(self.spill_dir, f)
+            if now - os.path.getmtime(path) > SPILL_KEEP_SECONDS:
+                os.remove(path)
+
+    def spill(self, sid: str, state) -> None:
+        values = {k: v for k, v in state.filtered_state.items() if _is_draft_value(k, v)}
+        with open(self.spill_path(sid), "wb") as f:
+            f.write(zlib.compress(json.dumps(values, default=_spill_default).encode("utf-8")))
+        # widget values come back from the browser on its next rerun; lists/overrides/history do not
+        for k in list(values) + ["_draft_history"]:
+            if k in state:
+                del state[k]
+
+    def take_spill(self, sid: str) -> Optional[dict]:
+        path = self.spill_path(sid)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            values = json.loads(zlib.decompress(f.read()).decode("utf-8"), object_hook=_spill_hook)
+        os.remove(path)
+        return values
+
+    def report(self) -> dict:
+        with self._lock:
+            entries = list(self.sessions.items())
+        live = [e for sid, e in entries if self.state_of(sid, e) is not None]
+        return {"sessions": len(live), "bytes": sum(e["bytes"] for e in live), "rss": process_rss_bytes()}
+
+@st.cache_resource
+def get_session_registry() -> SessionRegistry:
+    return SessionRegistry(os.path.join(DATA_DIR, "spill"))
+
+def account_session() -> Optional[dict]:
+    """Trim this session to SESSION_MAX_BYTES (oldest undo snapshots go first),
+    register it with the server-wide registry and let it evict idle sessions."""
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return None
+    nbytes = sum(approx_bytes(v) for v in st.session_state.to_dict().values())
+    h = draft_history()
+    while nbytes > SESSION_MAX_BYTES:
+        freed = h.drop_oldest()
+        if not freed:
+            break
+        nbytes -= freed
+    reg = get_session_registry()
+    reg.touch(ctx.session_id, nbytes, None if session_manager() is not None else ctx.session_state._state)
+    reg.maybe_sweep()
+    return {"bytes": nbytes, "spilled": os.path.exists(reg.spill_path(ctx.session_id)), **{f"server_{k}": v for k, v in reg.report().items()}}
+
+def restore_spilled_draft() -> None:
+    values = get_session_registry().take_spill(get_script_run_ctx().session_id) or {}
+    for k, v in values.items():
+        if k not in st.session_state:
+            st.session_state[k] = v
+
+def discard_spilled_draft() -> None:
+    get_session_registry().take_spill(get_script_run_ctx().session_id)
+
+# =========================
+# Rerun meter: time + bytes sent to the browser per rerun, per mode
+# =========================
+RERUN_METER_KEEP = 50
+
+def start_rerun_meter() -> Optional[dict]:
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return None
+    meter = {"t0": time.perf_counter(), "bytes": 0, "msgs": 0}
+    if not hasattr(ctx, "_supersoap_enqueue"):
+        ctx._supersoap_enqueue = ctx._enqueue
+    send = ctx._supersoap_enqueue
+    def counting(msg):
+        meter["bytes"] += msg.ByteSize()
+        meter["msgs"] += 1
+        send(msg)
+    ctx._enqueue = counting
+    return meter
+
+def finish_rerun_meter(meter: Optional[dict], slot, tab: str = "-") -> None:
+    if meter is None:
+        return
+    ms = (time.perf_counter() - meter["t0"]) * 1000
+    log = st.session_state.setdefault("rerun_meter", {"full": [], "lite": []})
+    mode = "lite" if is_lite() else "full"
+    metrics = get_metrics()
+    metrics.inc("supersoap_reruns_total", tab=tab)
+    metrics.observe("supersoap_rerun_seconds", ms / 1000, mode=mode)
+    metrics.maybe_export()
+    log[mode] = (log[mode] + [(ms, meter["bytes"], meter["msgs"])])[-RERUN_METER_KEEP:]
+    lines = [f"Rerun ini ({mode}): {ms:.0f} ms · {meter['bytes'] / 1024:.1f} KB · {meter['msgs']} elemen"]
+    for m in ("full", "lite"):
+        if log[m]:
+            n = len(log[m])
+            lines.append(f"Rata-rata {m} (n={n}): {sum(x[0] for x in log[m]) / n:.0f} ms · "
+                         f"{sum(x[1] for x in log[m]) / n / 1024:.1f} KB · {sum(x[2] for x in log[m]) / n:.0f} elemen")
+    slot.caption("  \n".join(lines))
+
+# =========================
+# Metrics (Prometheus text format): counters + latency histograms
+# =========================
+METRICS_FILE = os.path.join(DATA_DIR, "metrics.prom")
+METRICS_EXPORT_EVERY_SECONDS = 15
+METRICS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+METRICS_HELP = {
+    "supersoap_reruns_total": ("counter", "Script reruns, by the tab whose draft changed."),
+    "supersoap_rerun_seconds": ("histogram", "Server-side rerun duration."),
+    "supersoap_generate_total": ("counter", "Generate clicks by stage and case."),
+    "supersoap_parse_seconds": ("histogram", "Parser duration per call."),
+    "supersoap_parse_inputs_total": ("counter", "Distinct pasted inputs seen by each parser."),
+    "supersoap_parse_miss_total": ("counter", "Distinct inputs where a parser returned an empty field."),
+    "supersoap_parse_timeouts_total": ("counter", "Parses abandoned after exceeding the parse budget."),
+    "supersoap_spill_errors_total": ("counter", "Idle sessions that could not be spilled to disk."),
+    "supersoap_paste_truncated_total": ("counter", "Pastes cut down to the size cap before parsing."),
+    "supersoap_warm_start_seconds": ("histogram", "Building the shared read-only assets, once per server process."),
+    "supersoap_first_interactive_seconds": ("histogram", "First script run of a session, first session of the process vs the rest."),
+}
+# draft key prefix -> tab, for attributing a rerun
+DRAFT_GROUP_TAB = {"awal": "Awal", "alergi": "Awal", "sistemik": "Awal", "obat": "Awal",
+                   "pre": "Pre-Op", "preop": "Pre-Op", "POD 0": "POD 0", "POD 1": "POD 1", "podseri": "POD n",
+                   "lapop": "Laporan Operasi", "arsip": "Arsip"}
+
+def _label_str(labels: tuple, extra: str = "") -> str:
+    parts = ['%s="%s"' % (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Metrics:
+    """Each script thread writes to its own shard, so the hot path takes no lock.
+    Shards of finished threads are folded into a base shard when rendering."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._shards: List[Tuple[weakref.ref, dict]] = []
+        self._base = {"c": {}, "h": {}}
+        self._last_export = 0.0
+
+    def _shard(self) -> dict:
+        sh = getattr(self._local, "shard", None)
+        if sh is None:
+            sh = self._local.shard = {"c": {}, "h": {}}
+            with self._lock:
+                self._fold_dead()
+                self._shards.append((weakref.ref(threading.current_thread()), sh))
+        return sh
+
+    def inc(self, name: str, n: float = 1, **labels) -> None:
+        c = self._shard()["c"]
+        key = (name, tuple(sorted(labels.items())))
+        c[key] = c.get(key, 0) + n
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        h = self._shard()["h"]
+        key = (name, tuple(sorted(labels.items())))
+        row = h.get(key)
+        if row is None:
+            row = h[key] = [0] * (len(METRICS_BUCKETS) + 2)
+        for i, le in enumerate(METRICS_BUCKETS):
+            if seconds <= le:
+                row[i] += 1
+                break
+        row[-2] += seconds
+        row[-1] += 1
+
+    @staticmethod
+    def _merge(into: dict, sh: dict) -> None:
+        for key, v in dict(sh["c"]).items():
+            into["c"][key] = into["c"].get(key, 0) + v
+        for key, row in dict(sh["h"]).items():
+            acc = into["h"].setdefault(key, [0] * len(row))
+            for i, v in enumerate(list(row)):
+                acc[i] += v
+
+    def _fold_dead(self) -> None:
+        live = []
+        for ref, sh in self._shards:
+            thread = ref()
+            if thread is None or not thread.is_alive():
+                self._merge(self._base, sh)
+            else:
+                live.append((ref, sh))
+        self._shards = live
+
+    def render(self) -> str:
+        with self._lock:
+            self._fold_dead()
+            total = {"c": {}, "h": {}}
+            self._merge(total, self._base)
+            for _, sh in self._shards:
+                self._merge(total, sh)
+        series: Dict[str, List[str]] = {}
+        for (name, labels), v in sorted(total["c"].items()):
+            series.setdefault(name, []).append(f"{name}{_label_str(labels)} {v:g}")
+        for (name, labels), row in sorted(total["h"].items()):
+            lines = series.setdefault(name, [])
+            cum = 0
+            for le, n in zip(METRICS_BUCKETS, row):
+                cum += n
+                lines.append(f"{name}_bucket{_label_str(labels, 'le=%s' % json.dumps('%g' % le))} {cum}")
+            lines.append(f"{name}_bucket{_label_str(labels, 'le=' + json.dumps('+Inf'))} {row[-1]}")
+            lines.append(f"{name}_sum{_label_str(labels)} {row[-2]:.6f}")
+            lines.append(f"{name}_count{_label_str(labels)} {row[-1]}")
+        out = []
+        for name, lines in series.items():
+            kind, help_text = METRICS_HELP.get(name, ("untyped", ""))
+            out += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"] + lines
+        return "\n".join(out) + "\n"
+
+    def maybe_export(self, path: str = METRICS_FILE) -> None:
+        now = time.time()
+        if now - self._last_export < METRICS_EXPORT_EVERY_SECONDS:
+            return
+        self._last_export = now
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+
+def _serve_metrics(metrics: Metrics, port: int) -> None:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="supersoap-metrics").start()
+
+@st.cache_resource
+def get_metrics() -> Metrics:
+    m = Metrics()
+    port = os.environ.get("SUPERSOAP_METRICS_PORT")
+    if port:
+        _serve_metrics(m, int(port))
+    return m
+
+def rerun_tab(changed: List[str]) -> str:
+    if is_lite():
+        return st.session_state.get("lite_stage") or "-"
+    clicked = [k for k, v in st.session_state.items() if v is True and isinstance(k, str) and k.endswith("_gen")]
+    for g in list(changed) + [_draft_group(k) for k in clicked]:
+        if g in DRAFT_GROUP_TAB:
+            return DRAFT_GROUP_TAB[g]
+    return "-"
+
+PARSE_MISS_FIELDS = ["nama", "jk", "umur", "rm", "S", "O_generalis", "EO", "IO", "A", "tindakan_hint", "residen", "dpjp"]
+
+def timed_parse(name: str, fn, text: str, fallback=None):
+    """Run a parser under the parse budget, timing every call; misses are counted once per
+    distinct paste. On timeout the caller gets `fallback` and a warning is shown."""
+    t0 = time.perf_counter()
+    metrics = get_metrics()
+    try:
+        with parse_budget():
+            out = fn(text)
+    except ParseTimeout:
+        metrics.inc("supersoap_parse_timeouts_total", parser=name)
+        st.warning(f"Parsing dihentikan (> {PARSE_BUDGET_SECONDS * 1000:.0f} ms) — isi manual dari teks yang di-paste.")
+        return fallback
+    metrics.observe("supersoap_parse_seconds", time.perf_counter() - t0, parser=name)
+    seen = st.session_state.setdefault("_parse_seen", {})
+    digest = zlib.crc32(text.encode("utf-8"))
+    if seen.get(name) != digest:
+        seen[name] = digest
+        metrics.inc("supersoap_parse_inputs_total", parser=name)
+        missed = [f for f in PARSE_MISS_FIELDS if not getattr(out, f)] if isinstance(out, ParsedSoap) else ([] if out else ["result"])
+        for f in missed:
+            metrics.inc("supersoap_parse_miss_total", parser=name, field=f)
+    return out
 
 # =========================
 # EO/IO smart builders for ALL cases
 # =========================
-def eo_common_face(prefix: str):
-    """Common EO line: face symmetry + mouth opening. Prefix ensures unique widget keys."""
+def eo_face_parts(prefix: str) -> Tuple[str, str]:
+    """Face symmetry + mouth opening selectboxes. Prefix ensures unique widget keys."""
     face = st.selectbox(
         "Wajah",
         ["Wajah simetris", "Wajah asimetris"],
@@ -382,50 +920,56 @@ def eo_common_face(prefix: str):
         index=0,
         key=f"{prefix}_bukaan_mulut",
     )
+    return face, om
+
+def eo_common_face(prefix: str):
+    """Common EO line: face symmetry + mouth opening."""
+    face, om = eo_face_parts(prefix)
     return f"{face} dengan {om}"
 
+def shorthand_input(ns: str, kind: str, parse, placeholder: str) -> Optional[dict]:
+    """Shorthand line above a checklist; when filled it replaces the checklist widgets."""
+    line = st.text_input("⚡ Shorthand (opsional, ganti checklist)", value="", key=f"{ns}_{kind}_shorthand", placeholder=placeholder)
+    if not clean(line):
+        return None
+    state, errors = parse(line)
+    if errors:
+        st.warning("Tidak dikenali: " + ", ".join(f"`{e}`" for e in errors))
+    return state
+
 def impaksi_builder(ns: str):
     st.subheader("EO/IO Cepat — Impaksi")
-    eo_lines=[eo_common_face(f"{ns}_impaksi")]
-
-    st.markdown("**Gigi impaksi**")
-    selected = st.multiselect("Pilih gigi", options=["18","28","38","48"], default=["18","28","38","48"], key=f"{ns}_impaksi_pilih_gigi")
-    erupt = st.selectbox("Status erupsi", ["Unerupted", "Partial erupted", "Fully erupted"], index=0)
-
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        hyper = st.checkbox("Hiperemis (+)", value=False)
-    with col2:
-        palp = st.checkbox("Nyeri palpasi (+)", value=False)
-    with col3:
-        perk = st.checkbox("Nyeri perkusi (+)", value=False)
-
-    io_lines=[]
-    if selected:
-        tags=[
-            "hiperemis (+)" if hyper else "hiperemis (-)",
-            "palpasi (+)" if palp else "palpasi (-)",
-            "perkusi (+)" if perk else "perkusi (-)",
-        ]
-        io_lines.append(f"{erupt} gigi {', '.join(selected)} dengan {', '.join(tags)}")
-
-    # detail if positive
-    if hyper:
-        det = st.text_input("Hiperemis di bagian mana?", value="")
-        if det: io_lines.append(f"Hiperemis: {det}")
-    if palp:
-        det = st.text_input("Nyeri palpasi di bagian mana?", value="")
-        if det: io_lines.append(f"Nyeri palpasi: {det}")
-    if perk:
-        det = st.text_input("Nyeri perkusi di gigi mana?", value="")
-        if det: io_lines.append(f"Nyeri perkusi: {det}")
-
-    kalk = st.selectbox("Kalkulus", ["Kalkulus (+)", "Kalkulus (-)"], index=0)
-    oh = st.selectbox("OH", ["OH Baik", "OH sedang", "OH buruk"], index=0)
-    io_lines += [kalk, oh]
-
-    extra = st.text_area("Tambahan IO (opsional, 1 baris = 1 poin)", height=90)
-    io_lines += [clean(x) for x in extra.splitlines() if clean(x)]
+    state = shorthand_input(ns, "impaksi", impaksi_from_shorthand, "38,48 PE hip- pal+ perk- kalk+ OH sdg")
+    if state is None:
+        state = impaksi_default()
+        state["wajah"], state["bukaan"] = eo_face_parts(f"{ns}_impaksi")
+
+        st.markdown("**Gigi impaksi**")
+        state["gigi"] = st.multiselect("Pilih gigi", options=["18","28","38","48"], default=["18","28","38","48"], key=f"{ns}_impaksi_pilih_gigi")
+        state["erupsi"] = st.selectbox("Status erupsi", ["Unerupted", "Partial erupted", "Fully erupted"], index=0, key=f"{ns}_impaksi_erupsi")
+
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            state["hiperemis"] = st.checkbox("Hiperemis (+)", value=False, key=f"{ns}_impaksi_hip")
+        with col2:
+            state["palpasi"] = st.checkbox("Nyeri palpasi (+)", value=False, key=f"{ns}_impaksi_pal")
+        with col3:
+            state["perkusi"] = st.checkbox("Nyeri perkusi (+)", value=False, key=f"{ns}_impaksi_perk")
+
+        # detail if positive
+        if state["hiperemis"]:
+            state["detail"]["hiperemis"] = st.text_input("Hiperemis di bagian mana?", value="", key=f"{ns}_impaksi_hip_det")
+        if state["palpasi"]:
+            state["detail"]["palpasi"] = st.text_input("Nyeri palpasi di bagian mana?", value="", key=f"{ns}_impaksi_pal_det")
+        if state["perkusi"]:
+            state["detail"]["perkusi"] = st.text_input("Nyeri perkusi di gigi mana?", value="", key=f"{ns}_impaksi_perk_det")
+
+        state["kalkulus"] = st.selectbox("Kalkulus", ["Kalkulus (+)", "Kalkulus (-)"], index=0, key=f"{ns}_impaksi_kalk")
+        state["oh"] = st.selectbox("OH", ["OH Baik", "OH sedang", "OH buruk"], index=0, key=f"{ns}_impaksi_oh")
+        st.caption(f"Shorthand: `{impaksi_to_shorthand(state)}`")
+
+    eo_lines, io_lines = impaksi_lines(state)
+    io_lines += extra_io_lines("Tambahan IO (opsional, 1 baris = 1 poin)")
     return eo_lines, io_lines
 
 def infeksi_builder(kind: str):
@@ -474,7 +1018,7 @@ def infeksi_builder(kind: str):
             "nyeri palpasi (+)" if palp_io else "nyeri palpasi (-)",
             "nyeri perkusi (+)" if perk_io else "nyeri perkusi (-)",
         ]
-        io_lines.append(f"{dx_text} ar gigi {', '.join(gigi)} dengan {', '.join(tags)}, pus discharge {pus}")
+        io_lines.append(f"{dx_text} ar gigi {compact_teeth(gigi)} dengan {', '.join(tags)}, pus discharge {pus}")
     else:
         io_lines.append(f"{dx_text} dengan pus discharge {pus}")
 
@@ -482,8 +1026,7 @@ def infeksi_builder(kind: str):
     oh = st.selectbox("OH", ["OH Baik", "OH sedang", "OH buruk"], index=2)
     io_lines += [kalk, oh]
 
-    extra = st.text_area("Tambahan IO (opsional, 1 baris = 1 poin)", height=90)
-    io_lines += [clean(x) for x in extra.splitlines() if clean(x)]
+    io_lines += extra_io_lines("Tambahan IO (opsional, 1 baris = 1 poin)")
     return eo_lines, io_lines
 
 def tumor_builder(ns: str):
@@ -531,8 +1074,7 @@ def tumor_builder(ns: str):
     oh = st.selectbox("OH", ["OH Baik", "OH sedang", "OH buruk"], index=0)
     io_lines += [kalk, oh]
 
-    extra = st.text_area("Tambahan IO (opsional)", height=90)
-    io_lines += [clean(x) for x in extra.splitlines() if clean(x)]
+    io_lines += extra_io_lines("Tambahan IO (opsional)")
     return eo_lines, io_lines
 
 def cyst_builder():
@@ -579,7 +1121,7 @@ def cyst_builder():
         if disc: tags.append("diskolorisasi (+)")
         if kar != "-": tags.append(kar)
         if tags:
-            io_lines.append(f"Temuan gigi {', '.join(t_tooth)}: " + ", ".join(tags) + ".")
+            io_lines.append(f"Temuan gigi {compact_teeth(t_tooth)}: " + ", ".join(tags) + ".")
 
     ortho = st.checkbox("Ada piranti ortodontik?", value=False)
     if ortho:
@@ -589,8 +1131,7 @@ def cyst_builder():
     oh = st.selectbox("OH", ["OH Baik", "OH sedang", "OH buruk"], index=0)
     io_lines += [kalk, oh]
 
-    extra = st.text_area("Tambahan IO (opsional)", height=90)
-    io_lines += [clean(x) for x in extra.splitlines() if clean(x)]
+    io_lines += extra_io_lines("Tambahan IO (opsional)")
     return eo_lines, io_lines
 
 def tmd_builder(ns: str):
@@ -634,75 +1175,48 @@ def tmd_builder(ns: str):
     oh = st.selectbox("OH", ["OH Baik", "OH sedang", "OH buruk"], index=1)
     io_lines += [kalk, oh]
 
-    extra = st.text_area("Tambahan IO (opsional)", height=90, placeholder="Contoh:\nFully erupted gigi 18, 48 dengan hiperemis (+)...\nEdentulous a.r gigi 28, 38")
-    io_lines += [clean(x) for x in extra.splitlines() if clean(x)]
+    io_lines += extra_io_lines("Tambahan IO (opsional)", placeholder="Contoh:\nFully erupted gigi 18, 48 dengan hiperemis (+)...\nEdentulous a.r gigi 28, 38")
     return eo_lines, io_lines
 
 def fraktur_builder(ns: str):
     st.subheader("EO/IO Cepat — Fraktur/Trauma")
-    eo_lines=[]
-    face = st.selectbox("Wajah", ["Wajah asimetris", "Wajah simetris"], index=0)
-    nasal_dev = st.selectbox("Deviasi nasal", ["(+)", "(-)"], index=0)
-    nasal_side = st.selectbox("Arah deviasi (kalau +)", ["dextra", "sinistra"], index=0)
-    mouth_open = st.selectbox("Bukaan mulut", ["normal", "terbatas"], index=0)
-
-    eo_lines.append(f"{face}" + (f" dengan deviasi nasal ke arah {nasal_side}" if nasal_dev=="(+)" else "") + f" dan bukaan mulut {mouth_open}")
-
-    st.markdown("**Tanda fraktur rahang**")
-    c1,c2,c3,c4 = st.columns(4)
-    with c1: malok = st.selectbox("Maloklusi", ["(+)", "(-)"], index=1)
-    with c2: floatj = st.selectbox("Floating jaw", ["(+)", "(-)"], index=1)
-    with c3: step = st.selectbox("Step deformity", ["(+)", "(-)"], index=1)
-    with c4: trismus = st.selectbox("Trismus", ["(+)", "(-)"], index=1)
-    eo_lines += [f"Maloklusi {malok}", f"Floating jaw {floatj}", f"Step deformity {step}"]
-    if trismus=="(+)":
-        bm = st.text_input("Bukaan mulut (mm)", value="")
-        if bm: eo_lines.append(f"Bukaan mulut ± {bm} mm")
-
-    st.markdown("**Cedera intraoral/dentoalveolar**")
-    io_lines=[]
-    # vulnus
-    vulnus = st.checkbox("Vulnus laceratum?", value=True)
-    if vulnus:
-        area = st.text_input("Lokasi vulnus (contoh: ar gigi 12-22)", value="")
-        hyper = st.selectbox("Hiperemis", ["(+)", "(-)"], index=0)
-        clot = st.selectbox("Blood clot", ["(+)", "(-)"], index=1)
-        bleed = st.selectbox("Active bleeding", ["(+)", "(-)"], index=1)
-        line = "Vulnus laceratum"
-        if area: line += f" {area}"
-        line += f" dengan hiperemis {hyper}, blood clot {clot}, active bleeding {bleed}"
-        io_lines.append(line)
-
-    intrusion_teeth = st.multiselect("Intrusi gigi (opsional)", TEETH, default=[])
-    if intrusion_teeth:
-        io_lines.append(f"Intrusi gigi {', '.join(intrusion_teeth)}")
-
-    avulsion = st.multiselect("Avulsi gigi (opsional)", TEETH, default=[])
-    if avulsion:
-        io_lines.append(f"Avulsi gigi {', '.join(avulsion)}")
-
-    mobility = st.multiselect("Mobile gigi (opsional)", TEETH, default=[])
-    if mobility:
-        deg = st.selectbox("Derajat mobile", ["°1","°2","°3"], index=1)
-        io_lines.append(f"Mobile {deg} gigi {', '.join(mobility)}")
-
-    ellis2 = st.multiselect("Fraktur Ellis Klas II", TEETH, default=[])
-    if ellis2:
-        io_lines.append(f"Fraktur Ellis Klas II gigi {', '.join(ellis2)}")
-    ellis5 = st.multiselect("Fraktur Ellis Klas V", TEETH, default=[])
-    if ellis5:
-        io_lines.append(f"Fraktur Ellis Klas V gigi {', '.join(ellis5)}")
-
-    sisa = st.multiselect("Sisa akar", TEETH, default=[])
-    if sisa:
-        io_lines.append(f"Sisa akar ar gigi {', '.join(sisa)}")
-
-    kalk = st.selectbox("Kalkulus", ["Kalkulus (+)", "Kalkulus (-)"], index=1)
-    oh = st.selectbox("OH", ["OH Baik", "OH sedang", "OH buruk"], index=0)
-    io_lines += [kalk, oh]
-
-    extra = st.text_area("Tambahan IO (opsional)", height=90)
-    io_lines += [clean(x) for x in extra.splitlines() if clean(x)]
+    state = shorthand_input(ns, "fraktur", fraktur_from_shorthand, "asim nasal+dx malok+ trismus+15 vl@ar_gigi_12-22 intr:11,21 mob2:31-42 kalk- OH baik")
+    if state is None:
+        state = fraktur_default()
+        state["wajah"] = st.selectbox("Wajah", ["Wajah asimetris", "Wajah simetris"], index=0, key=f"{ns}_fraktur_wajah")
+        state["deviasi_nasal"] = st.selectbox("Deviasi nasal", ["(+)", "(-)"], index=0, key=f"{ns}_fraktur_nasal")
+        state["arah_nasal"] = st.selectbox("Arah deviasi (kalau +)", ["dextra", "sinistra"], index=0, key=f"{ns}_fraktur_nasal_arah")
+        state["bukaan"] = st.selectbox("Bukaan mulut", ["normal", "terbatas"], index=0, key=f"{ns}_fraktur_bukaan")
+
+        st.markdown("**Tanda fraktur rahang**")
+        c1,c2,c3,c4 = st.columns(4)
+        with c1: state["maloklusi"] = st.selectbox("Maloklusi", ["(+)", "(-)"], index=1, key=f"{ns}_fraktur_malok")
+        with c2: state["floating"] = st.selectbox("Floating jaw", ["(+)", "(-)"], index=1, key=f"{ns}_fraktur_float")
+        with c3: state["step"] = st.selectbox("Step deformity", ["(+)", "(-)"], index=1, key=f"{ns}_fraktur_step")
+        with c4: state["trismus"] = st.selectbox("Trismus", ["(+)", "(-)"], index=1, key=f"{ns}_fraktur_trismus")
+        if state["trismus"]=="(+)":
+            state["bukaan_mm"] = st.text_input("Bukaan mulut (mm)", value="", key=f"{ns}_fraktur_bm")
+
+        st.markdown("**Cedera intraoral/dentoalveolar**")
+        # vulnus
+        state["vulnus"] = st.checkbox("Vulnus laceratum?", value=True, key=f"{ns}_fraktur_vulnus")
+        if state["vulnus"]:
+            state["vulnus_area"] = st.text_input("Lokasi vulnus (contoh: ar gigi 12-22)", value="", key=f"{ns}_fraktur_vulnus_area")
+            state["vulnus_hiperemis"] = st.selectbox("Hiperemis", ["(+)", "(-)"], index=0, key=f"{ns}_fraktur_vulnus_hip")
+            state["blood_clot"] = st.selectbox("Blood clot", ["(+)", "(-)"], index=1, key=f"{ns}_fraktur_clot")
+            state["bleeding"] = st.selectbox("Active bleeding", ["(+)", "(-)"], index=1, key=f"{ns}_fraktur_bleed")
+
+        st.caption("Odontogram (centang temuan per gigi, opsional)")
+        state["odontogram"] = odontogram_editor(f"{ns}_fraktur_odontogram", FRAKTUR_TEMUAN)
+        if state["odontogram"].mask("Mobile"):
+            state["mobile_derajat"] = st.selectbox("Derajat mobile", ["°1","°2","°3"], index=1, key=f"{ns}_fraktur_mob_deg")
+
+        state["kalkulus"] = st.selectbox("Kalkulus", ["Kalkulus (+)", "Kalkulus (-)"], index=1, key=f"{ns}_fraktur_kalk")
+        state["oh"] = st.selectbox("OH", ["OH Baik", "OH sedang", "OH buruk"], index=0, key=f"{ns}_fraktur_oh")
+        st.caption(f"Shorthand: `{fraktur_to_shorthand(state)}`")
+
+    eo_lines, io_lines = fraktur_lines(state)
+    io_lines += extra_io_lines("Tambahan IO (opsional)")
     return eo_lines, io_lines
 
 def fistula_builder(ns: str):
@@ -720,6 +1234,10 @@ def generic_eo_io():
     return [clean(x) for x in eo.splitlines() if clean(x)], [clean(x) for x in io.splitlines() if clean(x)]
 
 def build_eo_io(case_name: str, ns: str):
+    with batched(f"{ns}_eoio_form", "Terapkan EO/IO"):
+        return _build_eo_io(case_name, ns)
+
+def _build_eo_io(case_name: str, ns: str):
     if case_name == "Impaksi":
         return impaksi_builder(ns)
     if case_name in ["Abses", "Selulitis"]:
@@ -737,244 +1255,1210 @@ def build_eo_io(case_name: str, ns: str):
     return generic_eo_io()
 
 # =========================
-# Stage builders
+# Report archive (append-only, compressed segments)
 # =========================
-def build_awal(case_name: str, ident: dict, ttv: dict, eo_lines: List[str], io_lines: List[str], keluhan: str, h: dict, A_lines: List[str], plan_lines: List[str], residen: str, dpjp: str, rs: str, tgl: date) -> str:
-    hari = day_name_id(tgl)
-    header = f"Assalamualaikum dokter.\nMaaf mengganggu, izin melaporkan Pasien Rawat Jalan {rs}, {hari} ({fmt_ddmmyyyy(tgl)})\n\n"
-    ident_line = f"{ident['nama']} / {ident['jk']} / {ident['umur']} / Rawat Jalan / {ident['pembiayaan']} / {rs} / RM {ident['rm']}\n\n"
-    og = [
-        f"KU : {ttv['ku']}",
-        f"TD : {ttv['td']}",
-        f"N   : {ttv['nadi']} x/menit",
-        f"P   : {ttv['rr']} x/menit",
-        f"S   : {ttv['temp']} °C",
-        f"SpO2: {ttv['spo2']}% (free air)",
-        f"BB : {ttv['bb']} kg",
-        f"TB : {ttv['tb']} cm",
+ARCHIVE_SEGMENT_MAX_BYTES = 4 * 1024 * 1024
+ARCHIVE_ZDICT_VERSION = 1
+
+def _archive_zdict() -> bytes:
+    """Preset deflate dictionary built from the boilerplate every builder emits.
+    Append-only: records store the version they were written with, so never edit
+    these samples in place -- add a new version instead."""
+    b = "•⁠  ⁠"
+    samples = [
+        "Kalkulus (-)", "OH sedang", "OH buruk", "KGB Kiri: tidak teraba, tidak sakit",
+        "Wajah asimetris dengan pembengkakan regio ", " dengan ukuran ± ", " cm, konsistensi lunak, nyeri palpasi (+), fluktuasi (-), hiperemis (-), suhu lebih hangat, warna lebih merah dari jaringan sekitar.",
+        "Unerupted gigi 18, 28, 38, 48 dengan hiperemis (-), palpasi (-), perkusi (-)",
+        "Partial erupted gigi ", "Karies profunda ar gigi ", "pus discharge (-)",
+        "Luka operasi: Kering\nBau: Tidak\n", "Tidak ada keluhan nyeri pada daerah operasi.",
+        "A:\n" + b + "Post operative state\n\n",
+        "Tidak ada riwayat alergi obat dan makanan. Riwayat penyakit sistemik disangkal. "
+        "Saat ini pasien tidak dalam kondisi batuk, demam, flu, dan diare.",
+        "Pemeriksaan penunjang :\nDarah rutin\nWBC\nHGB\nPLT\nCT/BT\nGDS\nHbsAg non reaktif\nFoto panoramik\n",
+        b + "ACC TS Anestesi\n" + b + "IVFD RL 20 tpm (makrodrips)\n",
+        b + "Puasa 6 jam pre op atau sesuai instruksi dari TS. Anestesi yaitu mulai Pukul ",
+        b + "Pasien menyikat gigi sebelum tidur dan sebelum ke kamar operasi\n",
+        b + "Gunakan masker bedah saat ke kamar operasi\n",
+        b + "Pasien rencana diberikan antibiotik profilaksis Ceftriaxone 1 gr, 1 jam sebelum operasi (skin test terlebih dahulu) pada Pukul ",
+        b + "Pro Odontektomi gigi 18, 28, 38, 48 dalam general anestesi pada hari ",
+        "O:\nStatus Generalis:\nKU : Baik/Compos Mentis\nTD : 120/70 mmHg\nN   : 80 x/menit\nP   : 19 x/menit\nS   : 36.7 °C\n"
+        "SpO2: 99% (free air)\nBB : ",
+        "Status Lokalis:\nE.O:\n" + b + "Wajah simetris dengan bukaan mulut normal\n\nI.O:\n" + b,
+        "Kalkulus (+)\n" + b + "OH Baik\n\n",
+        "Mohon instruksi selanjutnya dokter.\nTerima kasih.\n\nResiden: ",
+        "\n\nDPJP : drg. ",
+        " / BPJS / Rawat Inap / Kamar ",
+        " / RSGMP UNHAS / RM ",
+        "Assalamualaikum dok,\nMaaf mengganggu, izin melaporkan Pasien Rawat Inap RSGMP UNHAS, ",
+        "Assalamualaikum dokter.\nMaaf mengganggu, izin melaporkan Pasien Rencana Operasi RSGMP UNHAS, ",
+        "Assalamualaikum dokter.\nMaaf mengganggu, izin melaporkan Pasien Rawat Jalan RSGMP UNHAS, ",
     ]
-    S = f"Pasien {ident['jk_long']} datang dengan keluhan {keluhan}. " + build_history_sentence(h)
-    return (
-        header + ident_line +
-        f"S: {S}\n\n"
-        "O:\nStatus Generalis:\n" + "\n".join(og) + "\n\n"
-        "Status Lokalis:\nE.O:\n" + join_bullets(eo_lines) + "\n\n"
-        "I.O:\n" + join_bullets(io_lines) + "\n\n"
-        "A:\n" + join_bullets(A_lines, bullet="•⁠  ⁠") + "\n\n"
-        "P:\n" + join_bullets(plan_lines, bullet="•⁠  ⁠") + "\n\n"
-        "Mohon instruksi selanjutnya dok.\nTerima kasih.\n\n"
-        f"Residen: {residen}\n\nDPJP : {dpjp}\n"
-    )
+    # zlib looks back from the end of the dictionary, so the most common strings go last
+    return "\n".join(samples).encode("utf-8")
 
-def build_preop(parsed: ParsedSoap, overrides: dict, penunjang_block_raw: str, plan_lines: List[str], tindakan: str, anestesi: str, jam_op: str, zona: str, tgl_lap: date, tgl_op: date, residen: str, dpjp: str, meds: List[str]) -> str:
-    hari_lap = day_name_id(tgl_lap)
-    hari_op = day_name_id(tgl_op)
-    header = f"{parsed.sapaan}\n{parsed.pembuka} Pasien Rencana Operasi {overrides['rs']}, {hari_lap} ({fmt_ddmmyyyy(tgl_lap)})\n\n"
-    ident = f"{overrides['nama']} / {overrides['jk']} / {overrides['umur']} / {overrides['pembiayaan']} / Rawat Inap / {overrides['kamar']} / {overrides['rs']} / RM {overrides['rm']}\n\n"
-    pen = ("Pemeriksaan penunjang :\n" + penunjang_block_raw.strip() + "\n\n") if clean(penunjang_block_raw) else ""
-    tindakan_final = f"•⁠  ⁠Pro {tindakan} dalam {anestesi} pada hari {hari_op}, {fmt_ddmmyyyy(tgl_op)} Pukul {jam_op} {zona} di {overrides['rs']}"
-    meds = [x for x in meds if clean(x)]
-    meds_block = ("\nMedikasi:\n" + join_bullets(meds, bullet="•⁠  ⁠") + "\n") if meds else ""
-    return (
-        header + ident +
-        f"S: {overrides['S']}\n\n"
-        "O:\nStatus Generalis:\n" + (overrides['O_generalis'] + "\n\n" if clean(overrides['O_generalis']) else "\n") +
-        "Status Lokalis:\nEO:\n" + (overrides['EO'] + "\n\n" if clean(overrides['EO']) else "\n") +
-        "IO:\n" + (overrides['IO'] + "\n\n" if clean(overrides['IO']) else "\n") +
-        pen +
-        "A:\n" + (overrides['A'] + "\n\n" if clean(overrides['A']) else "\n") +
-        "P:\n" + join_bullets(plan_lines, bullet="•⁠  ⁠") + "\n" +
-        tindakan_final + "\n\n" +
-        meds_block +
-        "Mohon instruksi selanjutnya dokter.\nTerima kasih.\n\n"
-        f"Residen: {residen}\n\nDPJP : {dpjp}\n"
-    )
+_ARCHIVE_ZDICTS = {ARCHIVE_ZDICT_VERSION: _archive_zdict()}
+
+ARCHIVE_COLS = ["id", "rm", "tgl", "stage", "case_name", "nama", "created"]
+
+def _date_range_where(col: str, date_from: Optional[date], date_to: Optional[date], where: list, args: list) -> Tuple[list, list]:
+    if date_from:
+        where.append(f"{col} >= ?")
+        args.append(date_from.isoformat())
+    if date_to:
+        where.append(f"{col} <= ?")
+        args.append(date_to.isoformat())
+    return where, args
 
 # =========================
-# UI
+# Full-text search over the archive
 # =========================
-st.set_page_config(page_title="SuperSOAP v5", layout="centered")
-st.title("SuperSOAP v5 — EO/IO Smart Builder untuk Semua Kasus")
+# query prefix -> FTS column, e.g. "dpjp:budi gigi:38 kasus:impaksi"
+FTS_FIELDS = {
+    "gigi": "gigi", "dx": "diagnosis", "diagnosis": "diagnosis", "tindakan": "tindakan",
+    "kasus": "case_name", "case": "case_name", "stage": "stage", "residen": "residen", "dpjp": "dpjp",
+}
+# bm25 weights in reports_fts column order: body, gigi, diagnosis, tindakan, case_name, stage, residen, dpjp
+FTS_WEIGHTS = "1.0, 6.0, 4.0, 4.0, 3.0, 3.0, 2.0, 2.0"
+STAGE_SEARCH_LABEL = {"Awal": "Awal", "PreOp": "PreOp Pre-Op", "POD0": "POD0 POD 0", "POD1": "POD1 POD 1"}
 
-tab_awal, tab_preop, tab_pod0, tab_pod1, tab_lapop = st.tabs(["Awal", "Pre-Op", "POD 0", "POD 1", "Laporan Operasi"])
+def teeth_in(text: str) -> List[str]:
+    found = set(re.findall(r"(?<![\d.,/])([1-4][1-8])(?![\d./])", text or ""))
+    return [t for t in TEETH if t in found]
 
-# ---- AWAL
-with tab_awal:
-    st.caption("Awal = pasien baru datang. Form + checklist EO/IO (semi otomatis).")
-    case_name = st.selectbox("Kasus", CASES, index=CASES.index("Impaksi"), key="awal_case")
+def report_search_fields(text: str) -> dict:
+    p = parse_raw_soap_preop_only(text)
+    return {
+        "gigi": " ".join(teeth_in("\n".join([p.EO, p.IO, p.A, p.tindakan_hint]))),
+        "diagnosis": p.A,
+        "tindakan": p.tindakan_hint,
+        "residen": p.residen,
+        "dpjp": p.dpjp,
+    }
 
-    st.subheader("Identitas")
-    c1,c2 = st.columns(2)
-    with c1:
-        nama = st.text_input("Nama (Tn./Ny./Nn./An.)", value="", key="awal_nama")
-        jk = st.selectbox("JK", ["L","P"], index=1, key="awal_jk")
-        umur = st.text_input("Umur", value="", key="awal_umur")
-        pembiayaan = st.text_input("Pembiayaan", value="BPJS", key="awal_pay")
-    with c2:
-        rm = st.text_input("RM", value="", key="awal_rm")
-        rs = st.text_input("RS", value="RSGMP UNHAS", key="awal_rs")
-        tanggal = st.date_input("Tanggal", value=datetime.now(TZ).date(), key="awal_tgl")
+def fts_query(q: str) -> str:
+    """Turn the search box into an FTS5 MATCH expression: bare words are
+    prefix terms, "quoted text" is a phrase, field:value targets one column."""
+    terms=[]
+    for field, val in re.findall(r'(?:(\w+):)?("[^"]*"|[^\s"]+)', q or ""):
+        words = re.findall(r"\w+", val)
+        col = FTS_FIELDS.get(field.lower()) if field else None
+        if field and not col:
+            words = re.findall(r"\w+", field) + words
+        if not words:
+            continue
+        if col:
+            terms.append(f'{col} : "{" ".join(words)}"*')
+        elif val.startswith('"'):
+            terms.append(f'"{" ".join(words)}"')
+        else:
+            terms += [f'"{w}"*' for w in words]
+    return " AND ".join(terms)
+
+class ReportArchive:
+    """Generated reports appended to raw-deflate segment files. Each report is
+    compressed on its own against the shared dictionary, so reading one back is a
+    single seek + read; the SQLite index maps RM/date to (segment, offset, length)."""
+
+    def __init__(self, root: str, segment_max_bytes: int = ARCHIVE_SEGMENT_MAX_BYTES):
+        self.root = root
+        self.segment_max_bytes = segment_max_bytes
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(os.path.join(root, "index.sqlite3"), check_same_thread=False)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS reports (
+                id INTEGER PRIMARY KEY,
+                rm TEXT NOT NULL, tgl TEXT NOT NULL, stage TEXT NOT NULL,
+                case_name TEXT NOT NULL DEFAULT '', nama TEXT NOT NULL DEFAULT '',
+                created TEXT NOT NULL,
+                seg INTEGER NOT NULL, off INTEGER NOT NULL, len INTEGER NOT NULL,
+                zdict INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS reports_rm_tgl ON reports(rm, tgl);
+            CREATE INDEX IF NOT EXISTS reports_tgl ON reports(tgl);
+            CREATE VIRTUAL TABLE IF NOT EXISTS reports_fts USING fts5(
+                body, gigi, diagnosis, tindakan, case_name, stage, residen, dpjp,
+                content='', tokenize='unicode61 remove_diacritics 2'
+            );
+        """)
+        if "sections" not in {r[1] for r in self.db.execute("PRAGMA table_info(reports)")}:
+            # section layout as JSON [[name, chars], ...]; '' for reports archived before it existed
+            self.db.execute("ALTER TABLE reports ADD COLUMN sections TEXT NOT NULL DEFAULT ''")
+            self.db.commit()
+        row = self.db.execute("SELECT MAX(seg) FROM reports").fetchone()
+        self._seg = row[0] or 1
+        self._backfill_fts()
+
+    def _backfill_fts(self) -> None:
+        # archives written before the search index existed
+        todo = self.db.execute(
+            "SELECT id, stage, case_name FROM reports WHERE id > (SELECT IFNULL(MAX(rowid), 0) FROM reports_fts) ORDER BY id"
+        ).fetchall()
+        for report_id, stage, case_name in todo:
+            self._index_fts(report_id, self.read(report_id), stage, case_name)
+        if todo:
+            self.db.commit()
+
+    def _index_fts(self, report_id: int, text: str, stage: str, case_name: str) -> None:
+        f = report_search_fields(text)
+        self.db.execute(
+            "INSERT INTO reports_fts (rowid, body, gigi, diagnosis, tindakan, case_name, stage, residen, dpjp) VALUES (?,?,?,?,?,?,?,?,?)",
+            (report_id, text, f["gigi"], f["diagnosis"], f["tindakan"], case_name, STAGE_SEARCH_LABEL.get(stage) or re.sub(r"^POD(\d+)$", r"POD\1 POD \1", stage), f["residen"], f["dpjp"]),
+        )
 
-    jk_long = "laki-laki" if jk=="L" else "perempuan"
-    keluhan = st.text_area("Keluhan utama", height=80, key="awal_keluhan")
+    def _seg_path(self, seg: int) -> str:
+        return os.path.join(self.root, f"seg_{seg:05d}.dfl")
+
+    def append(self, text: str, rm: str, tgl: date, stage: str, case_name: str = "", nama: str = "", sections: Optional[Sections] = None) -> int:
+        c = zlib.compressobj(9, zlib.DEFLATED, -15, 9, zlib.Z_DEFAULT_STRATEGY, _ARCHIVE_ZDICTS[ARCHIVE_ZDICT_VERSION])
+        blob = c.compress(text.encode("utf-8")) + c.flush()
+        with self._lock:
+            path = self._seg_path(self._seg)
+            if os.path.exists(path) and os.path.getsize(path) + len(blob) > self.segment_max_bytes:
+                self._seg += 1
+                path = self._seg_path(self._seg)
+            with open(path, "ab") as f:
+                off = f.tell()
+                f.write(blob)
+            cur = self.db.execute(
+                "INSERT INTO reports (rm, tgl, stage, case_name, nama, created, seg, off, len, zdict, sections) VALUES (?,?,?,?,?,?,?,?,?,?,?)",
+                (clean(rm), tgl.isoformat(), stage, case_name, clean(nama), datetime.now(TZ).isoformat(timespec="seconds"),
+                 self._seg, off, len(blob), ARCHIVE_ZDICT_VERSION, json.dumps([[n, len(t)] for n, t in sections]) if sections else ""),
+            )
+            self._index_fts(cur.lastrowid, text, stage, case_name)
+            self.db.commit()
+            return cur.lastrowid
+
+    def read(self, report_id: int) -> str:
+        with self._lock:
+            row = self.db.execute("SELECT seg, off, len, zdict FROM reports WHERE id=?", (report_id,)).fetchone()
+        if not row:
+            return ""
+        seg, off, n, zd = row
+        with open(self._seg_path(seg), "rb") as f:
+            f.seek(off)
+            blob = f.read(n)
+        d = zlib.decompressobj(-15, zdict=_ARCHIVE_ZDICTS[zd])
+        return (d.decompress(blob) + d.flush()).decode("utf-8")
+
+    def read_sections(self, report_id: int) -> Sections:
+        text = self.read(report_id)
+        with self._lock:
+            row = self.db.execute("SELECT sections FROM reports WHERE id=?", (report_id,)).fetchone()
+        if not row or not row[0]:
+            return [("Laporan", text)]
+        out, i = [], 0
+        for name, n in json.loads(row[0]):
+            out.append((name, text[i:i + n]))
+            i += n
+        return out
+
+    def lookup(self, rm: str = "", date_from: Optional[date] = None, date_to: Optional[date] = None, limit: int = 50, stage: str = "") -> List[dict]:
+        where, args = [], []
+        if clean(rm):
+            where.append("rm = ?")
+            args.append(clean(rm))
+        if stage:
+            where.append("stage = ?")
+            args.append(stage)
+        where, args = _date_range_where("tgl", date_from, date_to, where, args)
+        sql = "SELECT id, rm, tgl, stage, case_name, nama, created FROM reports"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY tgl DESC, id DESC LIMIT ?"
+        with self._lock:
+            rows = self.db.execute(sql, (*args, limit)).fetchall()
+        return [dict(zip(ARCHIVE_COLS, r)) for r in rows]
+
+    def search(self, query: str, date_from: Optional[date] = None, date_to: Optional[date] = None, limit: int = 50) -> List[dict]:
+        match = fts_query(query)
+        if not match:
+            return []
+        where, args = _date_range_where("r.tgl", date_from, date_to, ["reports_fts MATCH ?"], [match])
+        sql = (
+            "SELECT r.id, r.rm, r.tgl, r.stage, r.case_name, r.nama, r.created"
+            " FROM reports_fts JOIN reports r ON r.id = reports_fts.rowid"
+            " WHERE " + " AND ".join(where) +
+            f" ORDER BY bm25(reports_fts, {FTS_WEIGHTS}) LIMIT ?"
+        )
+        with self._lock:
+            rows = self.db.execute(sql, (*args, limit)).fetchall()
+        return [dict(zip(ARCHIVE_COLS, r)) for r in rows]
+
+    def disk_bytes(self) -> int:
+        return sum(os.path.getsize(os.path.join(self.root, f)) for f in os.listdir(self.root))
+
+@st.cache_resource
+def get_archive() -> ReportArchive:
+    return ReportArchive(os.path.join(DATA_DIR, "archive"))
+
+def archive_report(out: str, rm: str, tgl: date, stage: str, case_name: str = "", nama: str = "", sections: Optional[Sections] = None) -> None:
+    get_metrics().inc("supersoap_generate_total", stage=stage, case=case_name or "-")
+    try:
+        get_archive().append(out, rm, tgl, stage, case_name, nama, sections)
+        if clean(rm):
+            get_ward_board().mark_reported(clean(rm), ward_stage_label(stage), st.session_state.get("bangsal_saya", ""))
+    except (OSError, sqlite3.Error) as e:
+        st.warning(f"Laporan tidak tersimpan ke arsip: {e}")
 
-    with st.expander("Riwayat (Alergi/Sistemik/Obat rutin/Kondisi sekarang)", expanded=True):
-        hist = history_blocks()
+# =========================
+# Report diff: what changed since the patient's previous report
+# =========================
+DIFF_QUIET_SECTIONS = {"Header", "Identitas", "Penutup", "Perubahan"}  # date/boilerplate, never summarised
+DIFF_SUMMARY_MAX_LINES = 6
+
+def diff_lines(old: str, new: str) -> List[Tuple[str, str]]:
+    """(op, line) with op " ", "-" or "+". Lines are compared as hashes, and the common
+    head/tail is skipped before SequenceMatcher looks at what is left."""
+    a, b = old.splitlines(), new.splitlines()
+    ha, hb = [hash(x) for x in a], [hash(x) for x in b]
+    n = min(len(ha), len(hb))
+    lo = 0
+    while lo < n and ha[lo] == hb[lo]:
+        lo += 1
+    hi = 0
+    while hi < n - lo and ha[-1 - hi] == hb[-1 - hi]:
+        hi += 1
+    out = [(" ", x) for x in b[:lo]]
+    sm = difflib.SequenceMatcher(None, ha[lo:len(ha) - hi], hb[lo:len(hb) - hi], autojunk=False)
+    for op, i1, i2, j1, j2 in sm.get_opcodes():
+        if op == "equal":
+            out += [(" ", x) for x in b[lo + j1:lo + j2]]
+        else:
+            out += [("-", x) for x in a[lo + i1:lo + i2]] + [("+", x) for x in b[lo + j1:lo + j2]]
+    return out + [(" ", x) for x in b[len(b) - hi:]]
+
+def diff_sections(old: Sections, new: Sections) -> List[Tuple[str, List[Tuple[str, str]]]]:
+    """Diff section by section; a section whose text is unchanged costs one string compare.
+    Reports archived before sections were kept come back as one "Laporan" section and are
+    compared whole."""
+    if [n for n, _ in old] == ["Laporan"]:
+        new = [("Laporan", join_sections(new))]
+    prev = dict(old)
+    out = []
+    for name, text in new:
+        before = prev.pop(name, "")
+        out.append((name, [(" ", x) for x in text.splitlines()] if before == text else diff_lines(before, text)))
+    return out + [(name, [("-", x) for x in text.splitlines()]) for name, text in prev.items()]
+
+def diff_text(diff) -> str:
+    """Changed sections only, in unified-diff style (st.code colours +/- lines)."""
+    blocks = [f"@@ {name}\n" + "\n".join(f"{op} {x}" for op, x in lines)
+              for name, lines in diff if any(op != " " for op, _ in lines)]
+    return "\n".join(blocks)
+
+def _summary_line(line: str, name: str) -> str:
+    # the summary prefixes "<section>: " itself, so drop it from lines like "S: Pasien ..."
+    text = " ".join(line.replace("\u2060", "").lstrip().lstrip("•").split())
+    label = f"{name}:"
+    return text[len(label):].lstrip() if text[:len(label)].lower() == label.lower() else text
+
+def changes_summary(diff, since: str) -> str:
+    items = []
+    for name, lines in diff:
+        if name in DIFF_QUIET_SECTIONS:
+            continue
+        added = [_summary_line(x, name) for op, x in lines if op == "+"]
+        removed = [_summary_line(x, name) for op, x in lines if op == "-"]
+        # sub-headers ("Medikasi:") carry no change of their own
+        added, removed = ([x for x in xs if x and not x.endswith(":")] for xs in (added, removed))
+        if added:
+            more = f" (+{len(added) - DIFF_SUMMARY_MAX_LINES} lagi)" if len(added) > DIFF_SUMMARY_MAX_LINES else ""
+            items.append(f"{name}: " + "; ".join(added[:DIFF_SUMMARY_MAX_LINES]) + more)
+        elif removed:
+            items.append(f"{name}: dihapus " + "; ".join(removed[:DIFF_SUMMARY_MAX_LINES]))
+    if not items:
+        return ""
+    return f"Perubahan sejak {since}:\n" + join_bullets(items, bullet="•⁠  ⁠") + "\n\n"
 
-    st.subheader("TTV")
-    t1,t2,t3 = st.columns(3)
-    with t1:
-        ku = st.selectbox("KU", ["Baik/Compos Mentis", "Sedang", "Buruk"], index=0, key="awal_ku")
-        td = st.text_input("TD", value="120/70 mmHg", key="awal_td")
-        nadi = st.number_input("Nadi", min_value=0, max_value=220, value=80, step=1, key="awal_nadi")
-    with t2:
-        rr = st.number_input("RR", min_value=0, max_value=80, value=19, step=1, key="awal_rr")
-        temp = st.number_input("Suhu", min_value=30.0, max_value=42.0, value=36.7, step=0.1, key="awal_temp")
-        spo2 = st.number_input("SpO2", min_value=0, max_value=100, value=99, step=1, key="awal_spo2")
-    with t3:
-        bb = st.number_input("BB (kg)", min_value=0.0, max_value=200.0, value=0.0, step=0.1, key="awal_bb")
-        tb = st.number_input("TB (cm)", min_value=0.0, max_value=230.0, value=0.0, step=0.5, key="awal_tb")
-
-    st.divider()
-    eo_lines, io_lines = build_eo_io(case_name, "awal")
-
-    st.divider()
-    st.subheader("A & Plan")
-    A_text = st.text_area("Diagnosis (1 baris = 1 diagnosis)", height=110, key="awal_A")
-    A_lines = [clean(x) for x in A_text.splitlines() if clean(x)]
-    plan_text = st.text_area("Plan (1 baris = 1 item)", height=120, key="awal_plan")
-    plan_lines = [clean(x) for x in plan_text.splitlines() if clean(x)]
-
-    residen = split_people_list(st.text_area("Residen", height=60, key="awal_res"))
-    dpjp = st.text_input("DPJP", value="", key="awal_dpjp")
-
-    if st.button("Generate SOAP Awal", type="primary", use_container_width=True, key="awal_gen"):
-        ident = {"nama": nama, "jk": jk, "jk_long": jk_long, "umur": umur, "pembiayaan": pembiayaan, "rm": rm}
-        ttv = {"ku": ku, "td": td, "nadi": int(nadi), "rr": int(rr), "temp": float(temp), "spo2": int(spo2), "bb": float(bb), "tb": float(tb)}
-        out = build_awal(case_name, ident, ttv, eo_lines, io_lines, keluhan, hist, A_lines, plan_lines, residen, dpjp, rs, tanggal)
-        st.text_area("Output", value=out, height=520)
-        st.download_button("Download .txt", data=out.encode("utf-8"), file_name="soap_awal.txt", mime="text/plain", use_container_width=True)
+def previous_report(rm: str, stage: str, tgl: date) -> Optional[dict]:
+    """Latest archived report of this RM that is not a re-generation of the current one."""
+    if not clean(rm):
+        return None
+    day = tgl.isoformat()
+    for r in get_archive().lookup(rm, date_to=tgl, limit=20):
+        if r["tgl"] < day or r["stage"] != stage:
+            return r
+    return None
 
-# ---- PRE-OP
-with tab_preop:
-    st.caption("Pre-Op = paste SOAP mentah + MINLAP. (BB/TB TIDAK diparse otomatis sesuai aturanmu).")
-    case_name = st.selectbox("Kasus (untuk assist EO/IO)", CASES, index=CASES.index("Impaksi"), key="pre_case")
+def with_changes(sections: Sections, old: Optional[Sections], since: str, append_summary: bool) -> Tuple[Sections, str]:
+    """(sections, diff text); with append_summary, a "Perubahan" section goes before the closing."""
+    if old is None:
+        return sections, ""
+    diff = diff_sections(old, sections)
+    summary = changes_summary(diff, since) if append_summary else ""
+    if summary:
+        at = next((i for i, (n, _) in enumerate(sections) if n == "Penutup"), len(sections))
+        sections = sections[:at] + [("Perubahan", summary)] + sections[at:]
+    return sections, diff_text(diff)
+
+def report_changes(sections: Sections, rm: str, stage: str, tgl: date, key: str) -> Tuple[Sections, str]:
+    prev = previous_report(rm, stage, tgl)
+    if prev is None:
+        return sections, ""
+    since = f"{ward_stage_label(prev['stage'])} ({fmt_ddmmyyyy(date.fromisoformat(prev['tgl']))})"
+    return with_changes(sections, get_archive().read_sections(prev["id"]), since, st.session_state.get(f"{key}_diff_on", False))
+
+def show_changes(diff: str, label: str = "Perubahan vs laporan sebelumnya") -> None:
+    if diff:
+        with st.expander(label, expanded=False):
+            st.code(diff, language="diff")
+
+def diff_checkbox(key: str) -> None:
+    st.checkbox("Tambahkan ringkasan perubahan vs laporan sebelumnya", value=False, key=f"{key}_diff_on")
+
+# =========================
+# Ward board: shared across sessions, optimistic concurrency
+# =========================
+# Every write stamps the row with the next board version, so a session catches up with
+# one indexed "version > last seen" query, and skips even that while the in-memory
+# counter says nothing changed. Meta fields and the stored draft each carry their own
+# revision; a write must name the revision it was based on or it is rejected, returning
+# (False, current row) instead. (No exception class: the board outlives script reruns,
+# and a class redefined by a rerun would not match the cached board's raises.)
+WARD_STATUS = ["Belum dilapor", "Draft", "Sudah dilapor", "Pulang"]
+WARD_STAGES = ["Awal", "Pre-Op", "POD 0", "POD 1", "POD n"]
+# board stage -> draft key groups (see _draft_group)
+WARD_DRAFT_GROUPS = {"Awal": ["awal", "alergi", "sistemik", "obat"], "Pre-Op": ["pre", "preop"],
+                     "POD 0": ["POD 0"], "POD 1": ["POD 1"], "POD n": ["podseri"]}
+WARD_COLS = ["rm", "nama", "kamar", "stage", "op_time", "status", "draft_stage", "draft_rev", "meta_rev", "updated_by", "updated_at", "version"]
+WARD_POLL_SECONDS = float(os.environ.get("SUPERSOAP_WARD_POLL_S", "5"))
+
+def ward_conflict_msg(rm: str, current: Optional[dict]) -> str:
+    return f"{rm} diubah oleh {current['updated_by'] or '-'} ({current['updated_at']})" if current else f"{rm} belum ada di board"
+
+class WardBoard:
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS patients (
+                rm TEXT PRIMARY KEY,
+                nama TEXT NOT NULL DEFAULT '', kamar TEXT NOT NULL DEFAULT '',
+                stage TEXT NOT NULL DEFAULT '', op_time TEXT NOT NULL DEFAULT '',
+                status TEXT NOT NULL DEFAULT '',
+                draft BLOB, draft_stage TEXT NOT NULL DEFAULT '',
+                draft_rev INTEGER NOT NULL DEFAULT 0, meta_rev INTEGER NOT NULL DEFAULT 0,
+                updated_by TEXT NOT NULL DEFAULT '', updated_at TEXT NOT NULL DEFAULT '',
+                version INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS patients_version ON patients(version);
+        """)
+        self.version = self.db.execute("SELECT IFNULL(MAX(version), 0) FROM patients").fetchone()[0]
+
+    def _row(self, rm: str) -> Optional[dict]:
+        r = self.db.execute(f"SELECT {', '.join(WARD_COLS)} FROM patients WHERE rm = ?", (rm,)).fetchone()
+        return dict(zip(WARD_COLS, r)) if r else None
+
+    def get(self, rm: str) -> Optional[dict]:
+        with self._lock:
+            return self._row(rm)
+
+    def _stamp(self, who: str) -> Tuple[int, str, str]:
+        self.version += 1
+        return self.version, who, datetime.now(TZ).strftime("%d/%m %H:%M")
+
+    def changes(self, since: int) -> Tuple[List[dict], int]:
+        """Rows written after `since`, plus the version to pass next time."""
+        if since >= self.version:
+            return [], since
+        with self._lock:
+            rows = self.db.execute(f"SELECT {', '.join(WARD_COLS)} FROM patients WHERE version > ?", (since,)).fetchall()
+            return [dict(zip(WARD_COLS, r)) for r in rows], self.version
+
+    def save_meta(self, rm: str, fields: dict, base_rev: int, who: str) -> Tuple[bool, Optional[dict]]:
+        fields = {k: v for k, v in fields.items() if k in ("nama", "kamar", "stage", "op_time", "status")}
+        with self._lock:
+            cur = self._row(rm)
+            if (cur["meta_rev"] if cur else 0) != base_rev:
+                return False, cur
+            version, who, at = self._stamp(who)
+            if cur is None:
+                cols = ["rm", *fields, "meta_rev", "updated_by", "updated_at", "version"]
+                self.db.execute(f"INSERT INTO patients ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})",
+                                (rm, *fields.values(), 1, who, at, version))
+            else:
+                sets = ", ".join(f"{k} = ?" for k in fields)
+                self.db.execute(f"UPDATE patients SET {sets}, meta_rev = meta_rev + 1, updated_by = ?, updated_at = ?, version = ? WHERE rm = ?",
+                                (*fields.values(), who, at, version, rm))
+            self.db.commit()
+            return True, self._row(rm)
+
+    def save_draft(self, rm: str, stage: str, values: dict, base_rev: int, who: str) -> Tuple[bool, Optional[dict]]:
+        blob = zlib.compress(json.dumps(values, default=_spill_default).encode("utf-8"))
+        with self._lock:
+            cur = self._row(rm)
+            if cur is None or cur["draft_rev"] != base_rev:
+                return False, cur
+            version, who, at = self._stamp(who)
+            self.db.execute("UPDATE patients SET draft = ?, draft_stage = ?, draft_rev = draft_rev + 1, status = ?,"
+                            " updated_by = ?, updated_at = ?, version = ? WHERE rm = ?",
+                            (blob, stage, "Draft" if cur["status"] in ("", "Belum dilapor") else cur["status"], who, at, version, rm))
+            self.db.commit()
+            return True, self._row(rm)
+
+    def load_draft(self, rm: str) -> Tuple[str, dict, int]:
+        with self._lock:
+            r = self.db.execute("SELECT draft_stage, draft, draft_rev FROM patients WHERE rm = ?", (rm,)).fetchone()
+        if not r or r[1] is None:
+            return "", {}, r[2] if r else 0
+        return r[0], json.loads(zlib.decompress(r[1]).decode("utf-8"), object_hook=_spill_hook), r[2]
+
+    def mark_reported(self, rm: str, stage: str, who: str = "") -> None:
+        with self._lock:
+            if self._row(rm) is None:
+                return
+            version, who, at = self._stamp(who)
+            self.db.execute("UPDATE patients SET stage = ?, status = ?, updated_by = ?, updated_at = ?, version = ? WHERE rm = ?",
+                            (stage, "Sudah dilapor", who, at, version, rm))
+            self.db.commit()
+
+@st.cache_resource
+def get_ward_board() -> WardBoard:
+    return WardBoard(os.path.join(DATA_DIR, "ward", "board.sqlite3"))
+
+def ward_rows() -> Dict[str, dict]:
+    """This session's copy of the board, patched with whatever changed since it last looked."""
+    cache = st.session_state.setdefault("_ward", {"version": 0, "rows": {}})
+    rows, cache["version"] = get_ward_board().changes(cache["version"])
+    for r in rows:
+        cache["rows"][r["rm"]] = r
+    return cache["rows"]
+
+def ward_stage_label(stage: str) -> str:
+    return {"PreOp": "Pre-Op"}.get(stage) or re.sub(r"^POD(\d+)$", r"POD \1", stage)
+
+def ward_draft_values(stage: str) -> dict:
+    groups = WARD_DRAFT_GROUPS[stage]
+    return {k: st.session_state[k] for k in _draft_keys() if _draft_group(k) in groups}
+
+def apply_stage_draft(stage: str, values: dict) -> None:
+    """Replace one stage's form state; keys missing from `values` fall back to widget defaults."""
+    groups = WARD_DRAFT_GROUPS[stage]
+    for k in _draft_keys():
+        if _draft_group(k) in groups and k not in values:
+            del st.session_state[k]
+    for k, v in values.items():
+        st.session_state[k] = v
+
+def ward_take_draft(rm: str) -> None:
+    stage, values, rev = get_ward_board().load_draft(rm)
+    if stage:
+        apply_stage_draft(stage, values)
+    st.session_state.setdefault("_ward_draft_rev", {})[rm] = rev
+    st.session_state.pop("_ward_conflict", None)
+
+def ward_save_draft(rm: str, stage: str, who: str, force: bool = False) -> None:
+    base = st.session_state.setdefault("_ward_draft_rev", {})
+    board = get_ward_board()
+    if force:
+        base[rm] = board.load_draft(rm)[2]
+    ok, row = board.save_draft(rm, stage, ward_draft_values(stage), base.get(rm, 0), who)
+    if ok:
+        base[rm] = row["draft_rev"]
+        st.session_state.pop("_ward_conflict", None)
+    else:
+        st.session_state["_ward_conflict"] = {"rm": rm, "stage": stage, "msg": ward_conflict_msg(rm, row)}
+
+def ward_save_meta(rm: str, who: str) -> None:
+    base = st.session_state.setdefault("_ward_meta_rev", {})
+    fields = {f: st.session_state.get(f"bangsal_{f}") for f in ("nama", "kamar", "stage", "op_time", "status")}
+    ok, row = get_ward_board().save_meta(rm, fields, base.get(rm, 0), who)
+    if ok:
+        base[rm] = row["meta_rev"]
+        st.session_state.pop("_ward_meta_conflict", None)
+    else:
+        st.session_state["_ward_meta_conflict"] = ward_conflict_msg(rm, row)
+        ward_open(rm)
+
+def ward_open(rm: str) -> None:
+    """Load the board's current values into the edit fields."""
+    row = get_ward_board().get(rm) if rm else None
+    row = row or {"nama": "", "kamar": "", "stage": WARD_STAGES[0], "op_time": "", "status": WARD_STATUS[0], "meta_rev": 0}
+    row = {**row, "stage": row["stage"] if row["stage"] in WARD_STAGES else "POD n",
+           "status": row["status"] if row["status"] in WARD_STATUS else WARD_STATUS[0]}
+    for f in ("nama", "kamar", "stage", "op_time", "status"):
+        st.session_state[f"bangsal_{f}"] = row[f]
+    st.session_state.setdefault("_ward_meta_rev", {})[rm] = row["meta_rev"]
+
+# =========================
+# Draft handoff code (phone -> PC), no server storage
+# =========================
+# code = base64url( format | stage | crc16 | raw-deflate(entries) ), entries tagged-binary:
+#   varint len + key (stage prefix dropped) + tag + value. The deflate dictionary is part of
+#   the format: changing HANDOFF_VOCAB or the archive samples means bumping HANDOFF_FORMAT.
+HANDOFF_FORMAT = 1
+HANDOFF_PARAM = "d"
+HANDOFF_VOCAB = (
+    "nama jk umur pay kamar rm rs tgl tgl_op jam zona res dpjp plan meds case tind anestesi "
+    "nyeri nyeri_lokasi nyeri_skala mual darah luka bau td nadi rr temp spo2 bb tb ku keluhan "
+    "A Og EO IO S pen raw minlap EO_override IO_override ivfd_on puasa_on df ttv_line "
+    "RSGMP UNHAS BPJS UMUM Rawat Inap 120/70 mmHg Tidak Ya Kering Baik/Compos Mentis "
+    "general anestesi Odontektomi gigi Impaksi Fraktur Abses drg. Sp.BM WITA "
+)
+_HT_NONE, _HT_FALSE, _HT_TRUE, _HT_INT, _HT_FLOAT, _HT_STR, _HT_DATE, _HT_LIST = range(8)
+_HANDOFF_EPOCH = date(2000, 1, 1)
+
+def _handoff_zdict() -> bytes:
+    return (_archive_zdict() + HANDOFF_VOCAB.encode("utf-8"))[-32768:]
+
+def _varint(n: int, out: bytearray) -> None:
+    while n >= 0x80:
+        out.append(n & 0x7F | 0x80)
+        n >>= 7
+    out.append(n)
+
+def _read_varint(buf: bytes, i: int) -> Tuple[int, int]:
+    n = shift = 0
+    while True:
+        b = buf[i]
+        i += 1
+        n |= (b & 0x7F) << shift
+        shift += 7
+        if b < 0x80:
+            return n, i
+
+def _put_value(v, out: bytearray) -> None:
+    if v is None:
+        out.append(_HT_NONE)
+    elif isinstance(v, bool):
+        out.append(_HT_TRUE if v else _HT_FALSE)
+    elif isinstance(v, int):
+        out.append(_HT_INT)
+        _varint(v << 1 if v >= 0 else (-v << 1) - 1, out)  # zigzag
+    elif isinstance(v, float):
+        out.append(_HT_FLOAT)
+        _put_value(repr(v), out)  # "36.7" beats 8 bytes of double
+    elif isinstance(v, str):
+        raw = v.encode("utf-8")
+        out.append(_HT_STR)
+        _varint(len(raw), out)
+        out += raw
+    elif isinstance(v, date):
+        out.append(_HT_DATE)
+        _put_value((v - _HANDOFF_EPOCH).days, out)
+    else:
+        out.append(_HT_LIST)
+        _varint(len(v), out)
+        for x in v:
+            _put_value(x, out)
+
+def _get_value(buf: bytes, i: int):
+    tag = buf[i]
+    i += 1
+    if tag in (_HT_NONE, _HT_FALSE, _HT_TRUE):
+        return (None, False, True)[tag], i
+    if tag == _HT_INT:
+        n, i = _read_varint(buf, i)
+        return (n >> 1) ^ -(n & 1), i
+    if tag == _HT_FLOAT:
+        text, i = _get_value(buf, i)
+        return float(text), i
+    if tag == _HT_STR:
+        n, i = _read_varint(buf, i)
+        return buf[i:i + n].decode("utf-8"), i + n
+    if tag == _HT_DATE:
+        days, i = _get_value(buf, i)
+        return _HANDOFF_EPOCH + timedelta(days=days), i
+    if tag == _HT_LIST:
+        n, i = _read_varint(buf, i)
+        items = []
+        for _ in range(n):
+            x, i = _get_value(buf, i)
+            items.append(x)
+        return items, i
+    raise ValueError(f"tag {tag}")
+
+def _stage_prefix(stage: str, key: str) -> str:
+    g = _draft_group(key)
+    if g not in WARD_DRAFT_GROUPS[stage]:
+        raise ValueError(f"{key} is not part of the {stage} draft")
+    return g
+
+def encode_handoff(stage: str, values: dict) -> str:
+    body = bytearray()
+    for k, v in values.items():
+        # the receiving side knows the stage, so "pre_tind" travels as "0tind" (group index + rest)
+        g = WARD_DRAFT_GROUPS[stage].index(_stage_prefix(stage, k))
+        key = f"{g}{k[len(_draft_group(k)) + 1:]}".encode("utf-8")
+        _varint(len(key), body)
+        body += key
+        _put_value(v, body)
+    c = zlib.compressobj(9, zlib.DEFLATED, -15, zdict=_handoff_zdict())
+    packed = c.compress(bytes(body)) + c.flush()
+    head = bytes([HANDOFF_FORMAT, WARD_STAGES.index(stage)]) + (zlib.crc32(body) & 0xFFFF).to_bytes(2, "big")
+    return base64.urlsafe_b64encode(head + packed).rstrip(b"=").decode("ascii")
+
+def decode_handoff(code: str) -> Tuple[str, dict]:
+    """Inverse of encode_handoff; raises ValueError on anything malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(clean(code) + "=" * (-len(clean(code)) % 4))
+        if len(raw) < 4 or raw[0] != HANDOFF_FORMAT:
+            raise ValueError("versi kode tidak dikenal")
+        stage = WARD_STAGES[raw[1]]
+        d = zlib.decompressobj(-15, zdict=_handoff_zdict())
+        body = d.decompress(raw[4:]) + d.flush()
+        if zlib.crc32(body) & 0xFFFF != int.from_bytes(raw[2:4], "big"):
+            raise ValueError("kode rusak / tidak lengkap")
+        values, i = {}, 0
+        while i < len(body):
+            n, i = _read_varint(body, i)
+            key = body[i:i + n].decode("utf-8")
+            v, i = _get_value(body, i + n)
+            values[f"{WARD_DRAFT_GROUPS[stage][int(key[0])]}_{key[1:]}"] = v
+        return stage, values
+    except (IndexError, UnicodeDecodeError, zlib.error, binascii.Error) as e:
+        raise ValueError(str(e)) from e
+
+def make_handoff_code(stage: str) -> None:
+    code = encode_handoff(stage, ward_draft_values(stage))
+    st.session_state["_handoff_code"] = code
+    st.query_params[HANDOFF_PARAM] = code
+
+def apply_handoff(code: str) -> None:
+    try:
+        stage, values = decode_handoff(code)
+    except ValueError as e:
+        st.session_state["_handoff_msg"] = ("error", f"Kode tidak bisa dibaca: {e}")
+        return
+    apply_stage_draft(stage, values)
+    st.session_state["_handoff_msg"] = ("success", f"Draft {stage} dipulihkan ({len(values)} isian).")
+
+def take_handoff_param() -> None:
+    """Restore a draft passed as ?d=<code>, then drop it from the URL."""
+    code = st.query_params.get(HANDOFF_PARAM)
+    if code and code != st.session_state.get("_handoff_code"):
+        apply_handoff(code)
+        st.session_state["_handoff_code"] = code
+        del st.query_params[HANDOFF_PARAM]
 
-    raw = st.text_area("SOAP mentah (khusus Pre-Op)", height=200, key="pre_raw")
-    minlap = st.text_area("MINLAP (khusus Pre-Op)", height=200, key="pre_minlap")
+# =========================
+# Vitals timeline (columnar, ward-wide)
+# =========================
+# One fixed-size record per TTV entry, appended to vitals.bin; in memory every field is
+# its own typed array over all patients, so trend/flag queries run on whole columns.
+VITALS_DTYPE = np.dtype([("ts", "<i8"), ("pid", "<i4"), ("pod", "i1"), ("sys", "<f4"), ("dia", "<f4"),
+                         ("nadi", "<f4"), ("rr", "<f4"), ("temp", "<f4"), ("spo2", "<f4"), ("bb", "<f4")])
+VITALS_PARAMS = ["sys", "dia", "nadi", "rr", "temp", "spo2", "bb"]
+POD_AWAL, POD_PREOP = -2, -1
+# flag -> (param, low, high): a value outside [low, high] is abnormal
+VITALS_FLAGS = {
+    "Febris": ("temp", 0.0, 37.5),
+    "Takikardia": ("nadi", 0.0, 100.0),
+    "Takipnea": ("rr", 0.0, 24.0),
+    "Desaturasi": ("spo2", 95.0, 101.0),
+    "Hipertensi": ("sys", 0.0, 140.0),
+    "Hipotensi": ("sys", 90.0, 1000.0),
+}
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+def pod_label(pod: int) -> str:
+    return {POD_AWAL: "Awal", POD_PREOP: "Pre-Op"}.get(pod, f"POD {pod}")
+
+def parse_td(td: str) -> Tuple[float, float]:
+    m = re.search(r"(\d{2,3})\s*/\s*(\d{2,3})", td or "")
+    return (float(m.group(1)), float(m.group(2))) if m else (np.nan, np.nan)
+
+def vitals_from_text(text: str) -> dict:
+    """TTV out of a free-text Status Generalis (Pre-Op paste)."""
+    t = text or ""
+    def num(pat: str) -> float:
+        m = re.search(pat, t, flags=re.IGNORECASE | re.MULTILINE)
+        return float(m.group(1).replace(",", ".")) if m else np.nan
+    return {"td": pick1(t, r"^[ \t]*TD(?:\s*:)?\s*([^\n]+)", re.IGNORECASE | re.MULTILINE), "nadi": num(r"^[ \t]*(?:N|Nadi)(?:\s*:)?\s*(\d+)"),
+            "rr": num(r"^[ \t]*(?:P|RR)(?:\s*:)?\s*(\d+)"), "temp": num(r"^[ \t]*(?:S|Suhu)(?:\s*:)?\s*(\d+(?:[.,]\d+)?)"),
+            "spo2": num(r"^[ \t]*SpO2(?:\s*:)?\s*(\d+)"), "bb": num(r"^[ \t]*BB(?:\s*:)?\s*(\d+(?:[.,]\d+)?)")}
+
+def sparkline(values) -> str:
+    v = np.asarray(values, dtype=float)
+    v = v[~np.isnan(v)]
+    if not v.size:
+        return ""
+    lo, hi = v.min(), v.max()
+    idx = np.zeros(v.size, dtype=int) if hi == lo else ((v - lo) / (hi - lo) * (len(SPARK_CHARS) - 1)).round().astype(int)
+    return "".join(SPARK_CHARS[i] for i in idx)
+
+# Asia/Jakarta has had no DST since 1964, so one offset buckets every timestamp
+VITALS_TZ_OFFSET_S = int(datetime.now(TZ).utcoffset().total_seconds())
+
+class VitalsStore:
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._bin = os.path.join(root, "vitals.bin")
+        self._pids_path = os.path.join(root, "patients.txt")
+        self.pids: Dict[str, int] = {}
+        if os.path.exists(self._pids_path):
+            with open(self._pids_path, encoding="utf-8") as f:
+                for line in f.read().splitlines():
+                    self.pids.setdefault(line, len(self.pids))
+        rec = np.fromfile(self._bin, dtype=VITALS_DTYPE) if os.path.exists(self._bin) else np.empty(0, VITALS_DTYPE)
+        self.n = len(rec)
+        cap = max(1024, 2 * self.n)
+        self.cols = {name: np.empty(cap, dtype=VITALS_DTYPE[name]) for name in VITALS_DTYPE.names}
+        for name in VITALS_DTYPE.names:
+            self.cols[name][:self.n] = rec[name]
+
+    def _pid(self, rm: str) -> int:
+        if rm not in self.pids:
+            with open(self._pids_path, "a", encoding="utf-8") as f:
+                f.write(rm + "\n")
+            self.pids[rm] = len(self.pids)
+        return self.pids[rm]
+
+    def append(self, rm: str, when: datetime, pod: int, ttv: dict) -> None:
+        sys_, dia = parse_td(str(ttv.get("td", "")))
+        row = {"ts": int(when.timestamp()), "pod": pod, "sys": sys_, "dia": dia,
+               **{k: float(ttv[k]) if ttv.get(k) not in (None, "") else np.nan for k in ("nadi", "rr", "temp", "spo2", "bb")}}
+        if row.get("bb") == 0:
+            row["bb"] = np.nan
+        with self._lock:
+            row["pid"] = self._pid(rm)
+            rec = np.zeros(1, dtype=VITALS_DTYPE)
+            for k, v in row.items():
+                rec[k] = v
+            with open(self._bin, "ab") as f:
+                f.write(rec.tobytes())
+            if self.n == len(self.cols["ts"]):
+                self.cols = {k: np.concatenate([c, np.empty_like(c)]) for k, c in self.cols.items()}
+            for k in VITALS_DTYPE.names:
+                self.cols[k][self.n] = rec[k][0]
+            self.n += 1
+
+    def view(self) -> Dict[str, np.ndarray]:
+        """Live rows sorted by (patient, time). Re-generating the same stage on the same day
+        replaces the earlier entry."""
+        with self._lock:
+            c = {k: v[:self.n] for k, v in self.cols.items()}
+        day = (c["ts"] + VITALS_TZ_OFFSET_S) // 86400  # calendar day in TZ, not UTC
+        order = np.lexsort((np.arange(len(day)), c["ts"], c["pid"]))
+        pid, pod, day_o = c["pid"][order], c["pod"][order], day[order]
+        same_next = np.zeros(len(order), dtype=bool)
+        same_next[:-1] = (pid[1:] == pid[:-1]) & (pod[1:] == pod[:-1]) & (day_o[1:] == day_o[:-1])
+        keep = order[~same_next]
+        return {k: v[keep] for k, v in c.items()}
+
+    def patient(self, rm: str) -> Dict[str, np.ndarray]:
+        v = self.view()
+        pid = self.pids.get(rm, -1)
+        lo, hi = np.searchsorted(v["pid"], [pid, pid + 1])
+        return {k: a[lo:hi] for k, a in v.items()}
+
+def vitals_flags(v: Dict[str, np.ndarray]) -> Dict[int, List[str]]:
+    """pid -> ["Febris sejak POD 1", ...] for every patient whose latest entry is abnormal.
+    Expects rows sorted by (pid, ts) as returned by VitalsStore.view()."""
+    n = len(v["pid"])
+    if not n:
+        return {}
+    i = np.arange(n)
+    first = np.ones(n, dtype=bool)
+    first[1:] = v["pid"][1:] != v["pid"][:-1]
+    last = np.ones(n, dtype=bool)
+    last[:-1] = first[1:]
+    out: Dict[int, List[str]] = {}
+    for flag, (param, low, high) in VITALS_FLAGS.items():
+        x = v[param]
+        abn = (x < low) | (x > high)  # NaN compares False -> not abnormal
+        # start of the current abnormal run: last reset (normal row or new patient) before each row
+        reset = np.where(~abn, i + 1, np.where(first, i, 0))
+        start = np.maximum.accumulate(reset)
+        for j in np.flatnonzero(last & abn):
+            out.setdefault(int(v["pid"][j]), []).append(f"{flag} sejak {pod_label(int(v['pod'][start[j]]))}")
+    return out
+
+@st.cache_resource
+def get_vitals() -> VitalsStore:
+    return VitalsStore(os.path.join(DATA_DIR, "vitals"))
+
+def record_vitals(rm: str, tgl: date, pod: int, ttv: dict) -> None:
+    if not clean(rm):
+        return
+    try:
+        get_vitals().append(clean(rm), datetime.combine(tgl, datetime.now(TZ).timetz()), pod, ttv)
+    except OSError as e:
+        st.warning(f"TTV tidak tersimpan ke timeline: {e}")
+
+def vitals_panel(rm: str, pod: int, ttv: dict) -> None:
+    """Sparkline + flags for this patient, with the values currently in the form as the newest point."""
+    if not clean(rm) or clean(rm) not in get_vitals().pids:
+        return
+    hist = get_vitals().patient(clean(rm))
+    hist = {k: a[hist["pod"] != pod] for k, a in hist.items()}
+    sys_, dia = parse_td(str(ttv.get("td", "")))
+    now = {"ts": 1 << 62, "pid": 0, "pod": pod, "sys": sys_, "dia": dia, **{k: float(ttv.get(k, np.nan)) for k in ("nadi", "rr", "temp", "spo2")}, "bb": np.nan}
+    v = {k: np.append(hist[k].astype(VITALS_DTYPE[k]), np.array([now[k]], dtype=VITALS_DTYPE[k])) for k in VITALS_DTYPE.names}
+    v["pid"][:] = 0
+    order = np.lexsort((v["ts"], v["pod"]))
+    v = {k: a[order] for k, a in v.items()}
+    labels = " → ".join(pod_label(int(p)) for p in v["pod"])
+    st.caption(f"Timeline TTV ({labels}) · Suhu {sparkline(v['temp'])} · Nadi {sparkline(v['nadi'])} · SpO2 {sparkline(v['spo2'])}")
+    for flag in vitals_flags(v).get(0, []):
+        st.warning(flag)
 
-    parsed = ParsedSoap()
-    if raw.strip():
-        parsed = parse_raw_soap_preop_only(raw)
+# =========================
+# Warm start: shared read-only assets, built once per server process
+# =========================
+SCHEMA_FILE = os.environ.get("SUPERSOAP_SCHEMA_FILE") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "supersoap_schema_v3.json")
+TTFI_KEEP = 200
+
+def compile_lapop(text: str) -> Tuple[str, ...]:
+    """Steps of a schema laporan operasi, without the numbering, stray characters and
+    blank lines it was pasted with; lines without a number continue the previous step."""
+    steps: List[str] = []
+    for line in text.splitlines():
+        m = re.match(r"^\W*\d+\s*\.\s*", line)
+        body = " ".join(line[m.end() if m else 0:].split())
+        if m or not steps:
+            steps.append(body)
+        elif body:
+            steps[-1] = f"{steps[-1]} {body}"
+    return tuple(x for x in steps if x)
+
+def render_lapop(steps: Tuple[str, ...]) -> str:
+    return "\n\n".join(f"{i}. {x}" for i, x in enumerate(steps, 1))
+
+@dataclass(frozen=True)
+class WarmAssets:
+    schema_version: str
+    lapop: Dict[str, Tuple[str, ...]]  # app case (CASES) -> compiled steps
+    build_ms: float
+
+def load_assets(path: str = SCHEMA_FILE) -> WarmAssets:
+    t0 = time.perf_counter()
+    try:
+        with open(path, encoding="utf-8") as f:
+            schema = json.load(f)
+    except (OSError, ValueError):
+        schema = {}
+    # schema case names drift from CASES ("Sesulitis", "Tumor/Bone Tumor"); match each once here
+    lapop = {}
+    for name, text in (schema.get("laporan_operasi") or {}).items():
+        hit = difflib.get_close_matches(name, CASES, n=1, cutoff=0.6) or [c for c in CASES if name.lower().startswith(c.lower())]
+        if hit and isinstance(text, str) and hit[0] not in lapop:
+            lapop[hit[0]] = compile_lapop(text)
+    return WarmAssets(str(schema.get("version", "")), lapop, (time.perf_counter() - t0) * 1000)
+
+class BootStats:
+    """Time-to-first-interactive per session: the first session of the process pays for
+    anything not yet warm, every later one should not."""
+
+    def __init__(self, warm_ms: float):
+        self._lock = threading.Lock()
+        self.warm_ms = warm_ms
+        self.sessions = 0
+        self.first_ms: Optional[float] = None
+        self.nth_ms: List[float] = []
+
+    def first_run(self, ms: float) -> int:
+        with self._lock:
+            self.sessions += 1
+            if self.sessions == 1:
+                self.first_ms = ms
+            else:
+                self.nth_ms = (self.nth_ms + [ms])[-TTFI_KEEP:]
+            return self.sessions
+
+    def report(self) -> dict:
+        with self._lock:
+            nth = sorted(self.nth_ms)
+        return {"sessions": self.sessions, "warm_ms": self.warm_ms, "first_ms": self.first_ms,
+                "nth_median_ms": nth[len(nth) // 2] if nth else None, "nth_n": len(nth)}
+
+@st.cache_resource(show_spinner=False)
+def warm_start() -> Tuple[WarmAssets, BootStats]:
+    """Everything a session reads but never writes, plus the process-wide stores, so the
+    first resident after a restart doesn't build them inside their own rerun.
+    Runs on the first script run of the process -- a readiness probe hitting
+    /_stcore/script-health-check (server.scriptHealthCheckEnabled) makes that the boot."""
+    t0 = time.perf_counter()
+    assets = load_assets()
+    try:
+        # st.data_editor/st.dataframe (POD n, Bangsal) import these lazily, ~0.5 s on the first render
+        import pandas, pyarrow  # noqa: F401
+    except ImportError:
+        pass
+    for open_store in (get_metrics, get_session_registry, get_archive, get_ward_board, get_vitals):
+        try:
+            open_store()
+        except (OSError, sqlite3.Error, ValueError):
+            pass  # not cached; the tab that needs it opens it again and reports the error there
+    warm_ms = (time.perf_counter() - t0) * 1000
+    get_metrics().observe("supersoap_warm_start_seconds", warm_ms / 1000)
+    return assets, BootStats(warm_ms)
+
+def apply_lapop_template() -> None:
+    steps = warm_start()[0].lapop.get(st.session_state.get("lapop_case", ""))
+    if steps:
+        st.session_state["lapop"] = render_lapop(steps)
+
+def note_first_interactive(stats: BootStats, slot) -> None:
+    """On a session's first run, record how long it took until the whole page was sent."""
+    if "_ttfi_ms" not in st.session_state and get_script_run_ctx() is not None:
+        ms = (time.perf_counter() - _RUN_T0) * 1000
+        n = stats.first_run(ms)
+        st.session_state["_ttfi_ms"] = (ms, n)
+        get_metrics().observe("supersoap_first_interactive_seconds", ms / 1000, session="first" if n == 1 else "nth")
+    if "_ttfi_ms" not in st.session_state:
+        return
+    ms, n = st.session_state["_ttfi_ms"]
+    r = stats.report()
+    line = f"Siap dalam {ms:.0f} ms (sesi ke-{n} sejak server start) · warm start {r['warm_ms']:.0f} ms"
+    if r["first_ms"] is not None:
+        line += f" · sesi pertama {r['first_ms']:.0f} ms"
+    if r["nth_median_ms"] is not None:
+        line += f" · median sesi berikutnya {r['nth_median_ms']:.0f} ms (n={r['nth_n']})"
+    slot.caption(line)
 
-    st.subheader("Identitas (auto-fill, bisa override)")
-    c1,c2 = st.columns(2)
-    with c1:
-        nama = st.text_input("Nama", value=parsed.nama, key="pre_nama")
-        jk = st.text_input("JK", value=parsed.jk, key="pre_jk")
-        umur = st.text_input("Umur", value=parsed.umur, key="pre_umur")
-        pembiayaan = st.text_input("Pembiayaan", value=parsed.pembiayaan or "BPJS", key="pre_pay")
-    with c2:
-        rm = st.text_input("RM", value=parsed.rm, key="pre_rm")
-        rs = st.text_input("RS", value=parsed.rs, key="pre_rs")
-        kamar = st.text_input("Kamar/Bed", value=parsed.kamar or "", key="pre_kamar")
-        residen = split_people_list(st.text_area("Residen", value=parsed.residen or "", height=60, key="pre_res"))
-    dpjp = st.text_input("DPJP", value=parsed.dpjp or "", key="pre_dpjp")
-
-    st.subheader("Jadwal operasi")
-    today = datetime.now(TZ).date()
-    tgl_lap = st.date_input("Tanggal laporan", value=today, key="pre_tgl_lap")
-    tgl_op = st.date_input("Tanggal operasi", value=today + timedelta(days=1), key="pre_tgl_op")
-    zona = st.text_input("Zona waktu", value="WITA", key="pre_zona")
-    jam_from_minlap = parse_minlap_jam(minlap)
-    jam_op = st.text_input("Jam operasi", value=jam_from_minlap or "08.00", key="pre_jam")
-    anestesi = st.text_input("Anestesi", value="general anestesi", key="pre_an")
-
-    puasa_default = ""
-    ab_default = ""
-    op_parsed = parse_hhmm(jam_op)
-    if op_parsed:
-        ph, pm = minus_minutes(op_parsed[0], op_parsed[1], 6*60)
-        ah, am = minus_minutes(op_parsed[0], op_parsed[1], 60)
-        puasa_default = fmt_time(ph, pm)
-        ab_default = fmt_time(ah, am)
-
-    st.subheader("Isi SOAP (auto dari mentah, edit)")
-    S = st.text_area("S", value=parsed.S or "", height=110, key="pre_S")
-    O_generalis = st.text_area("O - Status Generalis", value=parsed.O_generalis or "", height=110, key="pre_Og")
-    EO = st.text_area("EO", value=parsed.EO or "", height=110, key="pre_EO")
-    IO = st.text_area("IO", value=parsed.IO or "", height=110, key="pre_IO")
-    A = st.text_area("A", value=parsed.A or "", height=90, key="pre_A")
-
-    with st.expander("Assist EO/IO (opsional): checklist sesuai kasus", expanded=False):
-        eo_lines, io_lines = build_eo_io(case_name, "preop")
-        if st.button("➡️ Replace EO/IO dari checklist", use_container_width=True, key="pre_replace"):
-            st.session_state["pre_EO_override"] = join_bullets(eo_lines, bullet="•⁠  ⁠")
-            st.session_state["pre_IO_override"] = join_bullets(io_lines, bullet="•⁠  ⁠")
-            st.rerun()
-    EO = st.session_state.get("pre_EO_override", EO)
-    IO = st.session_state.get("pre_IO_override", IO)
-
-    st.divider()
-    st.subheader("Penunjang (dari MINLAP, format dijaga)")
-    penunjang_raw = parse_minlap_penunjang_block(minlap) if minlap.strip() else ""
-    penunjang_preview = st.text_area("Penunjang", value=penunjang_raw, height=220, key="pre_pen")
-
-    st.divider()
-    st.subheader("Plan wajib (otomatis)")
-    bb = st.number_input("BB (kg) untuk hitung IVFD (isi manual)", min_value=0.0, max_value=200.0, value=0.0, step=0.1, key="pre_bb")
-    drip_factor = st.selectbox("Drip factor", [20,60], index=0, key="pre_df")
-    suggested_tpm = tpm_from_ml_per_hr(maintenance_ml_per_hr_421(bb), drip_factor) if bb>0 else 0
-
-    include_ivfd = st.checkbox("IVFD", value=True, key="pre_ivfd_on")
-    include_puasa = st.checkbox("Puasa 6 jam", value=True, key="pre_puasa_on")
-    include_ab = st.checkbox("Antibiotik 1 jam", value=True, key="pre_ab_on")
-
-    plan_lines=[]
-    plan_lines.append("ACC TS Anestesi")
-
-    if include_ivfd:
-        cairan = st.text_input("Cairan", value="RL", key="pre_cairan")
-        tpm = st.number_input("tpm", min_value=0, max_value=250, value=int(suggested_tpm) if suggested_tpm else 0, step=1, key="pre_tpm")
-        drip_label = "makrodrips" if drip_factor==20 else "mikrodrips"
-        plan_lines.append(f"IVFD {cairan} {tpm} tpm ({drip_label})" if tpm>0 else f"IVFD {cairan} (isi tpm) ({drip_label})")
-
-    if include_puasa:
-        puasa_mulai = st.text_input("Mulai puasa (auto)", value=puasa_default, key="pre_puasa")
-        if clean(puasa_mulai):
-            plan_lines.append(f"Puasa 6 jam pre op atau sesuai instruksi dari TS. Anestesi yaitu mulai Pukul {puasa_mulai} {zona}")
-
-    plan_lines += [
-        "Pasien menyikat gigi sebelum tidur dan sebelum ke kamar operasi",
-        "Gunakan masker bedah saat ke kamar operasi",
-    ]
+# =========================
+# UI
+# =========================
+_meter = start_rerun_meter()
+_assets, _boot = warm_start()
+if is_lite():
+    keep_widget_state()
+take_handoff_param()
+_changed = record_draft()
+_mem = account_session()
+st.set_page_config(page_title="SuperSOAP v5", layout="centered")
+st.title("SuperSOAP v5 — EO/IO Smart Builder untuk Semua Kasus")
 
-    if include_ab:
-        ab_nama = st.text_input("Antibiotik", value="Ceftriaxone", key="pre_ab")
-        ab_dosis = st.text_input("Dosis", value="1 gr", key="pre_ab_dose")
-        ab_jam = st.text_input("Jam antibiotik (auto)", value=ab_default, key="pre_ab_time")
-        skin = st.checkbox("Skin test terlebih dahulu", value=True, key="pre_skin")
-        skin_phrase = " (skin test terlebih dahulu)" if skin else ""
-        plan_lines.append(f"Pasien rencana diberikan antibiotik profilaksis {ab_nama} {ab_dosis}, 1 jam sebelum operasi{skin_phrase} pada Pukul {ab_jam} {zona}")
-
-    extra_plan = st.text_area("Plan tambahan (opsional)", height=110, key="pre_extra")
-    plan_lines += [clean(x) for x in extra_plan.splitlines() if clean(x)]
-
-    tindakan = st.text_input("Tindakan (auto dari P)", value=parsed.tindakan_hint or "", key="pre_tind")
-    meds = st.text_area("Medikasi (opsional)", height=110, key="pre_meds")
-    meds_items = [clean(x) for x in meds.splitlines() if clean(x)]
-
-    if st.button("Generate SOAP Pre-Op", type="primary", use_container_width=True, key="pre_gen"):
-        overrides = {
-            "nama": nama, "jk": jk, "umur": umur, "pembiayaan": pembiayaan,
-            "kamar": kamar or "(isi kamar/bed)", "rm": rm, "rs": rs,
-            "S": S, "O_generalis": O_generalis, "EO": EO, "IO": IO, "A": A
-        }
-        out = build_preop(parsed, overrides, penunjang_preview, plan_lines, tindakan or "(isi tindakan)", anestesi, jam_op, zona, tgl_lap, tgl_op, residen or "-", dpjp or "-", meds_items)
-        st.text_area("Output", value=out, height=520)
-        st.download_button("Download .txt", data=out.encode("utf-8"), file_name="soap_preop.txt", mime="text/plain", use_container_width=True)
+with st.sidebar:
+    st.toggle("Lite mode (HP / sinyal lemah)", value=False, key="lite_mode",
+              help="Lebih sedikit widget: TTV 1 baris, field jarang dipakai disembunyikan, checklist EO/IO dikirim sekali lewat tombol Terapkan.")
+    u1,u2 = st.columns(2)
+    with u1:
+        st.button("↶ Undo", on_click=undo_draft, disabled=not draft_history().can_undo(), use_container_width=True, key="draft_undo_btn")
+    with u2:
+        st.button("↷ Redo", on_click=redo_draft, disabled=not draft_history().can_redo(), use_container_width=True, key="draft_redo_btn")
+    _h = draft_history()
+    st.caption(f"Riwayat draft: {_h.pos + 1}/{len(_h.snaps)} · {_h.nbytes() / 1024:.1f} KB")
+    if _mem:
+        st.caption(
+            f"Memori sesi: {_mem['bytes'] / 1024:.0f} KB / {SESSION_MAX_BYTES / 1024 / 1024:.0f} MB · "
+            f"Server: {_mem['server_sessions']} sesi, {_mem['server_bytes'] / 1024 / 1024:.1f} MB draft"
+            + (f", RSS {_mem['server_rss'] / 1024 / 1024:.0f} MB" if _mem["server_rss"] else "")
+        )
+    with st.expander("📲 Pindah perangkat"):
+        st.caption("Bawa draft ke HP/PC lain tanpa disimpan di server: kirim kode atau link-nya lewat chat.")
+        ho_stage = st.selectbox("Draft stage", WARD_STAGES, key="handoff_stage")
+        st.button("Buat kode", on_click=make_handoff_code, args=(ho_stage,), use_container_width=True, key="handoff_make_btn")
+        if st.session_state.get("_handoff_code") and st.query_params.get(HANDOFF_PARAM) == st.session_state["_handoff_code"]:
+            st.code(st.session_state["_handoff_code"], language=None)
+            st.caption(f"{len(st.session_state['_handoff_code'])} karakter · link di address bar sudah berisi kode ini (?{HANDOFF_PARAM}=…)")
+        st.text_input("Tempel kode", value="", key="handoff_paste")
+        st.button("Pulihkan", on_click=lambda: apply_handoff(st.session_state.get("handoff_paste", "")),
+                  use_container_width=True, key="handoff_apply_btn")
+        if st.session_state.get("_handoff_msg"):
+            kind, msg = st.session_state.pop("_handoff_msg")
+            (st.success if kind == "success" else st.error)(msg)
+    _meter_slot = st.empty()
+    _boot_slot = st.empty()
+
+if _mem and _mem["spilled"]:
+    st.info("Draft sesi ini sempat tidak aktif lama dan dipindah ke disk.")
+    r1,r2 = st.columns(2)
+    with r1:
+        st.button("Pulihkan draft", on_click=restore_spilled_draft, use_container_width=True, key="spill_restore_btn")
+    with r2:
+        st.button("Buang", on_click=discard_spilled_draft, use_container_width=True, key="spill_discard_btn")
+
+tab_awal, tab_preop, tab_pod0, tab_pod1, tab_podn, tab_lapop, tab_bangsal, tab_arsip = stage_tabs(["Awal", "Pre-Op", "POD 0", "POD 1", "POD n", "Laporan Operasi", "Bangsal", "Arsip"])
+
+# ---- AWAL
+if tab_awal is not None:
+    with tab_awal, widget_scope("awal"):
+        st.caption("Awal = pasien baru datang. Form + checklist EO/IO (semi otomatis).")
+        case_name = st.selectbox("Kasus", CASES, index=CASES.index("Impaksi"), key="awal_case")
+
+        st.subheader("Identitas")
+        c1,c2 = st.columns(2)
+        with c1:
+            nama = st.text_input("Nama (Tn./Ny./Nn./An.)", value="", key="awal_nama")
+            jk = st.selectbox("JK", ["L","P"], index=1, key="awal_jk")
+            umur = st.text_input("Umur", value="", key="awal_umur")
+            pembiayaan = st.text_input("Pembiayaan", value="BPJS", key="awal_pay")
+        with c2:
+            rm = st.text_input("RM", value="", key="awal_rm")
+            rs = st.text_input("RS", value="RSGMP UNHAS", key="awal_rs")
+            tanggal = st.date_input("Tanggal", value=datetime.now(TZ).date(), key="awal_tgl")
+
+        jk_long = "laki-laki" if jk=="L" else "perempuan"
+        keluhan = st.text_area("Keluhan utama", height=80, key="awal_keluhan")
+
+        with st.expander("Riwayat (Alergi/Sistemik/Obat rutin/Kondisi sekarang)", expanded=True):
+            hist = history_blocks()
+
+        st.subheader("TTV")
+        if is_lite():
+            ku = st.selectbox("KU", ["Baik/Compos Mentis", "Sedang", "Buruk"], index=0, key="awal_ku")
+            v = ttv_line_input("TD N P S SpO2 BB TB (pisah spasi)", {"td": "120/70 mmHg", "nadi": 80, "rr": 19, "temp": 36.7, "spo2": 99, "bb": 0.0, "tb": 0.0}, key="awal_ttv_line")
+            td, nadi, rr, temp, spo2, bb, tb = (v[k] for k in TTV_LINE_FIELDS)
+        else:
+            t1,t2,t3 = st.columns(3)
+            with t1:
+                ku = st.selectbox("KU", ["Baik/Compos Mentis", "Sedang", "Buruk"], index=0, key="awal_ku")
+                td = st.text_input("TD", value="120/70 mmHg", key="awal_td")
+                nadi = st.number_input("Nadi", min_value=0, max_value=220, value=80, step=1, key="awal_nadi")
+            with t2:
+                rr = st.number_input("RR", min_value=0, max_value=80, value=19, step=1, key="awal_rr")
+                temp = st.number_input("Suhu", min_value=30.0, max_value=42.0, value=36.7, step=0.1, key="awal_temp")
+                spo2 = st.number_input("SpO2", min_value=0, max_value=100, value=99, step=1, key="awal_spo2")
+            with t3:
+                bb = st.number_input("BB (kg)", min_value=0.0, max_value=200.0, value=0.0, step=0.1, key="awal_bb")
+                tb = st.number_input("TB (cm)", min_value=0.0, max_value=230.0, value=0.0, step=0.5, key="awal_tb")
+        vitals_panel(rm, POD_AWAL, {"td": td, "nadi": nadi, "rr": rr, "temp": temp, "spo2": spo2})
+
+        st.divider()
+        eo_lines, io_lines = build_eo_io(case_name, "awal")
+
+        st.divider()
+        st.subheader("A & Plan")
+        A_text = st.text_area("Diagnosis (1 baris = 1 diagnosis)", height=110, key="awal_A")
+        A_lines = [clean(x) for x in A_text.splitlines() if clean(x)]
+        plan_text = st.text_area("Plan (1 baris = 1 item)", height=120, key="awal_plan")
+        plan_lines = [clean(x) for x in plan_text.splitlines() if clean(x)]
+
+        residen = split_people_list(st.text_area("Residen", height=60, key="awal_res"))
+        dpjp = st.text_input("DPJP", value="", key="awal_dpjp")
+
+        diff_checkbox("awal")
+        if st.button("Generate SOAP Awal", type="primary", use_container_width=True, key="awal_gen"):
+            ident = {"nama": nama, "jk": jk, "jk_long": jk_long, "umur": umur, "pembiayaan": pembiayaan, "rm": rm}
+            ttv = {"ku": ku, "td": td, "nadi": int(nadi), "rr": int(rr), "temp": float(temp), "spo2": int(spo2), "bb": float(bb), "tb": float(tb)}
+            sections, diff = report_changes(build_awal_sections(case_name, ident, ttv, eo_lines, io_lines, keluhan, hist, A_lines, plan_lines, residen, dpjp, rs, tanggal), rm, "Awal", tanggal, "awal")
+            out = join_sections(sections)
+            st.text_area("Output", value=out, height=520)
+            show_changes(diff)
+            st.download_button("Download .txt", data=out.encode("utf-8"), file_name="soap_awal.txt", mime="text/plain", use_container_width=True)
+            archive_report(out, rm, tanggal, "Awal", case_name, nama, sections)
+            record_vitals(rm, tanggal, POD_AWAL, ttv)
+
+# ---- PRE-OP
+if tab_preop is not None:
+    with tab_preop, widget_scope("pre"):
+        st.caption("Pre-Op = paste SOAP mentah + MINLAP. (BB/TB TIDAK diparse otomatis sesuai aturanmu).")
+        case_name = st.selectbox("Kasus (untuk assist EO/IO)", CASES, index=CASES.index("Impaksi"), key="pre_case")
+
+        raw = st.text_area("SOAP mentah (khusus Pre-Op)", height=200, key="pre_raw")
+        minlap = st.text_area("MINLAP (khusus Pre-Op)", height=200, key="pre_minlap")
+
+        raw, raw_cut = bound_paste(raw, "assalamualaikum")
+        minlap, minlap_cut = bound_paste(minlap)
+        if raw_cut or minlap_cut:
+            st.caption(f"Paste terlalu panjang — hanya {PARSE_MAX_CHARS:,} karakter terakhir/laporan terbaru yang diparse.")
+            for field_name, cut in (("pre_raw", raw_cut), ("pre_minlap", minlap_cut)):
+                if cut:
+                    get_metrics().inc("supersoap_paste_truncated_total", field=field_name)
+
+        parsed = ParsedSoap()
+        if raw.strip():
+            # on timeout the whole paste lands in S, to be split by hand (like the penunjang fallback below)
+            parsed = timed_parse("parse_raw_soap_preop_only", parse_raw_soap_preop_only, raw, ParsedSoap(S=raw.strip()))
+
+        st.subheader("Identitas (auto-fill, bisa override)")
+        c1,c2 = st.columns(2)
+        with c1:
+            nama = st.text_input("Nama", value=parsed.nama, key="pre_nama")
+            jk = st.text_input("JK", value=parsed.jk, key="pre_jk")
+            umur = st.text_input("Umur", value=parsed.umur, key="pre_umur")
+            pembiayaan = st.text_input("Pembiayaan", value=parsed.pembiayaan or "BPJS", key="pre_pay")
+        with c2:
+            rm = st.text_input("RM", value=parsed.rm, key="pre_rm")
+            rs = st.text_input("RS", value=parsed.rs, key="pre_rs")
+            kamar = st.text_input("Kamar/Bed", value=parsed.kamar or "", key="pre_kamar")
+            residen = split_people_list(st.text_area("Residen", value=parsed.residen or "", height=60, key="pre_res"))
+        dpjp = st.text_input("DPJP", value=parsed.dpjp or "", key="pre_dpjp")
+
+        st.subheader("Jadwal operasi")
+        today = datetime.now(TZ).date()
+        tgl_lap = st.date_input("Tanggal laporan", value=today, key="pre_tgl_lap")
+        tgl_op = st.date_input("Tanggal operasi", value=today + timedelta(days=1), key="pre_tgl_op")
+        zona = st.text_input("Zona waktu", value="WITA", key="pre_zona")
+        jam_from_minlap = timed_parse("parse_minlap_jam", parse_minlap_jam, minlap, "") if minlap.strip() else ""
+        jam_op = st.text_input("Jam operasi", value=jam_from_minlap or "08.00", key="pre_jam")
+        anestesi = st.text_input("Anestesi", value="general anestesi", key="pre_an")
+
+        puasa_default, ab_default = preop_default_times(jam_op)
+
+        st.subheader("Isi SOAP (auto dari mentah, edit)")
+        S = st.text_area("S", value=parsed.S or "", height=110, key="pre_S")
+        O_generalis = st.text_area("O - Status Generalis", value=parsed.O_generalis or "", height=110, key="pre_Og")
+        EO = st.text_area("EO", value=parsed.EO or "", height=110, key="pre_EO")
+        IO = st.text_area("IO", value=parsed.IO or "", height=110, key="pre_IO")
+        A = st.text_area("A", value=parsed.A or "", height=90, key="pre_A")
+
+        # collapsed expanders still ship their widgets; lite mode only builds the checklist on request
+        if not is_lite() or st.toggle("Assist EO/IO (opsional): checklist sesuai kasus", value=False, key="pre_assist_on"):
+            with st.expander("Assist EO/IO (opsional): checklist sesuai kasus", expanded=is_lite()):
+                eo_lines, io_lines = build_eo_io(case_name, "preop")
+                if st.button("➡️ Replace EO/IO dari checklist", use_container_width=True, key="pre_replace"):
+                    st.session_state["pre_EO_override"] = join_bullets(eo_lines, bullet="•⁠  ⁠")
+                    st.session_state["pre_IO_override"] = join_bullets(io_lines, bullet="•⁠  ⁠")
+                    st.rerun()
+        EO = st.session_state.get("pre_EO_override", EO)
+        IO = st.session_state.get("pre_IO_override", IO)
+
+        st.divider()
+        st.subheader("Penunjang (dari MINLAP, format dijaga)")
+        penunjang_raw = timed_parse("parse_minlap_penunjang_block", parse_minlap_penunjang_block, minlap, minlap.strip()) if minlap.strip() else ""
+        penunjang_preview = st.text_area("Penunjang", value=penunjang_raw, height=220, key="pre_pen")
+        labs = parse_lab_values(penunjang_preview if clean(penunjang_preview) else penunjang_raw)
+        if len(labs.test):
+            abn = labs.abnormal()
+            with st.expander(f"Lab terstruktur · {len(labs.test)} nilai" + (f" · ⚠️ {', '.join(abn)}" if abn else " · normal"), expanded=bool(abn)):
+                st.dataframe(labs.rows(), hide_index=True, use_container_width=True)
+
+        st.divider()
+        st.subheader("Plan wajib (otomatis)")
+        bb = st.number_input("BB (kg) untuk hitung IVFD (isi manual)", min_value=0.0, max_value=200.0, value=0.0, step=0.1, key="pre_bb")
+        drip_factor = st.selectbox("Drip factor", [20,60], index=0, key="pre_df")
+        suggested_tpm = tpm_from_ml_per_hr(maintenance_ml_per_hr_421(bb), drip_factor) if bb>0 else 0
+
+        include_ivfd = st.checkbox("IVFD", value=True, key="pre_ivfd_on")
+        include_puasa = st.checkbox("Puasa 6 jam", value=True, key="pre_puasa_on")
+        include_ab = st.checkbox("Antibiotik 1 jam", value=True, key="pre_ab_on")
+
+        ivfd = puasa_mulai = ab = None
+        if include_ivfd:
+            cairan = st.text_input("Cairan", value="RL", key="pre_cairan")
+            tpm = st.number_input("tpm", min_value=0, max_value=250, value=int(suggested_tpm) if suggested_tpm else 0, step=1, key="pre_tpm")
+            ivfd = (cairan, int(tpm), int(drip_factor))
+
+        if include_puasa:
+            puasa_mulai = st.text_input("Mulai puasa (auto)", value=puasa_default, key="pre_puasa")
+
+        if include_ab:
+            ab_nama = st.text_input("Antibiotik", value="Ceftriaxone", key="pre_ab")
+            ab_dosis = st.text_input("Dosis", value="1 gr", key="pre_ab_dose")
+            ab_jam = st.text_input("Jam antibiotik (auto)", value=ab_default, key="pre_ab_time")
+            skin = st.checkbox("Skin test terlebih dahulu", value=True, key="pre_skin")
+            ab = (ab_nama, ab_dosis, ab_jam, skin)
+
+        extra_plan = st.text_area("Plan tambahan (opsional)", height=110, key="pre_extra")
+        plan_lines = preop_plan_lines(zona, ivfd, puasa_mulai, ab, extra_plan)
+
+        tindakan = st.text_input("Tindakan (auto dari P)", value=parsed.tindakan_hint or "", key="pre_tind")
+        meds = st.text_area("Medikasi (opsional)", height=110, key="pre_meds")
+        meds_items = [clean(x) for x in meds.splitlines() if clean(x)]
+
+        diff_checkbox("pre")
+        if st.button("Generate SOAP Pre-Op", type="primary", use_container_width=True, key="pre_gen"):
+            overrides = {
+                "nama": nama, "jk": jk, "umur": umur, "pembiayaan": pembiayaan,
+                "kamar": kamar or "(isi kamar/bed)", "rm": rm, "rs": rs,
+                "S": S, "O_generalis": O_generalis, "EO": EO, "IO": IO, "A": A
+            }
+            sections, diff = report_changes(build_preop_sections(parsed, overrides, penunjang_preview, plan_lines, tindakan or "(isi tindakan)", anestesi, jam_op, zona, tgl_lap, tgl_op, residen or "-", dpjp or "-", meds_items), rm, "PreOp", tgl_lap, "pre")
+            out = join_sections(sections)
+            st.text_area("Output", value=out, height=520)
+            show_changes(diff)
+            st.download_button("Download .txt", data=out.encode("utf-8"), file_name="soap_preop.txt", mime="text/plain", use_container_width=True)
+            archive_report(out, rm, tgl_lap, "PreOp", case_name, nama, sections)
+            record_vitals(rm, tgl_lap, POD_PREOP, vitals_from_text(O_generalis))
 
-# ---- POD 0/1 (unchanged simple, question-based)
 def pod_builder(stage: str):
     st.caption(f"{stage} = SOAP pasca operasi. Tidak ada MINLAP/mentah.")
     rs = st.text_input("RS", value="RSGMP UNHAS", key=f"{stage}_rs")
@@ -992,60 +2476,254 @@ def pod_builder(stage: str):
     nyeri_skala=""
     if nyeri=="Ya":
         nyeri_lokasi = st.text_input("Lokasi nyeri", value="", key=f"{stage}_nyeri_lokasi")
-        nyeri_skala = st.selectbox("Skala nyeri (NRS)", ["1-3 (ringan)","4-6 (sedang)","7-10 (berat)"], index=1, key=f"{stage}_nyeri_skala")
+        nyeri_skala = st.selectbox("Skala nyeri (NRS)", POD_NYERI_SKALA, index=1, key=f"{stage}_nyeri_skala")
     mual = st.radio("Mual/muntah?", ["Tidak", "Ya"], horizontal=True, key=f"{stage}_mual")
     perdarahan = st.radio("Perdarahan dari luka?", ["Tidak", "Ya"], horizontal=True, key=f"{stage}_darah")
 
     st.subheader("Kondisi luka")
-    luka = st.selectbox("Kondisi luka", ["Kering", "Serosanguinous sedikit", "Pus/bernanah", "Bengkak/hiperemis"], index=0, key=f"{stage}_luka")
+    luka = st.selectbox("Kondisi luka", POD_LUKA, index=0, key=f"{stage}_luka")
     bau = st.radio("Bau?", ["Tidak", "Ya"], horizontal=True, key=f"{stage}_bau")
 
     st.subheader("TTV")
-    td = st.text_input("TD", value="120/70 mmHg", key=f"{stage}_td")
-    nadi = st.number_input("Nadi", min_value=0, max_value=220, value=80, step=1, key=f"{stage}_nadi")
-    rr = st.number_input("RR", min_value=0, max_value=80, value=19, step=1, key=f"{stage}_rr")
-    temp = st.number_input("Suhu", min_value=30.0, max_value=42.0, value=36.7, step=0.1, key=f"{stage}_temp")
-    spo2 = st.number_input("SpO2", min_value=0, max_value=100, value=99, step=1, key=f"{stage}_spo2")
+    if is_lite():
+        v = ttv_line_input("TD N P S SpO2 (pisah spasi)", {"td": "120/70 mmHg", "nadi": 80, "rr": 19, "temp": 36.7, "spo2": 99}, key=f"{stage}_ttv_line")
+        td, nadi, rr, temp, spo2 = v["td"], v["nadi"], v["rr"], v["temp"], v["spo2"]
+    else:
+        td = st.text_input("TD", value="120/70 mmHg", key=f"{stage}_td")
+        nadi = st.number_input("Nadi", min_value=0, max_value=220, value=80, step=1, key=f"{stage}_nadi")
+        rr = st.number_input("RR", min_value=0, max_value=80, value=19, step=1, key=f"{stage}_rr")
+        temp = st.number_input("Suhu", min_value=30.0, max_value=42.0, value=36.7, step=0.1, key=f"{stage}_temp")
+        spo2 = st.number_input("SpO2", min_value=0, max_value=100, value=99, step=1, key=f"{stage}_spo2")
+
+    vitals_panel(rm, int(stage.split()[-1]), {"td": td, "nadi": nadi, "rr": rr, "temp": temp, "spo2": spo2})
 
     plan = st.text_area("Plan", height=100, key=f"{stage}_plan")
     meds = st.text_area("Medikasi", height=100, key=f"{stage}_meds")
     residen = split_people_list(st.text_area("Residen", height=60, key=f"{stage}_res"))
     dpjp = st.text_input("DPJP", value="", key=f"{stage}_dpjp")
 
+    day = PodDay(int(stage.split()[-1]), rs, tanggal, nama, jk, umur, pembiayaan, kamar, rm, nyeri, nyeri_lokasi, nyeri_skala,
+                 mual, perdarahan, luka, bau, td, int(nadi), int(rr), float(temp), int(spo2), plan, meds, residen, dpjp)
+    st.session_state.setdefault("pod_state", {})[stage] = day
+
+    diff_checkbox(stage)
     if st.button(f"Generate {stage}", type="primary", use_container_width=True, key=f"{stage}_gen"):
-        hari = day_name_id(tanggal)
-        header = f"Assalamualaikum dok,\nMaaf mengganggu, izin melaporkan Pasien Rawat Inap {rs}, {hari} ({fmt_ddmmyyyy(tanggal)})\n\n"
-        ident = f"{nama} / {jk} / {umur} / {pembiayaan} / Rawat Inap / {kamar} / {rs} / RM {rm}\n\n"
-        s_parts=[]
-        s_parts.append("Tidak ada keluhan nyeri pada daerah operasi." if nyeri=="Tidak" else f"Ada keluhan nyeri pada {nyeri_lokasi or 'daerah operasi'} dengan skala {nyeri_skala}.")
-        if mual=="Ya": s_parts.append("Keluhan mual/muntah (+).")
-        if perdarahan=="Ya": s_parts.append("Perdarahan dari luka operasi (+).")
-        s = " ".join(s_parts)
-        o = (
-            "Status Generalis:\n"
-            f"TD : {td}\nN  : {int(nadi)} x/menit\nP  : {int(rr)} x/menit\nS  : {float(temp):.1f} °C\nSpO2: {int(spo2)}% (free air)\n\n"
-            "Status Lokalis:\n"
-            f"Luka operasi: {luka}\nBau: {bau}\n"
-        )
-        out = (
-            header + ident +
-            f"S: {s}\n\nO:\n{o}\n"
-            "A:\n•⁠  ⁠Post operative state\n\n"
-            "P:\n" + join_bullets([x for x in plan.splitlines() if clean(x)], bullet="•⁠  ⁠") + "\n\n"
-            "Medikasi:\n" + join_bullets([x for x in meds.splitlines() if clean(x)], bullet="•⁠  ⁠") + "\n\n"
-            "Mohon instruksi selanjutnya dokter.\nTerima kasih.\n\n"
-            f"Residen: {residen}\n\nDPJP : {dpjp}\n"
-        )
+        sections, diff = report_changes(pod_sections(day), rm, stage.replace(" ", ""), tanggal, stage)
+        out = join_sections(sections)
         st.text_area("Output", value=out, height=520)
+        show_changes(diff)
         st.download_button("Download .txt", data=out.encode("utf-8"), file_name=f"{stage.lower().replace(' ','_')}.txt", mime="text/plain", use_container_width=True)
-
-with tab_pod0:
-    pod_builder("POD 0")
-with tab_pod1:
-    pod_builder("POD 1")
-
-with tab_lapop:
-    st.caption("Hanya tampilkan teks laporan operasi (paste → tampil).")
-    lapop = st.text_area("Paste laporan operasi", height=280, key="lapop")
-    if st.button("Tampilkan Laporan Operasi", use_container_width=True, key="lapop_btn"):
-        st.text_area("Laporan Operasi", value=lapop, height=520)
+        archive_report(out, rm, tanggal, stage.replace(" ", ""), "", nama, sections)
+        record_vitals(rm, tanggal, day.pod, asdict(day))
+
+POD_SERIES_MAX = 30
+# editor column -> (PodDay field, column config)
+POD_SERIES_COLS = {
+    "Nyeri": ("nyeri", lambda: st.column_config.SelectboxColumn(options=["Tidak", "Ya"])),
+    "Lokasi nyeri": ("nyeri_lokasi", lambda: st.column_config.TextColumn()),
+    "Skala": ("nyeri_skala", lambda: st.column_config.SelectboxColumn(options=POD_NYERI_SKALA)),
+    "Mual": ("mual", lambda: st.column_config.SelectboxColumn(options=["Tidak", "Ya"])),
+    "Perdarahan": ("perdarahan", lambda: st.column_config.SelectboxColumn(options=["Tidak", "Ya"])),
+    "Luka": ("luka", lambda: st.column_config.SelectboxColumn(options=POD_LUKA)),
+    "Bau": ("bau", lambda: st.column_config.SelectboxColumn(options=["Tidak", "Ya"])),
+    "TD": ("td", lambda: st.column_config.TextColumn()),
+    "Nadi": ("nadi", lambda: st.column_config.NumberColumn(min_value=0, max_value=220, step=1)),
+    "RR": ("rr", lambda: st.column_config.NumberColumn(min_value=0, max_value=80, step=1)),
+    "Suhu": ("temp", lambda: st.column_config.NumberColumn(min_value=30.0, max_value=42.0, step=0.1, format="%.1f")),
+    "SpO2": ("spo2", lambda: st.column_config.NumberColumn(min_value=0, max_value=100, step=1)),
+    "Plan": ("plan", lambda: st.column_config.TextColumn(help="Pisah baris dengan ;")),
+    "Medikasi": ("meds", lambda: st.column_config.TextColumn(help="Pisah baris dengan ;")),
+}
+_POD_SERIES_CASTS = {"nadi": int, "rr": int, "spo2": int, "temp": float}
+
+def pod_series_deltas(rows: List[dict]) -> List[dict]:
+    deltas = []
+    for r in rows:
+        d = {}
+        for col, (f, _) in POD_SERIES_COLS.items():
+            v = r.get(col)
+            if v is None or (isinstance(v, float) and v != v) or (isinstance(v, str) and not v.strip()):
+                continue
+            if f in ("plan", "meds"):
+                v = "\n".join(x.strip() for x in v.split(";"))
+            d[f] = _POD_SERIES_CASTS.get(f, lambda x: x)(v)
+        deltas.append(d)
+    return deltas
+
+def pod_series_builder():
+    saved: Dict[str, PodDay] = st.session_state.get("pod_state", {})
+    if not saved:
+        st.info("Isi dulu form POD 0 atau POD 1 — hari berikutnya melanjutkan data dari situ.")
+        return
+    src = st.selectbox("Lanjut dari", sorted(saved, key=lambda k: -saved[k].pod), key="podseri_src")
+    base = saved[src]
+    last = st.number_input("Sampai POD", min_value=base.pod + 1, max_value=POD_SERIES_MAX, value=min(base.pod + 3, POD_SERIES_MAX), step=1, key="podseri_last")
+    st.caption(f"Data awal: {src} · {base.nama or '-'} · RM {base.rm or '-'}. Sel kosong = sama dengan hari sebelumnya; cukup isi yang berubah.")
+    rows = [{"POD": n, "Tanggal": fmt_ddmmyyyy(base.tanggal + timedelta(days=n - base.pod)), **{c: None for c in POD_SERIES_COLS}}
+            for n in range(base.pod + 1, int(last) + 1)]
+    edited = st.data_editor(rows, key=f"podseri_{src.replace(' ', '')}_editor", hide_index=True, disabled=["POD", "Tanggal"],
+                            column_config={c: cfg() for c, (_, cfg) in POD_SERIES_COLS.items()}, use_container_width=True)
+    diff_checkbox("podseri")
+    if st.button(f"Generate POD {base.pod + 1}–{int(last)}", type="primary", use_container_width=True, key="podseri_gen"):
+        days = pod_series(base, pod_series_deltas(edited))
+        # each day is compared with the day before it; the first with the patient's latest
+        # archived report (the base day's form when nothing is archived yet)
+        summary_on = st.session_state.get("podseri_diff_on", False)
+        prev_sections, since = pod_sections(base), f"POD {base.pod} ({fmt_ddmmyyyy(base.tanggal)})"
+        prev = previous_report(days[0].rm, f"POD{days[0].pod}", days[0].tanggal)
+        if prev is not None:
+            prev_sections = get_archive().read_sections(prev["id"])
+            since = f"{ward_stage_label(prev['stage'])} ({fmt_ddmmyyyy(date.fromisoformat(prev['tgl']))})"
+        outs, diffs = [], []
+        for d in days:
+            sections, diff = with_changes(pod_sections(d), prev_sections, since, summary_on)
+            outs.append(join_sections(sections))
+            diffs.append(f"== POD {d.pod} ==\n{diff}" if diff else "")
+            archive_report(outs[-1], d.rm, d.tanggal, f"POD{d.pod}", "", d.nama, sections)
+            record_vitals(d.rm, d.tanggal, d.pod, asdict(d))
+            prev_sections, since = pod_sections(d), f"POD {d.pod} ({fmt_ddmmyyyy(d.tanggal)})"
+        bundle = "\n\n-----\n\n".join(f"== POD {d.pod} ==\n{out}" for d, out in zip(days, outs))
+        st.text_area("Output", value=bundle, height=520)
+        show_changes("\n".join(x for x in diffs if x), "Perubahan per hari")
+        st.download_button("Download .txt", data=bundle.encode("utf-8"), file_name=f"pod_{days[0].pod}-{days[-1].pod}.txt", mime="text/plain", use_container_width=True)
+
+if tab_pod0 is not None:
+    with tab_pod0, widget_scope("POD 0"):
+        pod_builder("POD 0")
+if tab_pod1 is not None:
+    with tab_pod1, widget_scope("POD 1"):
+        pod_builder("POD 1")
+if tab_podn is not None:
+    with tab_podn, widget_scope("podseri"):
+        pod_series_builder()
+
+if tab_lapop is not None:
+    with tab_lapop:
+        st.caption("Hanya tampilkan teks laporan operasi (paste → tampil).")
+        if _assets.lapop:
+            l1,l2 = st.columns([3,1])
+            with l1:
+                st.selectbox("Template kasus (schema)", list(_assets.lapop), key="lapop_case")
+            with l2:
+                st.button("Pakai template", on_click=apply_lapop_template, use_container_width=True, key="lapop_tpl_btn")
+        lapop = st.text_area("Paste laporan operasi", height=280, key="lapop")
+        if st.button("Tampilkan Laporan Operasi", use_container_width=True, key="lapop_btn"):
+            st.text_area("Laporan Operasi", value=lapop, height=520)
+
+@st.fragment(run_every=WARD_POLL_SECONDS)
+def ward_board_live(show_pulang: bool) -> None:
+    # reruns on its own every few seconds; costs one integer compare when nothing changed
+    rows = [r for r in ward_rows().values() if show_pulang or r["status"] != "Pulang"]
+    st.caption(f"{len(rows)} pasien · versi board {st.session_state['_ward']['version']} · cek {datetime.now(TZ).strftime('%H:%M:%S')}")
+    if rows:
+        st.dataframe([{"Kamar": r["kamar"], "RM": r["rm"], "Nama": r["nama"], "Stage": r["stage"], "Jam op": r["op_time"],
+                       "Status": r["status"], "Draft": f"{r['draft_stage']} r{r['draft_rev']}" if r["draft_rev"] else "",
+                       "Oleh": f"{r['updated_by'] or '-'} · {r['updated_at']}"} for r in sorted(rows, key=lambda r: (r["kamar"], r["rm"]))],
+                     hide_index=True, use_container_width=True)
+    else:
+        st.info("Board masih kosong. Tambah pasien di bawah.")
+
+if tab_bangsal is not None:
+    with tab_bangsal:
+        st.caption("Board bersama semua residen di server ini. Perubahan residen lain muncul otomatis.")
+        saya = st.text_input("Nama kamu (residen)", value="", key="bangsal_saya")
+        ward_board_live(st.checkbox("Tampilkan pasien pulang", value=False, key="bangsal_pulang"))
+
+        st.subheader("Edit pasien")
+        pilihan = ["(pasien baru)"] + sorted(ward_rows())
+        pilih_rm = st.selectbox("Pasien (RM)", pilihan, key="bangsal_pilih",
+                                on_change=lambda: ward_open("" if st.session_state["bangsal_pilih"] == pilihan[0] else st.session_state["bangsal_pilih"]))
+        rm_baru = st.text_input("RM", value="", key="bangsal_rm_baru") if pilih_rm == pilihan[0] else pilih_rm
+        b1, b2 = st.columns(2)
+        with b1:
+            st.text_input("Nama", key="bangsal_nama")
+            st.text_input("Kamar/Bed", key="bangsal_kamar")
+            st.text_input("Jam operasi", key="bangsal_op_time", placeholder="mis. 09.00 WITA")
+        with b2:
+            st.selectbox("Stage", WARD_STAGES, key="bangsal_stage")
+            st.selectbox("Status", WARD_STATUS, key="bangsal_status")
+        if st.session_state.get("_ward_meta_conflict"):
+            st.error(f"Tidak disimpan — {st.session_state['_ward_meta_conflict']}. Data terbaru sudah dimuat; cek lalu simpan lagi.")
+        st.button("Simpan ke board", use_container_width=True, key="bangsal_simpan_btn", disabled=not clean(rm_baru),
+                  on_click=ward_save_meta, args=(clean(rm_baru), saya))
+
+        if pilih_rm != pilihan[0]:
+            st.subheader("Draft bersama")
+            row = ward_rows()[pilih_rm]
+            stage = st.selectbox("Draft stage", WARD_STAGES, index=WARD_STAGES.index(row["stage"]) if row["stage"] in WARD_STAGES else 0, key="bangsal_draft_stage")
+            base_rev = st.session_state.get("_ward_draft_rev", {}).get(pilih_rm, 0)
+            st.caption(f"Draft di board: {row['draft_stage'] or '-'} r{row['draft_rev']} · draft kamu berbasis r{base_rev}")
+            d1, d2 = st.columns(2)
+            with d1:
+                st.button("⬇️ Ambil draft", use_container_width=True, key="bangsal_ambil_btn", disabled=not row["draft_rev"],
+                          on_click=ward_take_draft, args=(pilih_rm,))
+            with d2:
+                st.button(f"⬆️ Simpan draft {stage}", use_container_width=True, key="bangsal_kirim_btn",
+                          on_click=ward_save_draft, args=(pilih_rm, stage, saya))
+            conflict = st.session_state.get("_ward_conflict")
+            if conflict and conflict["rm"] == pilih_rm:
+                st.error(f"Draft tidak disimpan — {conflict['msg']} setelah kamu ambil.")
+                c1, c2 = st.columns(2)
+                with c1:
+                    st.button("Ambil versi terbaru", use_container_width=True, key="bangsal_conflict_ambil_btn", on_click=ward_take_draft, args=(pilih_rm,))
+                with c2:
+                    st.button("Timpa dengan draft saya", use_container_width=True, key="bangsal_conflict_timpa_btn",
+                              on_click=ward_save_draft, args=(pilih_rm, conflict["stage"], saya, True))
+
+if tab_arsip is not None:
+    with tab_arsip:
+        st.caption("Semua laporan yang di-Generate otomatis masuk arsip lokal (terkompresi).")
+        cari = st.text_input("Cari (full-text)", value="", key="arsip_q",
+                             placeholder="contoh: impaksi gigi:38 gigi:48 dpjp:budi  /  abses trismus")
+        cari_rm = st.text_input("RM", value="", key="arsip_rm")
+        dari = sampai = None
+        if st.checkbox("Filter tanggal", value=False, key="arsip_tgl_on"):
+            a1,a2 = st.columns(2)
+            with a1:
+                dari = st.date_input("Dari", value=datetime.now(TZ).date() - timedelta(days=30), key="arsip_dari")
+            with a2:
+                sampai = st.date_input("Sampai", value=datetime.now(TZ).date(), key="arsip_sampai")
+        if clean(cari):
+            t0 = time.perf_counter()
+            hasil = get_archive().search(cari, dari, sampai)
+            st.caption(f"{len(hasil)} hasil · {(time.perf_counter() - t0) * 1000:.1f} ms")
+        else:
+            hasil = get_archive().lookup(cari_rm, dari, sampai)
+        if not hasil:
+            st.info("Belum ada laporan di arsip untuk filter ini.")
+        else:
+            labels = [f"{r['tgl']} · {r['stage']} · RM {r['rm'] or '-'} · {r['nama'] or '-'}" + (f" · {r['case_name']}" if r['case_name'] else "") for r in hasil]
+            pilih = st.selectbox("Laporan", range(len(hasil)), format_func=lambda i: labels[i], key="arsip_pilih")
+            st.text_area("Isi laporan", value=get_archive().read(hasil[pilih]["id"]), height=520, key=f"arsip_isi_{hasil[pilih]['id']}")
+        st.caption(f"Ukuran arsip di disk: {get_archive().disk_bytes() / 1024:.1f} KB")
+
+        if st.toggle("Lab pre-op (daftar OK)", value=False, key="arsip_lab_on"):
+            t0 = time.perf_counter()
+            ok_list = get_archive().lookup("", dari or datetime.now(TZ).date() - timedelta(days=2), sampai, limit=500, stage="PreOp")
+            tables = [parse_lab_values(parse_minlap_penunjang_block(get_archive().read(r["id"]))) for r in ok_list]
+            ward = LabTable.concat(tables)
+            flag = ward.flag  # one pass over every lab value of every patient
+            owner = np.repeat(np.arange(len(tables)), [len(t.test) for t in tables])
+            rows = []
+            for i, r in enumerate(ok_list):
+                hit = (owner == i) & (flag != "")
+                rows.append({"Tgl": r["tgl"], "RM": r["rm"] or "-", "Nama": r["nama"] or "-", "Lab": len(tables[i].test),
+                             "Abnormal": ", ".join(lab_flag_labels(ward.test[hit], ward.value[hit], flag[hit]))})
+            st.caption(f"{len(ok_list)} laporan Pre-Op · {len(ward.test)} nilai lab · {(time.perf_counter() - t0) * 1000:.1f} ms")
+            if rows:
+                st.dataframe(sorted(rows, key=lambda x: not x["Abnormal"]), hide_index=True, use_container_width=True)
+            else:
+                st.info("Belum ada laporan Pre-Op di rentang tanggal ini.")
+
+        if st.toggle("TTV bangsal (flag aktif)", value=False, key="arsip_ttv_on"):
+            t0 = time.perf_counter()
+            flags = vitals_flags(get_vitals().view())
+            rm_of = {pid: rm for rm, pid in get_vitals().pids.items()}
+            st.caption(f"{len(get_vitals().pids)} pasien · {get_vitals().n} entri TTV · {(time.perf_counter() - t0) * 1000:.1f} ms")
+            if flags:
+                st.dataframe([{"RM": rm_of[pid], "Flag": ", ".join(f)} for pid, f in sorted(flags.items())], hide_index=True, use_container_width=True)
+            else:
+                st.info("Tidak ada pasien dengan TTV abnormal di entri terakhirnya.")
+
+finish_rerun_meter(_meter, _meter_slot, rerun_tab(_changed))
+note_first_interactive(_boot, _boot_slot)
@@ -0,0 +1,739 @@
+"""Pure SuperSOAP logic: parsers, EO/IO phrase builders and report builders.
+
+No Streamlit here -- supersoap_app.py imports it for the UI, and the browser build
+(web/, see build_web.py) runs the same module on Pyodide.
+"""
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field, replace
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+# =========================
+# Config
+# =========================
+DAY_ID = {
+    "Monday": "Senin",
+    "Tuesday": "Selasa",
+    "Wednesday": "Rabu",
+    "Thursday": "Kamis",
+    "Friday": "Jumat",
+    "Saturday": "Sabtu",
+    "Sunday": "Minggu",
+}
+
+CASES = [
+    "Impaksi",
+    "Abses",
+    "Selulitis",
+    "Tumor",
+    "Odontogenic cyst",
+    "Fistula orocutaneous",
+    "TMD",
+    "Fraktur",
+]
+
+TEETH = ["18","17","16","15","14","13","12","11","21","22","23","24","25","26","27","28",
+         "38","37","36","35","34","33","32","31","41","42","43","44","45","46","47","48"]
+
+# =========================
+# Utils
+# =========================
+def day_name_id(d: date) -> str:
+    return DAY_ID.get(d.strftime("%A"), d.strftime("%A"))
+
+def fmt_ddmmyyyy(d: date) -> str:
+    return d.strftime("%d/%m/%Y")
+
+def clean(s: str) -> str:
+    return (s or "").strip()
+
+def normalize_bullets(s: str) -> str:
+    if not s:
+        return ""
+    s = s.replace("•⁠", "•").replace("• ⁠", "• ").replace("•⁠  ⁠", "• ")
+    s = "\n".join(line.rstrip(" \t") for line in s.split("\n"))
+    return s.strip()
+
+def parse_hhmm(s: str) -> Optional[Tuple[int,int]]:
+    s = clean(s).replace(".", ":")
+    m = re.match(r"^(\d{1,2}):(\d{1,2})$", s)
+    if not m:
+        return None
+    h, mi = int(m.group(1)), int(m.group(2))
+    if 0 <= h <= 23 and 0 <= mi <= 59:
+        return (h, mi)
+    return None
+
+def fmt_time(h: int, mi: int) -> str:
+    return f"{h:02d}.{mi:02d}"
+
+def minus_minutes(h: int, mi: int, minutes: int) -> Tuple[int,int]:
+    total = (h * 60 + mi - minutes) % (24*60)
+    return (total//60, total%60)
+
+def maintenance_ml_per_hr_421(weight_kg: float) -> float:
+    w = max(0.0, float(weight_kg))
+    if w <= 10:
+        return 4.0 * w
+    if w <= 20:
+        return 40.0 + 2.0 * (w - 10.0)
+    return 60.0 + 1.0 * (w - 20.0)
+
+def tpm_from_ml_per_hr(ml_per_hr: float, drip_factor_gtt_per_ml: int = 20) -> int:
+    return int(round((float(ml_per_hr) * int(drip_factor_gtt_per_ml)) / 60.0))
+
+def join_bullets(lines: List[str], bullet: str="•⁠  ⁠") -> str:
+    lines = [clean(x) for x in lines if clean(x)]
+    return "\n".join([f"{bullet}{x}" for x in lines])
+
+def split_people_list(s: str) -> str:
+    if not s:
+        return ""
+    s = s.replace("\n", ",")
+    parts = [p.strip() for p in s.split(",") if p.strip()]
+    return ", ".join(parts)
+
+# =========================
+# Odontogram: one bitmask per temuan, bit i = TEETH[i]
+# =========================
+TOOTH_BIT = {t: 1 << i for i, t in enumerate(TEETH)}
+_UPPER_ARCH = 16  # TEETH[:16] = rahang atas (18..28), TEETH[16:] = rahang bawah (38..48)
+
+def teeth_mask(teeth) -> int:
+    m = 0
+    for t in teeth or []:
+        m |= TOOTH_BIT.get(clean(t), 0)
+    return m
+
+def mask_teeth(mask: int) -> List[str]:
+    return [t for i, t in enumerate(TEETH) if mask >> i & 1]
+
+def compact_teeth(teeth) -> str:
+    """Render in FDI order with neighbouring teeth along the arch collapsed:
+    ["37","36","35","45","46","47"] -> "35-37, 45-47", ["12","11","21","22"] -> "12-22"."""
+    mask = teeth if isinstance(teeth, int) else teeth_mask(teeth)
+    parts=[]
+    i = 0
+    while i < len(TEETH):
+        if not mask >> i & 1:
+            i += 1
+            continue
+        j = i
+        while j + 1 < len(TEETH) and mask >> (j + 1) & 1 and (i < _UPPER_ARCH) == (j + 1 < _UPPER_ARCH):
+            j += 1
+        run = TEETH[i:j + 1]
+        if len(run) < 3:
+            parts += [(int(t), t) for t in run]
+        elif run[0][0] == run[-1][0]:
+            parts.append((int(min(run)), f"{min(run)}-{max(run)}"))
+        else:
+            # crosses the midline, keep arch order (12-22, 33-43)
+            parts.append((int(min(run)), f"{run[0]}-{run[-1]}"))
+        i = j + 1
+    return ", ".join(txt for _, txt in sorted(parts))
+
+@dataclass
+class Odontogram:
+    masks: Dict[str, int] = field(default_factory=dict)
+
+    def mask(self, temuan: str) -> int:
+        return self.masks.get(temuan, 0)
+
+    def teeth(self, temuan: str) -> List[str]:
+        return mask_teeth(self.mask(temuan))
+
+    def set(self, temuan: str, teeth) -> None:
+        self.masks[temuan] = teeth if isinstance(teeth, int) else teeth_mask(teeth)
+
+    def any_mask(self) -> int:
+        m = 0
+        for v in self.masks.values():
+            m |= v
+        return m
+
+    def render(self, temuan: str) -> str:
+        return compact_teeth(self.mask(temuan))
+
+# =========================
+# Parsing (Pre-Op only): SOAP mentah + MINLAP
+# =========================
+@dataclass
+class ParsedSoap:
+    sapaan: str = "Assalamualaikum dokter."
+    pembuka: str = "Maaf mengganggu, izin melaporkan"
+    rs: str = "RSGMP UNHAS"
+    nama: str = ""
+    jk: str = ""
+    umur: str = ""
+    jenis_perawatan: str = ""
+    pembiayaan: str = ""
+    kamar: str = ""
+    rm: str = ""
+
+    S: str = ""
+    O_generalis: str = ""
+    EO: str = ""
+    IO: str = ""
+    A: str = ""
+    tindakan_hint: str = ""
+
+    residen: str = ""
+    dpjp: str = ""
+
+# Pasted text is capped and every parser pattern is linear in its input (no "\n\s*" or
+# "^\s*" that rescans runs of blank lines, no lazy ".*?" that can rescan a line).
+# pick1/pick_block also check a per-parse deadline, so a parse that still overruns is
+# abandoned between steps instead of holding the rerun.
+PARSE_MAX_CHARS = int(os.environ.get("SUPERSOAP_PARSE_MAX_CHARS", "20000"))
+PARSE_BUDGET_SECONDS = float(os.environ.get("SUPERSOAP_PARSE_BUDGET_MS", "250")) / 1000
+_parse_deadline = threading.local()
+
+class ParseTimeout(Exception):
+    pass
+
+@contextmanager
+def parse_budget(seconds: float = PARSE_BUDGET_SECONDS):
+    _parse_deadline.at = time.perf_counter() + seconds
+    try:
+        yield
+    finally:
+        _parse_deadline.at = None
+
+def _parse_check() -> None:
+    at = getattr(_parse_deadline, "at", None)
+    if at is not None and time.perf_counter() > at:
+        raise ParseTimeout()
+
+def bound_paste(text: str, anchor: str = "", limit: int = PARSE_MAX_CHARS) -> Tuple[str, bool]:
+    """Cut an oversized paste (e.g. a whole chat history) down to `limit` chars.
+    With an anchor, keep the text from its last occurrence (the newest report);
+    otherwise keep the tail. Returns (text, truncated)."""
+    if len(text) <= limit:
+        return text, False
+    i = text.lower().rfind(anchor) if anchor else -1
+    if i < 0:
+        return text[-limit:], True
+    return text[i:i + limit], True
+
+def strip_parens(s: str) -> str:
+    r"""Drop "(...)" spans: each "(" up to the first ")" after it, like re.sub(r"\(.*?\)", "", s) but linear."""
+    out, i = [], 0
+    while True:
+        j = s.find("(", i)
+        k = s.find(")", j + 1) if j >= 0 else -1
+        if k < 0:
+            out.append(s[i:])
+            return "".join(out)
+        out.append(s[i:j])
+        i = k + 1
+
+def pick1(text: str, pattern: str, flags=0) -> str:
+    _parse_check()
+    m = re.search(pattern, text or "", flags)
+    return clean(m.group(1)) if m else ""
+
+def pick_block(text: str, start_pat: str, end_pat: str) -> str:
+    _parse_check()
+    flags = re.IGNORECASE | re.DOTALL
+    m1 = re.search(start_pat, text or "", flags)
+    if not m1:
+        return ""
+    start = m1.end()
+    m2 = re.search(end_pat, (text or "")[start:], flags)
+    end = start + (m2.start() if m2 else len((text or "")[start:]))
+    return clean((text or "")[start:end])
+
+def parse_raw_soap_preop_only(raw: str) -> ParsedSoap:
+    raw = raw.strip()
+    p = ParsedSoap()
+
+    first_line = raw.splitlines()[0].strip() if raw.splitlines() else ""
+    if first_line.lower().startswith("assalamualaikum"):
+        p.sapaan = first_line
+
+    p.rs = "RSGMP UNHAS" if re.search(r"RSGMP\s*UNHAS", raw, re.IGNORECASE) else (pick1(raw, r"(RSGMP[^\n/]+)", re.IGNORECASE) or "RSGMP UNHAS")
+
+    ident = pick1(raw, r"^[ \t]*(Tn\.|Ny\.|Nn\.|An\.)[^\n]+$", re.IGNORECASE | re.MULTILINE)
+    if ident:
+        parts = [x.strip() for x in ident.split("/") if x.strip()]
+        if parts: p.nama = parts[0]
+        if len(parts) > 1: p.jk = parts[1]
+        if len(parts) > 2: p.umur = parts[2]
+        for tok in parts:
+            if re.search(r"\bBPJS\b|\bUMUM\b|\bBAKSOS\b|\bJasa\b", tok, re.IGNORECASE):
+                p.pembiayaan = tok
+            if re.search(r"rawat", tok, re.IGNORECASE):
+                p.jenis_perawatan = tok
+            if tok.lower().startswith("kamar"):
+                p.kamar = tok
+        p.rm = pick1(raw, r"\bRM\.?\s*([0-9.]+)", re.IGNORECASE)
+
+    p.S = pick_block(raw, r"\bS\s*:\s*", r"\n[ \t]*O\s*:\s*")
+    o_block = pick_block(raw, r"\bO\s*:\s*", r"\n[ \t]*A\s*:\s*")
+    p.A = pick_block(raw, r"\bA\s*:\s*", r"\n[ \t]*P\s*:\s*")
+
+    p.O_generalis = normalize_bullets(pick_block(o_block, r"Status\s+Generalis\s*:\s*", r"Status\s+Lokalis\s*:")) \
+        or normalize_bullets(pick_block(o_block, r"Status\s+Generalis\s*:\s*", r"\n[ \t]*(Status\s+Lokalis|EO|E\.?O)\s*:"))
+    p.EO = normalize_bullets(pick_block(o_block, r"\bEO\s*:\s*", r"\n[ \t]*IO\s*:\s*")) or \
+           normalize_bullets(pick_block(o_block, r"\bE\.?O\s*:\s*", r"\n[ \t]*I\.?O\s*:\s*"))
+    p.IO = normalize_bullets(pick_block(o_block, r"\bIO\s*:\s*", r"\n[ \t]*(Pemeriksaan|A\s*:|$)")) or \
+           normalize_bullets(pick_block(o_block, r"\bI\.?O\s*:\s*", r"\n[ \t]*(Pemeriksaan|A\s*:|$)"))
+
+    p_block = pick_block(raw, r"\bP\s*:\s*", r"\n[ \t]*(Izin|Mohon|Residen|DPJP)\s*:|\Z")
+    pro_lines = re.findall(r"Pro\s+([^\n]+)", p_block, re.IGNORECASE)
+    if pro_lines:
+        cand = pro_lines[-1]
+        cand = strip_parens(cand)
+        cand = re.sub(r"dalam\s+.*", "", cand, flags=re.IGNORECASE).strip()
+        p.tindakan_hint = clean(cand)
+
+    p.residen = split_people_list(pick1(raw, r"Residen(?:\s*:)?\s*(.+)", re.IGNORECASE))
+    p.dpjp = clean(pick1(raw, r"DPJP(?:\s*:)?\s*(.+)", re.IGNORECASE))
+    return p
+
+def parse_minlap_penunjang_block(minlap: str) -> str:
+    minlap = minlap or ""
+    blk = pick_block(minlap, r"Pemeriksaan\s+penunjang\s*:\s*", r"\n[ \t]*A\s*:|\n[ \t]*P\s*:|\Z")
+    return blk.strip()
+
+def parse_minlap_jam(minlap: str) -> str:
+    jam = pick1(minlap or "", r"Pukul\s*:\s*\*?([0-9]{1,2}\.[0-9]{2})", re.IGNORECASE)
+    return jam
+
+# =========================
+# History sentence (S)
+# =========================
+def build_history_sentence(h: dict) -> str:
+    parts=[]
+    if h["alergi_any"].startswith("Tidak"):
+        parts.append("Tidak ada riwayat alergi obat dan makanan.")
+    else:
+        parts.append("Ada riwayat alergi" + (": " + ", ".join(h["alergi_items"]) + "." if h["alergi_items"] else "."))
+    if h["sistemik_any"] == "Disangkal":
+        parts.append("Riwayat penyakit sistemik disangkal.")
+    else:
+        parts.append("Riwayat penyakit sistemik: " + (", ".join(h["sistemik_items"]) if h["sistemik_items"] else "ada") + ".")
+        if h["obat_items"]:
+            parts.append("Obat rutin: " + ", ".join(h["obat_items"]) + ".")
+    # current condition
+    if not any([h["batuk"], h["flu"], h["demam"], h["diare"]]):
+        parts.append("Saat ini pasien tidak dalam kondisi batuk, demam, flu, dan diare.")
+    else:
+        pos=[]
+        if h["batuk"]: pos.append("batuk")
+        if h["flu"]: pos.append("flu")
+        if h["demam"]: pos.append("demam")
+        if h["diare"]: pos.append("diare")
+        parts.append("Saat ini pasien dalam kondisi: " + ", ".join(pos) + ".")
+    return " ".join(parts)
+
+# =========================
+# Shorthand quick-entry: one text line <-> checklist state
+# e.g. "38,48 PE hip- pal+ perk- kalk+ OH sdg"
+# =========================
+SH_SIGN = {"+": "(+)", "-": "(-)"}
+SH_OH = {"baik": "OH Baik", "sdg": "OH sedang", "sedang": "OH sedang", "buruk": "OH buruk"}
+SH_OH_OUT = {"OH Baik": "baik", "OH sedang": "sdg", "OH buruk": "buruk"}
+
+def parse_teeth(s: str) -> Tuple[List[str], List[str]]:
+    """'38,48' / '35-37' / '12-22' (ranges follow the arch) -> (teeth in TEETH order, bad parts)."""
+    m, bad = 0, []
+    for part in s.split(","):
+        a, dash, b = part.strip().partition("-")
+        if a in TOOTH_BIT and not dash:
+            m |= TOOTH_BIT[a]
+        elif a in TOOTH_BIT and b in TOOTH_BIT and (TEETH.index(a) < _UPPER_ARCH) == (TEETH.index(b) < _UPPER_ARCH):
+            i, j = sorted((TEETH.index(a), TEETH.index(b)))
+            m |= teeth_mask(TEETH[i:j + 1])
+        elif part.strip():
+            bad.append(part.strip())
+    return mask_teeth(m), bad
+
+def _sh_tokens(line: str) -> List[str]:
+    # "OH sdg" is the one two-word token; fold it to "oh:sdg"
+    toks, out = clean(line).split(), []
+    i = 0
+    while i < len(toks):
+        if toks[i].lower() == "oh" and i + 1 < len(toks):
+            out.append("oh:" + toks[i + 1])
+            i += 2
+            continue
+        out.append(toks[i])
+        i += 1
+    return out
+
+def _sh_sign(tok: str, name: str) -> Optional[str]:
+    if len(tok) == len(name) + 1 and tok.lower().startswith(name) and tok[-1] in SH_SIGN:
+        return SH_SIGN[tok[-1]]
+    return None
+
+def _sh_common(tok: str, state: dict) -> bool:
+    tl = tok.lower()
+    if tl in ("sim", "asim"):
+        state["wajah"] = "Wajah simetris" if tl == "sim" else "Wajah asimetris"
+    elif _sh_sign(tok, "kalk"):
+        state["kalkulus"] = f"Kalkulus {_sh_sign(tok, 'kalk')}"
+    elif tl.startswith("oh:") and tl[3:] in SH_OH:
+        state["oh"] = SH_OH[tl[3:]]
+    else:
+        return False
+    return True
+
+def sh_text_out(text: str) -> str:
+    """Free text inside one token: spaces become "_", so literal "_" and "%" are %-escaped."""
+    return clean(text).replace("%", "%25").replace("_", "%5F").replace(" ", "_")
+
+def sh_text_in(tok: str) -> str:
+    return tok.replace("_", " ").replace("%5F", "_").replace("%5f", "_").replace("%25", "%")
+
+def _sh_common_out(state: dict) -> List[str]:
+    return ["kalk" + ("+" if state["kalkulus"].endswith("(+)") else "-"), f"OH {SH_OH_OUT[state['oh']]}"]
+
+# ---- Impaksi
+IMPAKSI_ERUPSI = {"UE": "Unerupted", "PE": "Partial erupted", "FE": "Fully erupted"}
+IMPAKSI_ERUPSI_OUT = {v: k for k, v in IMPAKSI_ERUPSI.items()}
+IMPAKSI_TANDA = {"hip": "hiperemis", "pal": "palpasi", "perk": "perkusi"}  # "pal+=distal_38" carries the detail
+
+def impaksi_default() -> dict:
+    return {
+        "wajah": "Wajah simetris", "bukaan": "bukaan mulut normal",
+        "gigi": ["18","28","38","48"], "erupsi": "Unerupted",
+        "hiperemis": False, "palpasi": False, "perkusi": False, "detail": {},
+        "kalkulus": "Kalkulus (+)", "oh": "OH Baik",
+    }
+
+def impaksi_lines(state: dict) -> Tuple[List[str], List[str]]:
+    eo_lines=[f"{state['wajah']} dengan {state['bukaan']}"]
+    io_lines=[]
+    if state["gigi"]:
+        tags=[f"{t} (+)" if state[t] else f"{t} (-)" for t in IMPAKSI_TANDA.values()]
+        io_lines.append(f"{state['erupsi']} gigi {compact_teeth(state['gigi'])} dengan {', '.join(tags)}")
+    for t, label in (("hiperemis", "Hiperemis"), ("palpasi", "Nyeri palpasi"), ("perkusi", "Nyeri perkusi")):
+        if state[t] and state["detail"].get(t):
+            io_lines.append(f"{label}: {state['detail'][t]}")
+    io_lines += [state["kalkulus"], state["oh"]]
+    return eo_lines, io_lines
+
+def impaksi_to_shorthand(state: dict) -> str:
+    out=[]
+    if state["gigi"]:
+        out.append(compact_teeth(state["gigi"]).replace(" ", ""))
+    out.append(IMPAKSI_ERUPSI_OUT[state["erupsi"]])
+    for k, t in IMPAKSI_TANDA.items():
+        detail = state["detail"].get(t, "") if state[t] else ""
+        out.append(k + ("+" if state[t] else "-") + ("=" + sh_text_out(detail) if clean(detail) else ""))
+    out.append("asim" if state["wajah"] == "Wajah asimetris" else "sim")
+    out.append("bm-" if state["bukaan"].endswith("terbatas") else "bm+")
+    return " ".join(out + _sh_common_out(state))
+
+def impaksi_from_shorthand(line: str) -> Tuple[dict, List[str]]:
+    state = impaksi_default()
+    state["gigi"] = []
+    errors=[]
+    for tok in _sh_tokens(line):
+        if tok[0].isdigit():
+            teeth, bad = parse_teeth(tok)
+            state["gigi"] = mask_teeth(teeth_mask(state["gigi"] + teeth))
+            errors += bad
+        elif tok.upper() in IMPAKSI_ERUPSI:
+            state["erupsi"] = IMPAKSI_ERUPSI[tok.upper()]
+        elif _sh_sign(tok, "bm"):
+            state["bukaan"] = "bukaan mulut normal" if tok[-1] == "+" else "bukaan mulut terbatas"
+        elif any(_sh_sign(tok.partition("=")[0], k) for k in IMPAKSI_TANDA):
+            head, eq, detail = tok.partition("=")
+            tanda = IMPAKSI_TANDA[head[:-1].lower()]
+            state[tanda] = head[-1] == "+"
+            if eq and state[tanda]:
+                state["detail"][tanda] = sh_text_in(detail)
+            elif eq:
+                errors.append(tok)
+        elif not _sh_common(tok, state):
+            errors.append(tok)
+    return state, errors
+
+# ---- Fraktur
+FRAKTUR_TEMUAN = ["Intrusi", "Avulsi", "Mobile", "Ellis II", "Ellis V", "Sisa akar"]
+FRAKTUR_TEMUAN_LINE = {
+    "Intrusi": "Intrusi gigi {teeth}",
+    "Avulsi": "Avulsi gigi {teeth}",
+    "Mobile": "Mobile {deg} gigi {teeth}",
+    "Ellis II": "Fraktur Ellis Klas II gigi {teeth}",
+    "Ellis V": "Fraktur Ellis Klas V gigi {teeth}",
+    "Sisa akar": "Sisa akar ar gigi {teeth}",
+}
+FRAKTUR_SH_TEMUAN = {"intr": "Intrusi", "avul": "Avulsi", "mob": "Mobile", "e2": "Ellis II", "e5": "Ellis V", "sa": "Sisa akar"}
+FRAKTUR_SH_TANDA = {"malok": "maloklusi", "float": "floating", "step": "step", "vlhip": "vulnus_hiperemis", "clot": "blood_clot", "bleed": "bleeding"}
+
+def fraktur_default() -> dict:
+    return {
+        "wajah": "Wajah asimetris", "deviasi_nasal": "(+)", "arah_nasal": "dextra", "bukaan": "normal",
+        "maloklusi": "(-)", "floating": "(-)", "step": "(-)", "trismus": "(-)", "bukaan_mm": "",
+        "vulnus": True, "vulnus_area": "", "vulnus_hiperemis": "(+)", "blood_clot": "(-)", "bleeding": "(-)",
+        "odontogram": Odontogram(), "mobile_derajat": "°2",
+        "kalkulus": "Kalkulus (-)", "oh": "OH Baik",
+    }
+
+def _bukaan_mm(state: dict) -> str:
+    """The number out of the free-text field: "15 mm" / "± 15" -> "15"."""
+    m = re.search(r"\d+", state["bukaan_mm"] or "")
+    return m.group(0) if m else ""
+
+def fraktur_lines(state: dict) -> Tuple[List[str], List[str]]:
+    eo_lines=[f"{state['wajah']}" + (f" dengan deviasi nasal ke arah {state['arah_nasal']}" if state["deviasi_nasal"]=="(+)" else "") + f" dan bukaan mulut {state['bukaan']}"]
+    eo_lines += [f"Maloklusi {state['maloklusi']}", f"Floating jaw {state['floating']}", f"Step deformity {state['step']}"]
+    if state["trismus"]=="(+)" and _bukaan_mm(state):
+        eo_lines.append(f"Bukaan mulut ± {_bukaan_mm(state)} mm")
+    io_lines=[]
+    if state["vulnus"]:
+        line = "Vulnus laceratum"
+        if state["vulnus_area"]: line += f" {state['vulnus_area']}"
+        line += f" dengan hiperemis {state['vulnus_hiperemis']}, blood clot {state['blood_clot']}, active bleeding {state['bleeding']}"
+        io_lines.append(line)
+    og = state["odontogram"]
+    for temuan in FRAKTUR_TEMUAN:
+        if og.mask(temuan):
+            io_lines.append(FRAKTUR_TEMUAN_LINE[temuan].format(teeth=og.render(temuan), deg=state["mobile_derajat"]))
+    io_lines += [state["kalkulus"], state["oh"]]
+    return eo_lines, io_lines
+
+def fraktur_to_shorthand(state: dict) -> str:
+    out=["asim" if state["wajah"] == "Wajah asimetris" else "sim"]
+    out.append("nasal-" if state["deviasi_nasal"] == "(-)" else ("nasal+dx" if state["arah_nasal"] == "dextra" else "nasal+sin"))
+    out.append("bm+" if state["bukaan"] == "normal" else "bm-")
+    out += [k + state[f][1] for k, f in FRAKTUR_SH_TANDA.items() if not k.startswith(("vl", "clot", "bleed"))]
+    out.append("trismus" + state["trismus"][1] + (_bukaan_mm(state) if state["trismus"] == "(+)" else ""))
+    if state["vulnus"]:
+        out.append("vl@" + sh_text_out(state["vulnus_area"]) if state["vulnus_area"] else "vl+")
+        out += [k + state[f][1] for k, f in FRAKTUR_SH_TANDA.items() if k.startswith(("vl", "clot", "bleed"))]
+    else:
+        out.append("vl-")
+    og = state["odontogram"]
+    for k, temuan in FRAKTUR_SH_TEMUAN.items():
+        if og.mask(temuan):
+            deg = state["mobile_derajat"][-1] if temuan == "Mobile" else ""
+            out.append(f"{k}{deg}:" + og.render(temuan).replace(" ", ""))
+    return " ".join(out + _sh_common_out(state))
+
+def fraktur_from_shorthand(line: str) -> Tuple[dict, List[str]]:
+    state = fraktur_default()
+    errors=[]
+    for tok in _sh_tokens(line):
+        tl = tok.lower()
+        head, colon, teeth_s = tl.partition(":")
+        if colon and head[:3] == "mob" and head[3:] in ("", "1", "2", "3"):
+            head, deg = "mob", head[3:]
+            if deg:
+                state["mobile_derajat"] = "°" + deg
+        if colon and head in FRAKTUR_SH_TEMUAN:
+            temuan = FRAKTUR_SH_TEMUAN[head]
+            teeth, bad = parse_teeth(teeth_s)
+            state["odontogram"].set(temuan, state["odontogram"].mask(temuan) | teeth_mask(teeth))
+            errors += bad
+        elif tl.startswith("nasal") and tl[5:] in ("-", "+", "+dx", "+sin"):
+            state["deviasi_nasal"] = SH_SIGN[tl[5]]
+            state["arah_nasal"] = "sinistra" if tl.endswith("sin") else "dextra"
+        elif _sh_sign(tok, "bm"):
+            state["bukaan"] = "normal" if tok[-1] == "+" else "terbatas"
+        elif tl.startswith("trismus") and tl[7:8] in SH_SIGN and (tl[8:].isdigit() or not tl[8:]):
+            state["trismus"] = SH_SIGN[tl[7]]
+            state["bukaan_mm"] = tl[8:]
+        elif tl in ("vl+", "vl-") or tl.startswith("vl@"):
+            state["vulnus"] = tl != "vl-"
+            state["vulnus_area"] = sh_text_in(tok[3:]) if tl.startswith("vl@") else ""
+        elif any(_sh_sign(tok, k) for k in FRAKTUR_SH_TANDA):
+            state[FRAKTUR_SH_TANDA[tl[:-1]]] = SH_SIGN[tok[-1]]
+        elif not _sh_common(tok, state):
+            errors.append(tok)
+    return state, errors
+
+# =========================
+# Pre-Op plan (fixed lines + the ones computed from jam operasi / BB)
+# =========================
+def preop_default_times(jam_op: str) -> Tuple[str, str]:
+    """(mulai puasa, jam antibiotik) = 6 h and 1 h before the operation, "" if jam_op doesn't parse."""
+    op = parse_hhmm(jam_op)
+    if not op:
+        return "", ""
+    return fmt_time(*minus_minutes(op[0], op[1], 6*60)), fmt_time(*minus_minutes(op[0], op[1], 60))
+
+def preop_plan_lines(zona: str, ivfd: Optional[Tuple[str, int, int]] = None, puasa_mulai: Optional[str] = None,
+                     ab: Optional[Tuple[str, str, str, bool]] = None, extra: str = "") -> List[str]:
+    """ivfd = (cairan, tpm, drip factor), ab = (nama, dosis, jam, skin test); None leaves the line out."""
+    plan_lines = ["ACC TS Anestesi"]
+    if ivfd:
+        cairan, tpm, drip_factor = ivfd
+        drip_label = "makrodrips" if drip_factor==20 else "mikrodrips"
+        plan_lines.append(f"IVFD {cairan} {tpm} tpm ({drip_label})" if tpm>0 else f"IVFD {cairan} (isi tpm) ({drip_label})")
+    if clean(puasa_mulai):
+        plan_lines.append(f"Puasa 6 jam pre op atau sesuai instruksi dari TS. Anestesi yaitu mulai Pukul {puasa_mulai} {zona}")
+    plan_lines += [
+        "Pasien menyikat gigi sebelum tidur dan sebelum ke kamar operasi",
+        "Gunakan masker bedah saat ke kamar operasi",
+    ]
+    if ab:
+        ab_nama, ab_dosis, ab_jam, skin = ab
+        skin_phrase = " (skin test terlebih dahulu)" if skin else ""
+        plan_lines.append(f"Pasien rencana diberikan antibiotik profilaksis {ab_nama} {ab_dosis}, 1 jam sebelum operasi{skin_phrase} pada Pukul {ab_jam} {zona}")
+    plan_lines += [clean(x) for x in (extra or "").splitlines() if clean(x)]
+    return plan_lines
+
+# =========================
+# Stage builders
+# =========================
+# A report is a list of (section, text); joining the texts gives the message. The section
+# split is what the "perubahan" diff compares, so builders keep it instead of one string.
+Sections = List[Tuple[str, str]]
+
+def join_sections(sections: Sections) -> str:
+    return "".join(text for _, text in sections)
+
+def build_awal(*args) -> str:
+    return join_sections(build_awal_sections(*args))
+
+def build_awal_sections(case_name: str, ident: dict, ttv: dict, eo_lines: List[str], io_lines: List[str], keluhan: str, h: dict, A_lines: List[str], plan_lines: List[str], residen: str, dpjp: str, rs: str, tgl: date) -> Sections:
+    hari = day_name_id(tgl)
+    header = f"Assalamualaikum dokter.\nMaaf mengganggu, izin melaporkan Pasien Rawat Jalan {rs}, {hari} ({fmt_ddmmyyyy(tgl)})\n\n"
+    ident_line = f"{ident['nama']} / {ident['jk']} / {ident['umur']} / Rawat Jalan / {ident['pembiayaan']} / {rs} / RM {ident['rm']}\n\n"
+    og = [
+        f"KU : {ttv['ku']}",
+        f"TD : {ttv['td']}",
+        f"N   : {ttv['nadi']} x/menit",
+        f"P   : {ttv['rr']} x/menit",
+        f"S   : {ttv['temp']} °C",
+        f"SpO2: {ttv['spo2']}% (free air)",
+        f"BB : {ttv['bb']} kg",
+        f"TB : {ttv['tb']} cm",
+    ]
+    S = f"Pasien {ident['jk_long']} datang dengan keluhan {keluhan}. " + build_history_sentence(h)
+    return [
+        ("Header", header), ("Identitas", ident_line),
+        ("S", f"S: {S}\n\n"),
+        ("O", "O:\nStatus Generalis:\n" + "\n".join(og) + "\n\n"
+              "Status Lokalis:\nE.O:\n" + join_bullets(eo_lines) + "\n\n"
+              "I.O:\n" + join_bullets(io_lines) + "\n\n"),
+        ("A", "A:\n" + join_bullets(A_lines, bullet="•⁠  ⁠") + "\n\n"),
+        ("P", "P:\n" + join_bullets(plan_lines, bullet="•⁠  ⁠") + "\n\n"),
+        ("Penutup", "Mohon instruksi selanjutnya dok.\nTerima kasih.\n\n"
+                    f"Residen: {residen}\n\nDPJP : {dpjp}\n"),
+    ]
+
+def build_preop(*args) -> str:
+    return join_sections(build_preop_sections(*args))
+
+def build_preop_sections(parsed: ParsedSoap, overrides: dict, penunjang_block_raw: str, plan_lines: List[str], tindakan: str, anestesi: str, jam_op: str, zona: str, tgl_lap: date, tgl_op: date, residen: str, dpjp: str, meds: List[str]) -> Sections:
+    hari_lap = day_name_id(tgl_lap)
+    hari_op = day_name_id(tgl_op)
+    header = f"{parsed.sapaan}\n{parsed.pembuka} Pasien Rencana Operasi {overrides['rs']}, {hari_lap} ({fmt_ddmmyyyy(tgl_lap)})\n\n"
+    ident = f"{overrides['nama']} / {overrides['jk']} / {overrides['umur']} / {overrides['pembiayaan']} / Rawat Inap / {overrides['kamar']} / {overrides['rs']} / RM {overrides['rm']}\n\n"
+    pen = ("Pemeriksaan penunjang :\n" + penunjang_block_raw.strip() + "\n\n") if clean(penunjang_block_raw) else ""
+    tindakan_final = f"•⁠  ⁠Pro {tindakan} dalam {anestesi} pada hari {hari_op}, {fmt_ddmmyyyy(tgl_op)} Pukul {jam_op} {zona} di {overrides['rs']}"
+    meds = [x for x in meds if clean(x)]
+    meds_block = ("\nMedikasi:\n" + join_bullets(meds, bullet="•⁠  ⁠") + "\n") if meds else ""
+    return [
+        ("Header", header), ("Identitas", ident),
+        ("S", f"S: {overrides['S']}\n\n"),
+        ("O", "O:\nStatus Generalis:\n" + (overrides['O_generalis'] + "\n\n" if clean(overrides['O_generalis']) else "\n") +
+              "Status Lokalis:\nEO:\n" + (overrides['EO'] + "\n\n" if clean(overrides['EO']) else "\n") +
+              "IO:\n" + (overrides['IO'] + "\n\n" if clean(overrides['IO']) else "\n")),
+        ("Penunjang", pen),
+        ("A", "A:\n" + (overrides['A'] + "\n\n" if clean(overrides['A']) else "\n")),
+        ("P", "P:\n" + join_bullets(plan_lines, bullet="•⁠  ⁠") + "\n" + tindakan_final + "\n\n"),
+        ("Medikasi", meds_block),
+        ("Penutup", "Mohon instruksi selanjutnya dokter.\nTerima kasih.\n\n"
+                    f"Residen: {residen}\n\nDPJP : {dpjp}\n"),
+    ]
+
+# =========================
+# POD: one frozen PodDay per report; POD n carries the previous day forward
+# =========================
+POD_NYERI_SKALA = ["1-3 (ringan)","4-6 (sedang)","7-10 (berat)"]
+POD_LUKA = ["Kering", "Serosanguinous sedikit", "Pus/bernanah", "Bengkak/hiperemis"]
+@dataclass(frozen=True)
+class PodDay:
+    pod: int = 0
+    rs: str = "RSGMP UNHAS"
+    tanggal: Optional[date] = None
+    nama: str = ""
+    jk: str = "L"
+    umur: str = ""
+    pembiayaan: str = "BPJS"
+    kamar: str = ""
+    rm: str = ""
+    nyeri: str = "Tidak"
+    nyeri_lokasi: str = ""
+    nyeri_skala: str = ""
+    mual: str = "Tidak"
+    perdarahan: str = "Tidak"
+    luka: str = "Kering"
+    bau: str = "Tidak"
+    td: str = "120/70 mmHg"
+    nadi: int = 80
+    rr: int = 19
+    temp: float = 36.7
+    spo2: int = 99
+    plan: str = ""
+    meds: str = ""
+    residen: str = ""
+    dpjp: str = ""
+
+# Each report section is cached on just the fields it reads, so across a series only
+# the sections whose inputs changed from the day before are rendered again.
+@lru_cache(maxsize=256)
+def _pod_header(rs: str, tanggal: date) -> str:
+    return f"Assalamualaikum dok,\nMaaf mengganggu, izin melaporkan Pasien Rawat Inap {rs}, {day_name_id(tanggal)} ({fmt_ddmmyyyy(tanggal)})\n\n"
+
+@lru_cache(maxsize=256)
+def _pod_ident(nama: str, jk: str, umur: str, pembiayaan: str, kamar: str, rs: str, rm: str) -> str:
+    return f"{nama} / {jk} / {umur} / {pembiayaan} / Rawat Inap / {kamar} / {rs} / RM {rm}\n\n"
+
+@lru_cache(maxsize=256)
+def _pod_s(nyeri: str, nyeri_lokasi: str, nyeri_skala: str, mual: str, perdarahan: str) -> str:
+    s_parts = ["Tidak ada keluhan nyeri pada daerah operasi." if nyeri=="Tidak" else f"Ada keluhan nyeri pada {nyeri_lokasi or 'daerah operasi'} dengan skala {nyeri_skala}."]
+    if mual=="Ya": s_parts.append("Keluhan mual/muntah (+).")
+    if perdarahan=="Ya": s_parts.append("Perdarahan dari luka operasi (+).")
+    return " ".join(s_parts)
+
+@lru_cache(maxsize=256)
+def _pod_o(td: str, nadi: int, rr: int, temp: float, spo2: int, luka: str, bau: str) -> str:
+    return (
+        "Status Generalis:\n"
+        f"TD : {td}\nN  : {int(nadi)} x/menit\nP  : {int(rr)} x/menit\nS  : {float(temp):.1f} °C\nSpO2: {int(spo2)}% (free air)\n\n"
+        "Status Lokalis:\n"
+        f"Luka operasi: {luka}\nBau: {bau}\n"
+    )
+
+@lru_cache(maxsize=256)
+def _pod_tail(plan: str, meds: str, residen: str, dpjp: str) -> Tuple[Tuple[str, str], ...]:
+    return (
+        ("A", "A:\n•⁠  ⁠Post operative state\n\n"),
+        ("P", "P:\n" + join_bullets([x for x in plan.splitlines() if clean(x)], bullet="•⁠  ⁠") + "\n\n"),
+        ("Medikasi", "Medikasi:\n" + join_bullets([x for x in meds.splitlines() if clean(x)], bullet="•⁠  ⁠") + "\n\n"),
+        ("Penutup", "Mohon instruksi selanjutnya dokter.\nTerima kasih.\n\n"
+                    f"Residen: {residen}\n\nDPJP : {dpjp}\n"),
+    )
+
+def pod_sections(d: PodDay) -> Sections:
+    return [
+        ("Header", _pod_header(d.rs, d.tanggal)), ("Identitas", _pod_ident(d.nama, d.jk, d.umur, d.pembiayaan, d.kamar, d.rs, d.rm)),
+        ("S", f"S: {_pod_s(d.nyeri, d.nyeri_lokasi, d.nyeri_skala, d.mual, d.perdarahan)}\n\n"),
+        ("O", f"O:\n{_pod_o(d.td, d.nadi, d.rr, d.temp, d.spo2, d.luka, d.bau)}\n"),
+        *_pod_tail(d.plan, d.meds, d.residen, d.dpjp),
+    ]
+
+def render_pod(d: PodDay) -> str:
+    return join_sections(pod_sections(d))
+
+def pod_series(base: PodDay, deltas: List[dict]) -> List[PodDay]:
+    """One PodDay per delta row. Each day starts from the day before (date + 1) and only
+    the fields the resident filled in for that day are replaced."""
+    days, prev = [], base
+    for delta in deltas:
+        changes = {k: v for k, v in delta.items() if v not in (None, "") and k in PodDay.__dataclass_fields__}
+        prev = replace(prev, pod=prev.pod + 1, tanggal=prev.tanggal + timedelta(days=1), **changes)
+        days.append(prev)
+    return days
@@ -0,0 +1,24 @@
+"""Undo/redo steps through the report fields only; search, board and handoff fields stay as typed."""
+import os
+
+from streamlit.testing.v1 import AppTest
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "supersoap_app.py")
+
+def test_undo_leaves_navigation_fields(tmp_path, monkeypatch):
+    monkeypatch.setenv("SUPERSOAP_DATA_DIR", str(tmp_path))
+    at = AppTest.from_file(APP, default_timeout=60)
+    at.run()
+    at.text_input(key="awal_nama").set_value("Tn. A").run()
+    at.text_input(key="awal_nama").set_value("Tn. B").run()
+    at.text_input(key="arsip_q").set_value("abses").run()
+    at.text_input(key="bangsal_saya").set_value("dr A").run()
+    at.selectbox(key="handoff_stage").set_value("Pre-Op").run()
+
+    at.button(key="draft_undo_btn").click().run()
+    assert not at.exception
+    assert at.text_input(key="awal_nama").value == "Tn. A"
+    assert at.text_input(key="arsip_q").value == "abses"
+    assert at.text_input(key="bangsal_saya").value == "dr A"
+    assert at.selectbox(key="handoff_stage").value == "Pre-Op"
+    assert at.session_state["_draft_history"].can_redo()
@@ -0,0 +1,41 @@
+"""Lab values out of the penunjang block: short aliases (K, Na, PT, ...) only where they name a test."""
+import gc
+import os
+import sys
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "supersoap_app.py")
+
+@pytest.fixture(scope="module")
+def parse_lab_values(tmp_path_factory):
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("SUPERSOAP_DATA_DIR", str(tmp_path_factory.mktemp("data")))
+        AppTest.from_file(APP, default_timeout=60).run()
+    # the app module is re-executed per run, so reach the cached function instead of importing it;
+    # earlier runs leave theirs behind, and only the latest one's LabTable is __main__.LabTable
+    latest = sys.modules["__main__"].LabTable
+    return next(o for o in gc.get_objects() if type(o).__name__ == "CachedFunc" and o._info.func.__name__ == "parse_lab_values"
+                and o._info.func.__globals__.get("LabTable") is latest)
+
+def _values(parse, block):
+    return {r["Pemeriksaan"]: r["Nilai"] for r in parse(block).rows()}
+
+@pytest.mark.parametrize("block, expected", [
+    ("Panoramik: impaksi 38 K 2", {}),
+    ("Rontgen thorax: cor dan pulmo dbn, K 2", {}),
+    ("Hb 13\nPT 12 (K: 11)", {"Hb": 13.0, "PT": 12.0}),
+    ("Lab: PT 12 detik (K: 11), APTT 30 (K 32)", {"PT": 12.0, "APTT": 30.0}),
+])
+def test_short_alias_in_plain_text_is_not_a_value(parse_lab_values, block, expected):
+    assert _values(parse_lab_values, block) == expected
+
+@pytest.mark.parametrize("block, expected", [
+    ("Na/K/Cl 140/4,1/102", {"Natrium": 140.0, "Kalium": 4.1, "Klorida": 102.0}),
+    ("Hb 13, Na 140 (N) K 4", {"Hb": 13.0, "Natrium": 140.0, "Kalium": 4.0}),
+    ("Elektrolit: Na 140 K 3.1", {"Natrium": 140.0, "Kalium": 3.1}),
+    ("SGOT 30 SGPT 20\nCr 0,9\n- CT 7 BT 2", {"SGOT": 30.0, "SGPT": 20.0, "Kreatinin": 0.9, "CT": 7.0, "BT": 2.0}),
+])
+def test_short_alias_after_lab_anchor(parse_lab_values, block, expected):
+    assert _values(parse_lab_values, block) == expected
@@ -0,0 +1,79 @@
+"""Worst-case parse time stays bounded on adversarial pastes at and above PARSE_MAX_CHARS.
+
+The parsers run here *without* parse_budget(): the bound has to come from the cap and
+from linear patterns, because the watchdog only checks the clock between regex calls.
+"""
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from supersoap_core import (  # noqa: E402
+    PARSE_MAX_CHARS, ParseTimeout, bound_paste, parse_budget, parse_minlap_jam, parse_minlap_penunjang_block,
+    parse_raw_soap_preop_only, pick1, pick_block, strip_parens,
+)
+
+# generous for a slow CI box; a linear pass over 20k chars takes a few ms
+WALL_BOUND_SECONDS = 0.5
+
+# Runs that make a backtracking pattern rescan: whitespace after a label, repeated labels,
+# unclosed brackets, a label with no terminator, separators with nothing between them.
+FILLERS = {
+    "letters": "a",
+    "spaces": " ",
+    "newlines": "\n",
+    "blank_lines": " \t\n",
+    "labels_S": "S:",
+    "labels_O": "O: ",
+    "labels_A": "\nA :",
+    "labels_EO": "EO:\n",
+    "generalis": "Status Generalis:",
+    "penunjang": "Pemeriksaan penunjang: ",
+    "pukul": "Pukul : *",
+    "pro": "Pro ",
+    "dalam": "dalam ",
+    "rm": "RM.",
+    "ident": "Tn./",
+    "residen": "Residen ",
+    "open_parens": "(",
+    "bullets": "•\u2060  \u2060",
+    "assalam": "assalamualaikum ",
+}
+PREFIXES = ["", "Assalamualaikum dokter.\nTn. A / L / 25\nS: ", "S: x\nO:\nStatus Generalis:\n", "P:\nPro "]
+
+def _paste(prefix: str, filler: str, n: int) -> str:
+    return (prefix + filler * (n // len(filler) + 1))[:n]
+
+def _timed(fn, *args):
+    t0 = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - t0
+
+@pytest.mark.parametrize("scale", [1, 5])
+@pytest.mark.parametrize("filler", list(FILLERS))
+def test_parsers_bounded(filler, scale):
+    for prefix in PREFIXES:
+        raw, cut = bound_paste(_paste(prefix, FILLERS[filler], PARSE_MAX_CHARS * scale), "assalamualaikum")
+        minlap, _ = bound_paste(_paste(prefix, FILLERS[filler], PARSE_MAX_CHARS * scale))
+        assert len(raw) <= PARSE_MAX_CHARS and len(minlap) <= PARSE_MAX_CHARS
+        assert cut == (scale > 1)
+        for fn, text in ((parse_raw_soap_preop_only, raw), (parse_minlap_jam, minlap), (parse_minlap_penunjang_block, minlap),
+                         (strip_parens, raw)):
+            took = _timed(fn, text)
+            assert took < WALL_BOUND_SECONDS, (fn.__name__, filler, prefix[:12], took)
+
+def test_bound_paste_keeps_newest_report():
+    old = "Assalamualaikum dokter.\nlama\n" * (PARSE_MAX_CHARS // 10)
+    text, cut = bound_paste(old + "Assalamualaikum dokter.\nbaru", "assalamualaikum")
+    assert cut and text.endswith("baru") and len(text) <= PARSE_MAX_CHARS
+    assert _timed(bound_paste, "x" * (PARSE_MAX_CHARS * 50), "assalamualaikum") < WALL_BOUND_SECONDS
+
+def test_budget_is_checked_between_steps():
+    with pytest.raises(ParseTimeout):
+        with parse_budget(0):
+            time.sleep(0.001)
+            pick_block("S: x\nO: y", r"\bS\s*:\s*", r"\n[ \t]*O\s*:\s*")
+    with parse_budget(60):
+        assert pick1("RM 123", r"\bRM\.?\s*([0-9.]+)") == "123"
@@ -0,0 +1,40 @@
+"""An idle session's draft goes to disk, and comes back with "Pulihkan draft"."""
+import gc
+import os
+import time
+
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "supersoap_app.py")
+
+def _registry(spill_dir):
+    # the app module is re-executed per run, so reach the cached instance instead of importing it
+    return next(o for o in gc.get_objects() if type(o).__name__ == "SessionRegistry" and o.spill_dir == spill_dir)
+
+def test_idle_draft_is_spilled_and_restored(tmp_path, monkeypatch):
+    monkeypatch.setenv("SUPERSOAP_DATA_DIR", str(tmp_path))
+    st.cache_resource.clear()  # registry/board are process-wide; rebuild them on this data dir
+    at = AppTest.from_file(APP, default_timeout=60)
+    at.run()
+    at.text_input(key="awal_nama").set_value("Tn. Spill").run()
+    at.button(key="pre_replace").click().run()
+    assert not at.exception
+    override = at.session_state["pre_EO_override"]
+
+    reg = _registry(os.path.join(str(tmp_path), "spill"))
+    (sid, entry), = reg.sessions.items()
+    assert entry["bytes"] > 0
+    entry["last_seen"] = time.time() - 10 * 3600
+    reg._last_sweep = 0.0
+    reg.maybe_sweep(ttl=60)
+
+    assert os.path.exists(reg.spill_path(sid))
+    assert "pre_EO_override" not in at.session_state
+    assert reg.report()["bytes"] == 0
+
+    at._run()  # AppTest would re-send widget values from the (now emptied) state; a reload sends none
+    at.button(key="spill_restore_btn").click().run()
+    assert not at.exception
+    assert at.session_state["pre_EO_override"] == override
+    assert not os.path.exists(reg.spill_path(sid))
@@ -0,0 +1,42 @@
+"""Shorthand round-trip: decode(encode(state)) gives back the same EO/IO lines."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from supersoap_core import (  # noqa: E402
+    fraktur_default, fraktur_from_shorthand, fraktur_lines, fraktur_to_shorthand, impaksi_default,
+    impaksi_from_shorthand, impaksi_lines, impaksi_to_shorthand,
+)
+
+def test_impaksi_round_trip_keeps_details():
+    state = impaksi_default()
+    state.update(gigi=["38", "48"], erupsi="Partial erupted", hiperemis=True, perkusi=True,
+                 detail={"hiperemis": "gingiva distal 38_48", "perkusi": "gigi 47 (100% nyeri)"})
+    line = impaksi_to_shorthand(state)
+    back, errors = impaksi_from_shorthand(line)
+    assert not errors
+    assert back["detail"] == state["detail"]
+    assert impaksi_lines(back) == impaksi_lines(state)
+    assert impaksi_to_shorthand(back) == line
+
+def test_impaksi_detail_needs_positive_sign():
+    state, errors = impaksi_from_shorthand("38 hip-=distal pal+=bukal_38")
+    assert errors == ["hip-=distal"]
+    assert state["detail"] == {"palpasi": "bukal 38"}
+
+def test_fraktur_round_trip_keeps_vulnus_area():
+    state = fraktur_default()
+    state["vulnus_area"] = "ar gigi_12-22"
+    back, errors = fraktur_from_shorthand(fraktur_to_shorthand(state))
+    assert not errors
+    assert fraktur_lines(back) == fraktur_lines(state)
+
+def test_fraktur_trismus_keeps_only_the_opening_number():
+    state = fraktur_default()
+    state.update(trismus="(+)", bukaan_mm="15 mm")
+    line = fraktur_to_shorthand(state)
+    assert "trismus+15" in line.split()
+    back, errors = fraktur_from_shorthand(line)
+    assert not errors and back["bukaan_mm"] == "15"
+    assert fraktur_lines(back) == fraktur_lines(state)
+    assert "Bukaan mulut ± 15 mm" in fraktur_lines(state)[0]
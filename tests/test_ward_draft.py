@@ -0,0 +1,62 @@
+"""A stage draft saved to the ward board (or put in a handoff code) brings back every widget of that stage."""
+import os
+
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "supersoap_app.py")
+WIDGETS = ["checkbox", "radio", "selectbox", "multiselect", "text_input", "text_area", "number_input", "date_input"]
+
+def _stage_widgets(at, prefixes=("awal_",)):
+    return {w.key: w.value for t in WIDGETS for w in at.get(t) if w.key and w.key.startswith(prefixes)}
+
+def _edit_awal(at):
+    """Move every unkeyed (auto-keyed) Awal widget away from its default."""
+    for w in at.checkbox:
+        if w.key.startswith("awal_checkbox_"):
+            w.set_value(not w.value)
+    for w in at.radio:
+        if w.key.startswith("awal_radio_"):
+            w.set_value(w.options[-1] if w.value != w.options[-1] else w.options[0])
+    for w in at.selectbox:
+        if w.key.startswith("awal_selectbox_"):
+            w.set_value(w.options[-1] if w.value != w.options[-1] else w.options[0])
+    at.text_input(key="awal_nama").set_value("Tn. Abses")
+    at.run()
+
+def _open(at, rm):
+    at.selectbox(key="bangsal_pilih").set_value(rm).run()
+
+def test_abses_awal_draft_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setenv("SUPERSOAP_DATA_DIR", str(tmp_path))
+    st.cache_resource.clear()  # registry/board are process-wide; rebuild them on this data dir
+    rm = "ward-draft-test"
+    a = AppTest.from_file(APP, default_timeout=60)
+    a.run()
+    a.selectbox(key="awal_case").set_value("Abses").run()
+    _edit_awal(a)
+    assert not a.exception
+    sent = _stage_widgets(a)
+    assert any(k.startswith("awal_radio_alergi") for k in sent) and any(k.startswith("awal_checkbox_") for k in sent)
+
+    a.text_input(key="bangsal_rm_baru").set_value(rm).run()
+    a.button(key="bangsal_simpan_btn").click().run()
+    _open(a, rm)
+    a.selectbox(key="bangsal_draft_stage").set_value("Awal").run()
+    a.button(key="bangsal_kirim_btn").click().run()
+    assert not a.exception and not a.error
+
+    b = AppTest.from_file(APP, default_timeout=60)
+    b.run()
+    _open(b, rm)
+    b.button(key="bangsal_ambil_btn").click().run()
+    assert not b.exception
+    assert _stage_widgets(b) == sent
+
+    # the same draft through the handoff code
+    c = AppTest.from_file(APP, default_timeout=60)
+    a.button(key="handoff_make_btn").click().run()
+    c.query_params["d"] = a.session_state["_handoff_code"]
+    c.run()
+    assert not c.exception
+    assert _stage_widgets(c) == sent
@@ -0,0 +1,115 @@
+"""Entry point for the browser build: JSON string in, string out.
+
+index.html only passes strings across the JS/Python boundary, so no proxy objects
+are kept alive between calls. Everything here runs on supersoap_core, unchanged.
+"""
+import json
+from dataclasses import asdict, fields
+from datetime import date, datetime, timedelta, timezone
+
+from supersoap_core import (
+    CASES, PARSE_MAX_CHARS, POD_LUKA, POD_NYERI_SKALA, ParseTimeout, ParsedSoap, PodDay, bound_paste,
+    build_awal_sections, build_preop_sections, clean, fraktur_from_shorthand, fraktur_lines,
+    impaksi_from_shorthand, impaksi_lines, join_sections, maintenance_ml_per_hr_421, parse_budget,
+    parse_minlap_jam, parse_minlap_penunjang_block, parse_raw_soap_preop_only, preop_default_times,
+    pod_series as pod_series_days, preop_plan_lines, render_pod, split_people_list, tpm_from_ml_per_hr,
+)
+
+# Asia/Jakarta has no DST, so a fixed offset saves shipping tzdata to the browser
+WIB = timezone(timedelta(hours=7))
+SHORTHAND = {"Impaksi": (impaksi_from_shorthand, impaksi_lines), "Fraktur": (fraktur_from_shorthand, fraktur_lines)}
+
+def _date(s: str, days: int = 0) -> date:
+    return date.fromisoformat(s) if s else datetime.now(WIB).date() + timedelta(days=days)
+
+def _lines(s: str):
+    return [clean(x) for x in (s or "").splitlines() if clean(x)]
+
+def options() -> str:
+    """Select options for the page, so they aren't duplicated in the HTML."""
+    return json.dumps({"case": CASES, "shorthand": list(SHORTHAND), "luka": POD_LUKA, "nyeri_skala": POD_NYERI_SKALA})
+
+def parse_preop(raw: str, minlap: str) -> str:
+    """Auto-fill for the Pre-Op form, same caps and budget as the server."""
+    raw, raw_cut = bound_paste(raw or "", "assalamualaikum")
+    minlap, minlap_cut = bound_paste(minlap or "")
+    parsed, jam, pen, timeout = ParsedSoap(), "", "", False
+    try:
+        with parse_budget():
+            if raw.strip():
+                parsed = parse_raw_soap_preop_only(raw)
+            if minlap.strip():
+                jam = parse_minlap_jam(minlap)
+                pen = parse_minlap_penunjang_block(minlap)
+    except ParseTimeout:
+        timeout = True
+    puasa, ab_jam = preop_default_times(jam or "08.00")
+    return json.dumps({**asdict(parsed), "jam": jam, "penunjang": pen, "puasa": puasa, "ab_jam": ab_jam,
+                       "truncated": raw_cut or minlap_cut, "max_chars": PARSE_MAX_CHARS, "timeout": timeout})
+
+def default_times(jam: str) -> str:
+    puasa, ab_jam = preop_default_times(jam)
+    return json.dumps({"puasa": puasa, "ab_jam": ab_jam})
+
+def suggested_tpm(bb: float, drip_factor: int = 20) -> int:
+    return tpm_from_ml_per_hr(maintenance_ml_per_hr_421(bb), drip_factor) if bb > 0 else 0
+
+def preop(form: str) -> str:
+    f = json.loads(form)
+    parsed = ParsedSoap(**{k: f[k] for k in ("sapaan", "pembuka") if f.get(k)})
+    overrides = {k: f.get(k, "") for k in ("nama", "jk", "umur", "pembiayaan", "rm", "rs", "S", "O_generalis", "EO", "IO", "A")}
+    overrides["kamar"] = f.get("kamar") or "(isi kamar/bed)"
+    zona = f.get("zona") or "WITA"
+    ivfd = (f.get("cairan") or "RL", int(f.get("tpm") or 0), int(f.get("drip_factor") or 20)) if f.get("ivfd_on", True) else None
+    ab = (f.get("ab") or "Ceftriaxone", f.get("ab_dose") or "1 gr", f.get("ab_jam", ""), bool(f.get("skin", True))) if f.get("ab_on", True) else None
+    plan = preop_plan_lines(zona, ivfd, f.get("puasa") if f.get("puasa_on", True) else None, ab, f.get("extra", ""))
+    return join_sections(build_preop_sections(
+        parsed, overrides, f.get("penunjang", ""), plan, f.get("tindakan") or "(isi tindakan)", f.get("anestesi") or "general anestesi",
+        f.get("jam") or "08.00", zona, _date(f.get("tgl_lap", "")), _date(f.get("tgl_op", ""), 1),
+        split_people_list(f.get("residen", "")) or "-", f.get("dpjp") or "-", _lines(f.get("meds", ""))))
+
+def awal(form: str) -> str:
+    f = json.loads(form)
+    jk = f.get("jk") or "L"
+    ident = {"nama": f.get("nama", ""), "jk": jk, "jk_long": "laki-laki" if jk == "L" else "perempuan",
+             "umur": f.get("umur", ""), "pembiayaan": f.get("pembiayaan") or "BPJS", "rm": f.get("rm", "")}
+    ttv = {"ku": f.get("ku") or "Baik/Compos Mentis", "td": f.get("td") or "120/70 mmHg", "nadi": int(f.get("nadi") or 80),
+           "rr": int(f.get("rr") or 19), "temp": float(f.get("temp") or 36.7), "spo2": int(f.get("spo2") or 99),
+           "bb": float(f.get("bb") or 0), "tb": float(f.get("tb") or 0)}
+    h = {"alergi_any": "Ada alergi" if _lines(f.get("alergi", "")) else "Tidak ada alergi obat & makanan",
+         "alergi_items": _lines(f.get("alergi", "")),
+         "sistemik_any": "Ada" if _lines(f.get("sistemik", "")) else "Disangkal",
+         "sistemik_items": _lines(f.get("sistemik", "")), "obat_items": _lines(f.get("obat", "")),
+         **{k: bool(f.get(k)) for k in ("batuk", "flu", "demam", "diare")}}
+    return join_sections(build_awal_sections(
+        f.get("case") or "Impaksi", ident, ttv, _lines(f.get("eo", "")), _lines(f.get("io", "")), f.get("keluhan", ""), h,
+        _lines(f.get("a", "")), _lines(f.get("p", "")), f.get("residen", ""), f.get("dpjp", ""), f.get("rs") or "RSGMP UNHAS",
+        _date(f.get("tgl", ""))))
+
+def eoio(kind: str, line: str) -> str:
+    """EO/IO lines from a shorthand line ("38,48 PE hip- pal+ perk- kalk+ OH sdg")."""
+    if kind not in SHORTHAND:
+        return json.dumps({"eo": [], "io": [], "errors": []})
+    parse, lines = SHORTHAND[kind]
+    state, errors = parse(line or "")
+    eo, io = lines(state)
+    return json.dumps({"eo": eo, "io": io, "errors": errors})
+
+POD_CASTS = {"pod": int, "nadi": int, "rr": int, "spo2": int, "temp": float}
+
+def _pod_values(f: dict) -> dict:
+    known = {x.name for x in fields(PodDay)}
+    return {k: POD_CASTS.get(k, str)(v) for k, v in f.items() if k in known and k != "tanggal" and v not in (None, "")}
+
+def pod(form: str) -> str:
+    f = json.loads(form)
+    return render_pod(PodDay(tanggal=_date(f.get("tanggal", "")), **_pod_values(f)))
+
+def pod_series(form: str) -> str:
+    """POD n+1.. from the POD form plus "days": one object per following day with only the
+    fields that changed, like the POD n table on the server (no archive, no diff here)."""
+    f = json.loads(form)
+    base = PodDay(tanggal=_date(f.get("tanggal", "")), **_pod_values(f))
+    # the series numbers the days itself
+    days = pod_series_days(base, [{k: v for k, v in _pod_values(d).items() if k != "pod"} for d in f.get("days", [])])
+    return "\n\n-----\n\n".join(f"== POD {d.pod} ==\n{render_pod(d)}" for d in days)
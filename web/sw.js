@@ -0,0 +1,18 @@
+// Cache-first for the whole bundle: after one load the page works with no network.
+// build_web.py fills in VERSION (content hash) and FILES; a new build replaces the old cache.
+const VERSION = "__VERSION__";
+const FILES = __FILES__;
+
+self.addEventListener("install", event => {
+  event.waitUntil(caches.open(VERSION).then(cache => cache.addAll(FILES)).then(() => self.skipWaiting()));
+});
+
+self.addEventListener("activate", event => {
+  event.waitUntil(caches.keys()
+    .then(keys => Promise.all(keys.filter(k => k !== VERSION).map(k => caches.delete(k))))
+    .then(() => self.clients.claim()));
+});
+
+self.addEventListener("fetch", event => {
+  event.respondWith(caches.match(event.request, { ignoreSearch: true }).then(hit => hit || fetch(event.request)));
+});